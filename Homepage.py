@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-from pathlib import Path
 from instagram_data_class_st import InstagramData_ST
 
 # Setting up titles
@@ -23,26 +21,25 @@ if uploaded_files:
     liked_posts_file = file_dict.get('liked_posts.json', None)
     post_comments_file = file_dict.get('post_comments.json', None)
 
-    # Load each file if it exists
-    if followers_file:
-        followers_data = pd.read_json(followers_file)
-        st.write("Followers Data", followers_data.head())
+    # Parse each file once by content hash, reruns reuse the cached DataFrames
+    userInstagramDataClass = InstagramData_ST(following_file, followers_file, liked_comments_file,
+                                              liked_posts_file, post_comments_file)
+    st.session_state['instagram_data'] = userInstagramDataClass
+
+    if userInstagramDataClass.followers_file is not None:
+        st.write("Followers Data", userInstagramDataClass.followers_file.head())
     
-    if following_file:
-        following_data = pd.read_json(following_file)
-        st.write("Following Data", following_data.head())
+    if userInstagramDataClass.following_file is not None:
+        st.write("Following Data", userInstagramDataClass.following_file.head())
     
-    if liked_comments_file:
-        liked_comments_data = pd.read_json(liked_comments_file)
-        st.write("Liked Comments Data", liked_comments_data.head())
+    if userInstagramDataClass.liked_comments is not None:
+        st.write("Liked Comments Data", userInstagramDataClass.liked_comments.head())
     
-    if liked_posts_file:
-        liked_posts_data = pd.read_json(liked_posts_file)
-        st.write("Liked Posts Data", liked_posts_data.head())
+    if userInstagramDataClass.liked_posts is not None:
+        st.write("Liked Posts Data", userInstagramDataClass.liked_posts.head())
     
-    if post_comments_file:
-        post_comments_data = pd.read_json(post_comments_file)
-        st.write("Post Comments Data", post_comments_data.head())
+    if userInstagramDataClass.post_comments is not None:
+        st.write("Post Comments Data", userInstagramDataClass.post_comments.head())
 
 # Handle missing files
     missing_files = [
@@ -54,5 +51,3 @@ if uploaded_files:
 
     if missing_files:
         st.warning(f"Missing files: {', '.join(missing_files)}")
-
-    userInstagramDataClass = InstagramData_ST(following_file, followers_file, liked_comments_file, liked_posts_file, post_comments_file)
@@ -0,0 +1,318 @@
+"""
+Benchmark Module
+
+This module times the hot paths of the analyzer on a synthetic export and catches performance
+regressions. Every benchmark is run a few times to take the best wall time, and once more under
+tracemalloc to record the peak memory it allocated, which includes the NumPy and pandas buffers.
+The results are compared against the committed benchmark_baseline.json, and any benchmark that
+got slower or hungrier than the allowed tolerance is reported as a regression. Every timed run
+is paired with a run of a fixed reference workload, and timings are compared relative to it, so
+a baseline stored on another machine or on a busy one still compares fairly. Differences below
+a few milliseconds are ignored as noise.
+Main features include:
+- Generating a synthetic export at a small, medium or large scale preset, or using a given export.
+- Benchmarking message loading, decoding, filtering, word counting, the follow diff, post
+  comment loading, the message child tables and the message cube the DM plots are aggregated from.
+- Saving the results as the new baseline or comparing them against the stored one.
+- Timing the imports of the CLI entry points in fresh interpreters against a startup budget.
+
+Functions:
+- prepare_context(root): Loads the inputs every benchmark needs from an export.
+- measure(function, context, repeat, reference): Returns the best time, the best time of the
+  reference workload next to it and the peak memory of a benchmark.
+- run_benchmarks(root, names, repeat): Runs the benchmarks and returns their results.
+- reference_workload(context): The fixed workload every run is normalized against.
+- compare(results, baseline, tolerance, min_seconds, min_mib): Returns the regressions of the
+  results against a baseline.
+- measure_startup(module, repeat): Returns the best import time of a module in a fresh interpreter.
+- check_startup(budgets, repeat): Returns the modules whose import time is over their budget.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import comments
+import export_files
+import inbox
+import instagram_data_class as ig_data
+import message as msg
+import followers as follow
+import synthetic_export
+
+DEFAULT_BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+
+DEFAULT_TOLERANCE = 0.25
+# Smaller differences are scheduler and allocator noise, whatever their relative size
+DEFAULT_MIN_SECONDS = 0.005
+DEFAULT_MIN_MIB = 1.0
+
+# Keyword arguments of synthetic_export.generate_export for every scale
+SCALES = {
+    'small': {'conversations': 10, 'messages': 1_000, 'followers': 2_000, 'following': 1_500,
+              'comments': 1_000, 'liked': 500, 'shard_size': 5_000},
+    'medium': {'conversations': 40, 'messages': 5_000, 'followers': 20_000, 'following': 10_000,
+               'comments': 10_000, 'liked': 5_000, 'shard_size': 10_000},
+    'large': {'conversations': 100, 'messages': 20_000, 'followers': 100_000, 'following': 50_000,
+              'comments': 50_000, 'liked': 20_000, 'shard_size': 10_000},
+}
+
+# Seconds the import of every CLI entry point may add to the start of a bare interpreter. The menu
+# only loads pandas once a section is entered, while the follower analysis needs pandas itself.
+STARTUP_BUDGETS = {
+    'main': 0.25,
+    'report': 0.25,
+    'followers': 0.9,
+}
+
+
+def prepare_context(root) -> dict:
+    """
+    Loads the inputs every benchmark needs from an export, outside of the measurements.
+    :param root: Path to the export folder or ZIP file
+    :return: Dictionary of the InstagramData object, paths and parsed DataFrames
+    """
+    instagram_data = ig_data.InstagramData(root)
+    instagram_data.init_paths()
+    shards = [shard for conversation in inbox.find_conversation_shards(instagram_data.inbox_path).values()
+              for shard in conversation]
+    conversations = inbox.create_inbox_dfs(instagram_data.inbox_path, max_workers=1)
+    global_df = inbox.create_global_df(conversations)
+    content = msg.filter_msg_content(global_df)
+    return {
+        'instagram_data': instagram_data,
+        'message_shard': max(shards, key=lambda shard: export_files.file_signature(shard)[1]),
+        'conversations': conversations,
+        'global_df': global_df,
+        'raw_content': global_df['content'],
+        'decoded_content': msg.decode_messages(content),
+        'comment_shards': instagram_data.shard_paths['post_comments'],
+    }
+
+
+def _decode_messages(context):
+    # Clear the memoized decodes so every run measures decoding from scratch
+    msg.decode_message.cache_clear()
+    msg.decode_messages(context['raw_content'])
+
+
+def _not_following_back(context):
+    with contextlib.redirect_stdout(io.StringIO()):
+        follow.not_following_back(context['instagram_data'])
+
+
+def _create_post_df(context):
+    frames = [comments.create_post_df(path) for path in context['comment_shards']]
+    pd.concat(frames, ignore_index=True).sort_values(by=['Time'])
+
+
+def _message_cube(context):
+    msg.merge_message_cubes(msg.build_message_cube(df) for df in context['conversations'].values())
+
+
+# Every benchmark by name, each takes the context of prepare_context
+BENCHMARKS = {
+    'create_msg_df': lambda context: msg.create_msg_df(context['message_shard']),
+    'create_msg_df_streaming': lambda context: msg.create_msg_df(context['message_shard'], streaming=True),
+    'create_msg_tables': lambda context: msg.create_msg_df(context['message_shard'], streaming=True, child_tables=True),
+    'decode_messages': _decode_messages,
+    'filter_msg_content': lambda context: msg.filter_msg_content(context['global_df']),
+    'five_most_common_words': lambda context: msg.five_most_common_words(context['decoded_content']),
+    'five_most_common_phrases': lambda context: msg.five_most_common_words(
+        context['decoded_content'], ngram=2, stopwords=True, casefold=True),
+    'not_following_back': _not_following_back,
+    'create_post_df': _create_post_df,
+    'message_cube': _message_cube,
+}
+
+
+def reference_workload(context=None) -> int:
+    """
+    A fixed mix of NumPy, pandas and pure Python work that does not depend on the export or on
+    the analyzer code, timed with every run to measure how fast the machine is.
+    """
+    values = np.random.default_rng(0).integers(0, 1_000, 200_000)
+    pd.Series(values).groupby(values % 97).sum()
+    np.sort(values)
+    return sum(str(value).count('1') for value in range(100_000))
+
+
+def _seconds(function, context: dict) -> float:
+    """
+    :return: Wall time of one run of a benchmark function
+    """
+    start = time.perf_counter()
+    function(context)
+    return time.perf_counter() - start
+
+
+def measure(function, context: dict, repeat=5, reference=reference_workload) -> dict:
+    """
+    Measures a benchmark: the best and median wall time of repeat untraced runs, the best
+    time of the reference workload run right before each of them, and the peak memory of
+    one more run under tracemalloc.
+    :param function: The benchmark function taking the context
+    :param context: The context of prepare_context
+    :param repeat: Number of timed runs
+    :param reference: The workload timed next to every run, or None to skip it
+    :return: Dictionary of the best and median seconds, the best reference seconds and the
+             peak memory in MiB
+    """
+    # A warm-up run loads lazily imported modules and memoized DataFrames
+    function(context)
+    timings = []
+    reference_timings = []
+    for _ in range(repeat):
+        # The machine may get slower or faster during a run, which the paired reference absorbs
+        if reference is not None:
+            reference_timings.append(_seconds(reference, context))
+        timings.append(_seconds(function, context))
+
+    tracemalloc.start()
+    try:
+        function(context)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    result = {'best_seconds': min(timings), 'median_seconds': statistics.median(timings),
+              'peak_mib': peak / (1 << 20)}
+    if reference_timings:
+        result['reference_seconds'] = min(reference_timings)
+    return result
+
+
+def run_benchmarks(root, names=tuple(BENCHMARKS), repeat=5) -> dict:
+    """
+    Runs benchmarks on an export.
+    :param root: Path to the export folder or ZIP file
+    :param names: Names of the benchmarks to run, keys of BENCHMARKS
+    :param repeat: Number of timed runs of every benchmark
+    :return: Dictionary mapping benchmark names to their measurements
+    """
+    context = prepare_context(root)
+    results = {}
+    for name in names:
+        results[name] = measure(BENCHMARKS[name], context, repeat)
+        print(f'{name:<28}{results[name]["best_seconds"] * 1000:>10.1f} ms{results[name]["peak_mib"]:>10.1f} MiB')
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance=DEFAULT_TOLERANCE,
+            min_seconds=DEFAULT_MIN_SECONDS, min_mib=DEFAULT_MIN_MIB) -> list:
+    """
+    Compares benchmark results against a baseline. The baseline timing of every benchmark is
+    first scaled by how much slower or faster its reference workload ran, so baselines of other
+    machines compare.
+    :param results: Results of run_benchmarks
+    :param baseline: Results of an earlier run_benchmarks to compare against
+    :param tolerance: Allowed relative slowdown or memory growth, 0.25 for 25%
+    :param min_seconds: Slowdowns smaller than this many seconds are never regressions
+    :param min_mib: Memory growth smaller than this many MiB is never a regression
+    :return: List of regression descriptions, empty if nothing regressed
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        speed = 1.0
+        if 'reference_seconds' in result and 'reference_seconds' in baseline[name]:
+            speed = result['reference_seconds'] / baseline[name]['reference_seconds']
+        for metric, scale, min_difference in (('best_seconds', speed, min_seconds), ('peak_mib', 1.0, min_mib)):
+            old, new = baseline[name][metric] * scale, result[metric]
+            if old > 0 and new > old * (1 + tolerance) and new - old > min_difference:
+                regressions.append(f'{name} {metric}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100:.0f}%)')
+    return regressions
+
+
+def _interpreter_seconds(code: str) -> float:
+    """
+    :return: Wall time of running code in a fresh interpreter started in this directory
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent, check=True)
+    return time.perf_counter() - start
+
+
+def measure_startup(module: str, repeat=5) -> float:
+    """
+    Measures the time importing a module adds to the start of a fresh interpreter, which is
+    what a user waits for before the CLI shows its first prompt.
+    :param module: Name of the module, like 'main'
+    :param repeat: Number of interpreters started with and without the import
+    :return: Best import time in seconds, the best bare interpreter start subtracted
+    """
+    bare = min(_interpreter_seconds('pass') for _ in range(repeat))
+    return max(min(_interpreter_seconds(f'import {module}') for _ in range(repeat)) - bare, 0.0)
+
+
+def check_startup(budgets=STARTUP_BUDGETS, repeat=5) -> list:
+    """
+    Times the import of every module with a startup budget.
+    :param budgets: Dictionary mapping module names to their budget in seconds
+    :param repeat: Number of interpreters started per module
+    :return: List of descriptions of the modules over budget, empty if all are within it
+    """
+    over_budget = []
+    for module, budget in budgets.items():
+        seconds = measure_startup(module, repeat)
+        print(f'import {module:<21}{seconds * 1000:>10.1f} ms   budget {budget * 1000:.0f} ms')
+        if seconds > budget:
+            over_budget.append(f'import {module}: {seconds:.3f}s over the startup budget of {budget:.3f}s')
+    return over_budget
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analyzer on a synthetic export.')
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help='synthetic export size')
+    parser.add_argument('--export', help='benchmark this export instead of a synthetic one')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative regression (default: 0.25)')
+    parser.add_argument('--min-ms', type=float, default=DEFAULT_MIN_SECONDS * 1000,
+                        help=f'ignored slowdowns in ms (default: {DEFAULT_MIN_SECONDS * 1000:g})')
+    parser.add_argument('--require-baseline', action='store_true',
+                        help='fail when a benchmark has no baseline instead of only warning')
+    parser.add_argument('--skip-startup', action='store_true', help='do not check the startup budgets')
+    args = parser.parse_args()
+
+    # Results are only comparable on the same input, so baselines are stored per scale or export
+    baseline_key = args.export or args.scale
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.export or synthetic_export.generate_export(Path(tmp) / 'export', **SCALES[args.scale])
+        results = run_benchmarks(root, args.benchmarks, args.repeat)
+    over_budget = [] if args.skip_startup else check_startup(repeat=args.repeat)
+
+    baseline_path = Path(args.baseline)
+    baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if args.save_baseline:
+        baselines.setdefault(baseline_key, {}).update(results)
+        baseline_path.write_text(json.dumps(baselines, indent=2))
+        print(f'\nBaseline saved to {baseline_path}')
+    regressions = over_budget
+    if not args.save_baseline:
+        baseline = baselines.get(baseline_key, {})
+        missing = [name for name in results if name not in baseline]
+        if missing:
+            print(f'\nWARNING: no baseline for {", ".join(missing)} of {baseline_key} in {baseline_path}, '
+                  f'run with --save-baseline to store one')
+            if args.require_baseline:
+                regressions = regressions + [f'{name}: no baseline' for name in missing]
+        regressions = compare(results, baseline, args.tolerance, args.min_ms / 1000) + regressions
+    if regressions:
+        print('\nREGRESSIONS:')
+        print('\n'.join(regressions))
+        sys.exit(1)
+    print('\nNo regressions against the baseline or the startup budgets.')
@@ -0,0 +1,292 @@
+"""
+Parsed Data Cache Module
+
+This module keeps an on-disk cache of the DataFrames parsed from an Instagram export so
+that later runs can skip JSON parsing entirely. Main features include:
+- Keying every entry by the source path, size, modification time and content hash of the
+  JSON file it was parsed from, so edited or replaced files are never served stale.
+- Storing each DataFrame in the Feather columnar format when pyarrow is installed, falling
+  back to a pickle for frames Feather cannot hold (like nested message columns).
+- Explicit invalidation of one source file or of the whole cache.
+- A size-bounded, least recently used eviction policy.
+- Safe sharing of one cache directory between processes, like the workers of a report or
+  the jobs of the analysis service, by merging the index on disk under a file lock.
+
+Classes:
+    ParseCache: The cache directory, its index, and the get/put/invalidate operations.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from pathlib import Path
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+import export_files
+
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory file locks, so flushes only merge the index
+    fcntl = None
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'instagram_data_analyzer'
+DEFAULT_MAX_BYTES = 1 << 30
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+# Bumped whenever the layout of the parsed DataFrames changes, so older entries are never read
+CACHE_VERSION = 3
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def file_fingerprint(source_path) -> dict:
+    """
+    Creates the fingerprint of a source file used to key its cache entries.
+    :param source_path: Path to the source JSON file, on disk or inside an export ZIP
+    :return: Dictionary with the resolved path, size, modification time and content hash
+    """
+    path_id, size, mtime = export_files.file_signature(source_path)
+    if isinstance(source_path, export_files.ExportZipPath):
+        # ZIP members carry a CRC-32 in the central directory, so nothing is decompressed
+        content_hash = f'crc32:{source_path.stat_info().CRC:08x}'
+    else:
+        hasher = hashlib.blake2b(digest_size=16)
+        with export_files.open_binary(source_path) as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        content_hash = hasher.hexdigest()
+    return {
+        'path': path_id,
+        'size': size,
+        'mtime_ns': mtime,
+        'hash': content_hash,
+    }
+
+
+class ParseCache:
+    """
+    A directory of parsed DataFrames keyed by the fingerprint of their source file.
+
+    Attributes:
+        cache_dir (Path): The directory holding the cached frames and the index.
+        max_bytes (int): The total size the cached frames may take before eviction.
+        entries (dict): The index mapping cache keys to the metadata of their entries.
+
+    Methods:
+        get(source_path, name, flush): Loads a cached frame or returns None on a miss.
+        put(source_path, df, name, flush): Stores a parsed frame and evicts old entries.
+        get_or_parse(source_path, parser, name): Loads a cached frame or parses and stores it.
+        invalidate(source_path): Drops the entries of one source file, or every entry.
+        flush(): Merges this process's changes into the index on disk.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES) -> None:
+        """
+        Opens the cache directory, creating it if needed, and reads its index.
+
+        :param cache_dir: The directory holding the cached frames.
+        :param max_bytes: The total size the cached frames may take before eviction.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.entries = self._read_index()
+        # Keys changed by this process since the last flush, merged into the index on disk
+        self._touched = set()
+        self._removed = set()
+
+    def _read_index(self) -> dict:
+        """
+        Reads the index on disk, or returns an empty index if there is none yet.
+        """
+        try:
+            with open(self.cache_dir / INDEX_FILE, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @contextmanager
+    def _index_lock(self):
+        """
+        Holds an exclusive lock on the cache directory while the index is read and rewritten.
+        """
+        with open(self.cache_dir / LOCK_FILE, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _key(fingerprint: dict, name: str) -> str:
+        """
+        Combines a source fingerprint and the parser name into a cache key.
+        """
+        key_source = json.dumps([CACHE_VERSION, name, fingerprint], sort_keys=True).encode('utf-8')
+        return hashlib.blake2b(key_source, digest_size=16).hexdigest()
+
+    def get(self, source_path, name='', flush=True) -> 'pd.DataFrame | None':
+        """
+        Loads the cached frame parsed from the current contents of a source file.
+
+        :param source_path: Path to the source JSON file
+        :param name: Name of the parser, so one file can be cached by several parsers
+        :param flush: Whether to write the index right away, turned off for batches of gets
+        :return: The cached DataFrame, or None if there is no entry for it
+        """
+        return self._get(file_fingerprint(source_path), name, flush)
+
+    def _get(self, fingerprint: dict, name: str, flush: bool) -> 'pd.DataFrame | None':
+        """
+        Loads the cached frame of an already computed source fingerprint.
+        """
+        key = self._key(fingerprint, name)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        import pandas as pd
+
+        frame_path = self.cache_dir / entry['file']
+        try:
+            if entry['format'] == 'feather':
+                df = pd.read_feather(frame_path)
+            else:
+                df = pd.read_pickle(frame_path)
+        except (OSError, ValueError):
+            self._remove(key)
+            self.flush()
+            return None
+
+        entry['last_used'] = time.time()
+        self._touched.add(key)
+        if flush:
+            self.flush()
+        return df
+
+    def put(self, source_path, df: 'pd.DataFrame', name='', flush=True) -> None:
+        """
+        Stores a parsed frame for the current contents of a source file.
+
+        :param source_path: Path to the source JSON file
+        :param df: DataFrame parsed from the source file
+        :param name: Name of the parser, so one file can be cached by several parsers
+        :param flush: Whether to write the index right away, turned off for batches of puts
+        """
+        self._put(file_fingerprint(source_path), df, name, flush)
+
+    def _put(self, fingerprint: dict, df: 'pd.DataFrame', name: str, flush: bool) -> None:
+        """
+        Stores a parsed frame under an already computed source fingerprint.
+        """
+        key = self._key(fingerprint, name)
+        self._remove(key)
+
+        # Frames are written under a per-process name first, so no process reads a partial file
+        temp_path = self.cache_dir / f'{key}.{os.getpid()}.tmp'
+        frame_format = 'pickle'
+        if HAS_PYARROW:
+            try:
+                df.reset_index(drop=True).to_feather(temp_path)
+                frame_format = 'feather'
+            except (TypeError, ValueError, NotImplementedError, ImportError):
+                temp_path.unlink(missing_ok=True)
+        if frame_format == 'pickle':
+            df.to_pickle(temp_path)
+        frame_path = self.cache_dir / f'{key}.{"feather" if frame_format == "feather" else "pkl"}'
+        os.replace(temp_path, frame_path)
+
+        self.entries[key] = {
+            'source': fingerprint['path'],
+            'name': name,
+            'file': frame_path.name,
+            'format': frame_format,
+            'bytes': frame_path.stat().st_size,
+            'last_used': time.time(),
+        }
+        self._touched.add(key)
+        self._evict()
+        if flush:
+            self.flush()
+
+    def get_or_parse(self, source_path, parser, name='') -> 'pd.DataFrame':
+        """
+        Loads the cached frame of a source file, or parses the file and caches the result.
+
+        :param source_path: Path to the source JSON file
+        :param parser: Function taking the source path and returning a DataFrame
+        :param name: Name of the parser, defaults to the parser's function name
+        :return: The parsed DataFrame
+        """
+        name = name or parser.__name__
+        fingerprint = file_fingerprint(source_path)
+        df = self._get(fingerprint, name, flush=True)
+        if df is None:
+            df = parser(source_path)
+            if df is not None:
+                self._put(fingerprint, df, name, flush=True)
+        return df
+
+    def invalidate(self, source_path=None) -> None:
+        """
+        Drops the cached frames of one source file, or every cached frame.
+
+        :param source_path: Path to the source JSON file, or None to clear the whole cache
+        """
+        source = export_files.source_id(source_path) if source_path is not None else None
+        # Picks up the entries other processes added since this cache was opened
+        self.flush()
+        for key in [key for key, entry in self.entries.items() if source in (None, entry['source'])]:
+            self._remove(key)
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        Merges the entries added, used and removed by this process into the index on disk,
+        so processes sharing the cache directory keep each other's entries, then evicts
+        down to max_bytes and replaces the index atomically.
+        """
+        with self._index_lock():
+            entries = self._read_index()
+            for key in self._removed:
+                entries.pop(key, None)
+            for key in self._touched:
+                if key in self.entries:
+                    entries[key] = self.entries[key]
+            self.entries = entries
+            self._evict()
+            self._touched.clear()
+            self._removed.clear()
+
+            temp_path = self.cache_dir / f'{INDEX_FILE}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.cache_dir / INDEX_FILE)
+
+    def _remove(self, key: str) -> None:
+        """
+        Deletes a cached frame and its index entry if they exist.
+        """
+        entry = self.entries.pop(key, None)
+        self._touched.discard(key)
+        self._removed.add(key)
+        if entry is not None:
+            (self.cache_dir / entry['file']).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        total_bytes = sum(entry['bytes'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= self.entries[key]['bytes']
+            self._remove(key)
@@ -1,11 +1,14 @@
 import json
 import pandas as pd
-import main
+import export_files
 import instagram_data_class as ig_data
 import message
+import profiling
+import timeutil
 
 
-def create_post_df(path_input, instagram_data):
+@profiling.traced('comments.create_post_df')
+def create_post_df(path_input, instagram_data=None):
     """
     Creates a data frame of comments sent by the user under posts sorted
     by sent date from oldest to most recent.
@@ -14,7 +17,7 @@ def create_post_df(path_input, instagram_data):
     :return: Created DataFrame
     """
     try:
-        with open(path_input, encoding='utf-8') as f:
+        with profiling.span('comments.json_load'), export_files.open_text(path_input) as f:
             post_comments_json = json.load(f)
 
         if 'comments_media_comments' in post_comments_json:
@@ -34,34 +37,31 @@ def create_post_df(path_input, instagram_data):
         # Decoding comments to the correct encoding
         df['Comment'] = message.decode_messages(df['Comment'])
 
-        # Sort DataFrame by time
+        # Sort DataFrame by time, kept as int64 UNIX timestamps until displayed
+        df['Time'] = df['Time'].astype('int64')
         df = df.sort_values(by=['Time'])
 
-        # Convert UNIX timestamp to datetime object
-        df['Time'] = pd.to_datetime(df['Time'], unit='s')
-
-        # Convert to the desired timezone
-        df['Time'] = df['Time'].dt.tz_localize('UTC').dt.tz_convert('US/Pacific')
-
-        # Convert datetime object to desired string format
-        df['Time'] = df['Time'].dt.strftime('%m-%d-%Y %H:%M:%S')
-
         return df
     except (AttributeError, TypeError) as error:
         print(f'ERROR: {error}')
 
 
-def first_five_post_comments(df: pd.DataFrame):
+@profiling.traced('comments.first_five_post_comments')
+def first_five_post_comments(df: pd.DataFrame, tz=timeutil.DEFAULT_TIMEZONE):
     """
     Prints out the five first ever comments the user made with info on
     whose post the comments were under and their dates
 
     :param df: Pandas DataFrame of post comments data
+    :param tz: Timezone the dates are shown in
     """
+    first_five_df = df.head().copy()
+    first_five_df['Time'] = timeutil.format_times(first_five_df['Time'], 's', tz, '%m-%d-%Y %H:%M:%S')
     print('\nYour First Five Comments: ')
-    print(f'{df.head().to_string(index=False)}\n')
+    print(f'{first_five_df.to_string(index=False)}\n')
 
 
+@profiling.traced('comments.top_five_accounts')
 def top_five_accounts(df: pd.DataFrame):
     """
     Prints a DataFrame containing the top 5 accounts that the user has
@@ -73,30 +73,33 @@ def top_five_accounts(df: pd.DataFrame):
 
 
 def comment_menu(instagram_data: ig_data.InstagramData):
+    """
+    Shows the comment data menu until the user returns to the main menu.
+    """
     print('\nWelcome To The Comment Data Section!')
     print('------------------------------------')
-    menu_choice = input('\nPlease choose an option below!:'
-                        '\n[1] : See Post Comments Data\n'
-                        '[2] : See Reported Comments Data\n'
-                        '[3] : See Reels Comments Data\n'
-                        '\n[return] : Return to main menu\n'
-                        '-------------------------------------\n')
-    while menu_choice != 'return':
-        df = create_post_df(instagram_data.post_comments, instagram_data)
-        if menu_choice == '1':
-            first_five_post_comments(df)
+    while True:
+        menu_choice = input('\nPlease choose an option below!:'
+                            '\n[1] : See Post Comments Data\n'
+                            '[2] : See Reported Comments Data\n'
+                            '[3] : See Reels Comments Data\n'
+                            '\n[return] : Return to main menu\n'
+                            '-------------------------------------\n')
+        if menu_choice == 'return':
+            print()
+            return
+        elif menu_choice == '1':
+            df = instagram_data.post_comments_df()
+            if df is None:
+                print('\nERROR: No post comments were found.')
+                continue
+            first_five_post_comments(df, instagram_data.timezone)
             top_five_accounts(df)
             print(message.five_most_common_words(df['Comment']))
             print(f'\nNumber of Comments Made Under Posts:\n{message.get_message_df_length(df["Comment"])}')
-            comment_menu(instagram_data)
         elif menu_choice == '2':
             print('2')
-            comment_menu(instagram_data)
         elif menu_choice == '3':
             print('3')
-            comment_menu(instagram_data)
         else:
             print('ERROR: Invalid choice, please try again')
-            comment_menu(instagram_data)
-    print()
-    main.main(instagram_data)
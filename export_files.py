@@ -0,0 +1,122 @@
+"""
+Export Files Module
+
+This module lets the analyzer read an Instagram export either from its extracted folder or
+straight from the downloaded ZIP file. A ZIP export is indexed once through its central
+directory and only the JSON members an analysis opens are decompressed, so the media files
+of the export are never extracted or read. Paths inside a ZIP are ExportZipPath objects,
+which behave like pathlib.Path for joining, listing and opening, and which can be sent to
+worker processes.
+
+Classes:
+    ExportZipPath: A zipfile.Path into an export ZIP that can be pickled for worker processes.
+
+Functions:
+- export_root(main_path): Returns the root path of an export folder or ZIP file.
+- open_text(path): Opens a file of the export as UTF-8 text.
+- open_binary(path): Opens a file of the export as bytes.
+- file_signature(path): Returns the path, size and modification time of a file of the export.
+- source_id(path): Returns a string identifying a file of the export.
+"""
+
+import functools
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+
+@functools.lru_cache(maxsize=8)
+def _open_archive(filename: str) -> zipfile.ZipFile:
+    """
+    Opens an export ZIP file and reads its central directory once per process.
+    :param filename: Path to the export ZIP file
+    :return: The opened ZipFile
+    """
+    return zipfile.ZipFile(filename)
+
+
+def _reopen_zip_path(filename: str, at: str):
+    """
+    Recreates an ExportZipPath after it was sent to another process.
+    """
+    return ExportZipPath(_open_archive(filename), at)
+
+
+class ExportZipPath(zipfile.Path):
+    """
+    A path to a member or folder inside an export ZIP file. Pickling only keeps the ZIP
+    file name and the member name, and each process reopens the archive once.
+    """
+
+    def __reduce__(self):
+        return _reopen_zip_path, (self.root.filename, self.at)
+
+    def stat_info(self) -> zipfile.ZipInfo:
+        """
+        :return: The ZipInfo of the member from the central directory
+        """
+        return self.root.getinfo(self.at)
+
+
+def export_root(main_path):
+    """
+    Returns the root path of an export, either its extracted folder or its ZIP file.
+    :param main_path: Path to the extracted export folder or to the downloaded ZIP file
+    :return: A pathlib.Path for folders, or an ExportZipPath for ZIP files
+    """
+    main_path = Path(main_path)
+    if main_path.is_file() and zipfile.is_zipfile(main_path):
+        return ExportZipPath(_open_archive(str(main_path)))
+    return main_path
+
+
+def _as_path(path):
+    """
+    Turns a string into a pathlib.Path, leaving Path and ExportZipPath objects as they are.
+    """
+    return Path(path) if isinstance(path, str) else path
+
+
+def open_text(path):
+    """
+    Opens a file of the export as UTF-8 text.
+    :param path: A str, pathlib.Path or ExportZipPath of the file
+    :return: The opened text file
+    """
+    return _as_path(path).open('r', encoding='utf-8')
+
+
+def open_binary(path):
+    """
+    Opens a file of the export as bytes.
+    :param path: A str, pathlib.Path or ExportZipPath of the file
+    :return: The opened binary file
+    """
+    return _as_path(path).open('rb')
+
+
+def file_signature(path) -> tuple:
+    """
+    Returns the path, size and modification time of a file of the export, read from the
+    file system or from the central directory of a ZIP without decompressing anything.
+    :param path: A str, pathlib.Path or ExportZipPath of the file
+    :return: Tuple of the source id, size in bytes and modification time
+    """
+    path = _as_path(path)
+    if isinstance(path, ExportZipPath):
+        info = path.stat_info()
+        return source_id(path), info.file_size, datetime(*info.date_time).timestamp()
+    stat = path.stat()
+    return source_id(path), stat.st_size, stat.st_mtime_ns
+
+
+def source_id(path) -> str:
+    """
+    Returns a string identifying a file of the export.
+    :param path: A str, pathlib.Path or ExportZipPath of the file
+    :return: The resolved file path, or the ZIP file path joined with the member name
+    """
+    path = _as_path(path)
+    if isinstance(path, ExportZipPath):
+        return str(path)
+    return str(path.resolve())
@@ -2,69 +2,68 @@
 This module contains functions for analyzing Instagram following data.
 
 The module includes functions to:
-- Create pandas DataFrames from Instagram 'following' and 'followers' JSON files.
+- Create pandas DataFrames from Instagram 'following' and 'followers' JSON files with the
+  shared string_list_data normalizer.
 - Sort a DataFrame based on the 'timestamp' column.
 - Format timestamps in a pandas Series to a specific date-time format.
 - Retrieve and display the first and most recent five followings from a DataFrame.
 - Display users who are not following the user back based on the followers and following DataFrames.
+- Split followers and followings into non-followers, fans, and mutuals with a hash-indexed diff.
 
 The main function, follow_data(), is used to display a menu to the user to choose between the 
 different options available. The Instagram data needed is passed as a parameter to the functions.
 
 Functions:
-- create_following_df(path_input, instagram_data): Creates a DataFrame from the following.json file.
-- create_follower_df(path_input, instagram_data): Creates a DataFrame from the follower_1.json file.
+- create_following_df(path_input): Creates a DataFrame from the following.json file.
+- create_follower_df(path_input): Creates a DataFrame from the follower_1.json file.
 - sort_df_time(df): Sorts a DataFrame based on the 'timestamp' column.
-- format_timestamp(timestamps): Formats pandas Series of timestamps to a specific date-time format.
-- first_five_following(df): Retrieves the first five followings from a DataFrame and formats the timestamps.
-- recent_five_following(df): Retrieves the most recent five followings from a DataFrame and formats the timestamps.
+- format_timestamp(timestamps, tz): Formats pandas Series of timestamps to a specific date-time format.
+- first_five_following(df, tz): Retrieves the first five followings from a DataFrame and formats the timestamps.
+- recent_five_following(df, tz): Retrieves the most recent five followings from a DataFrame and formats the timestamps.
 - following_data(instagram_data): Retrieves and displays following data.
+- follow_diff(follower_df, following_df): Splits accounts into non-followers, fans, and mutuals.
 - not_following_back(instagram_data): Displays users who are not following the user back.
+- fans_not_followed(instagram_data): Displays users the user does not follow back.
 - follow_data(instagram_data): Main function to display menu and handle user input.
 """
 
-import json
-import datetime
+from typing import NamedTuple
 import pandas as pd
 import instagram_data_class as ig_data
-import main
+import profiling
+import string_list
+import timeutil
 
+# Columns of the followers and following DataFrames
+FOLLOW_COLUMNS = ['href', 'value', 'timestamp']
 
-def create_following_df(path_input, instagram_data):
+
+@profiling.traced('followers.create_following_df')
+def create_following_df(path_input):
     """
     Creates a Dataframe from the following.json file.
     :param path_input: Path to the following.json file.
-    :return: Dataframe containing the following data.
+    :return: Dataframe containing the following data, or None if the file could not be parsed.
     """
     try:
-        with open(path_input, encoding='utf-8') as f:
-            following_json = json.load(f)
-        following_data_list = [f['string_list_data'][0]
-                               for f in following_json['relationships_following']]
-        df = pd.DataFrame(following_data_list)
-        return df
-    except (AttributeError, TypeError) as error:
+        return string_list.create_string_list_df(path_input, 'relationships_following', FOLLOW_COLUMNS)
+    except (AttributeError, TypeError, KeyError) as error:
         print(f'\nERROR: {error}')
         print('\nERROR: Please place the following.json file located in the followers_and_following folder')
-        follow_data(instagram_data)
 
 
-def create_follower_df(path_input, instagram_data):
+@profiling.traced('followers.create_follower_df')
+def create_follower_df(path_input):
     """
-    Creates a DataFrame from the follower_1.json file.
+    Creates a DataFrame from a followers_N.json file.
     :param path_input: Path to the follower JSON file.
-    :return: DataFrame containing the follower data.
+    :return: DataFrame containing the follower data, or None if the file could not be parsed.
     """
     try:
-        with open(path_input, encoding='utf-8') as f:
-            follower_json = json.load(f)
-        following_data_list = [f['string_list_data'][0] for f in follower_json]
-        df = pd.DataFrame(following_data_list)
-        return df
-    except (AttributeError, TypeError) as f:
+        return string_list.create_string_list_df(path_input, columns=FOLLOW_COLUMNS)
+    except (AttributeError, TypeError, KeyError) as f:
         print(f'\nERROR: {f}')
         print('\nPlease place the follower_1.json file located in the followers_and_following folder')
-        follow_data(instagram_data)
 
 
 def sort_df_time(df):
@@ -77,42 +76,45 @@ def sort_df_time(df):
     return df.sort_values(by=['timestamp'])
 
 
-def format_timestamp(timestamps):
+def format_timestamp(timestamps, tz=timeutil.DEFAULT_TIMEZONE):
     """
     Formats timestamps in a Series to a specific date-time format.
 
-    :param timestamps: Series of timestamps.
+    :param timestamps: Series of UNIX timestamps.
+    :param tz: Timezone the timestamps are shown in.
     :return: Formatted timestamps as Series.
     """
-    formatted_timestamps = timestamps.apply(
-        lambda time: datetime.datetime.fromtimestamp(time).strftime('%m-%d-%Y %H:%M'))
-    return formatted_timestamps
+    return timeutil.format_times(timestamps, 's', tz, '%m-%d-%Y %H:%M')
 
 
-def first_five_following(df):
+@profiling.traced('followers.first_five_following')
+def first_five_following(df, tz=timeutil.DEFAULT_TIMEZONE):
     """
     Retrieves the first five followings from a DataFrame and formats the timestamps.
 
     :param df: DataFrame containing following data.
+    :param tz: Timezone the timestamps are shown in.
     :return: F-string with the first five followings.
     """
-    first_five_head = sort_df_time(df).head()
+    first_five_head = sort_df_time(df).head().copy()
     first_five_head['timestamp'] = format_timestamp(
-        first_five_head['timestamp'])
+        first_five_head['timestamp'], tz)
     first_five_head = first_five_head.to_string()
     return f'\nYour First Five Followings: \n{first_five_head}\n'
 
 
-def recent_five_following(df):
+@profiling.traced('followers.recent_five_following')
+def recent_five_following(df, tz=timeutil.DEFAULT_TIMEZONE):
     """
     Retrieves the most recent five followings from a DataFrame and formats the timestamps.
 
     :param df: DataFrame containing following data.
+    :param tz: Timezone the timestamps are shown in.
     :return: F-string with the most recent five followings.
     """
-    first_five_head = sort_df_time(df).tail()
+    first_five_head = sort_df_time(df).tail().copy()
     first_five_head['timestamp'] = format_timestamp(
-        first_five_head['timestamp'])
+        first_five_head['timestamp'], tz)
     first_five_head = first_five_head.to_string()
     return f'\nYour Most Recent Five Followings: \n{first_five_head}\n'
 
@@ -124,11 +126,63 @@ def following_data(instagram_data):
     Asks for the path to the 'following.json' file and displays 
     the first five and most recent five followings.
     """
-    follower_df = create_following_df(instagram_data.following_path, instagram_data)
-    print(first_five_following(follower_df))
-    print(recent_five_following(follower_df))
+    follower_df = instagram_data.following_df()
+    if follower_df is None:
+        print('\nERROR: No followings were found.')
+        return
+    print(first_five_following(follower_df, instagram_data.timezone))
+    print(recent_five_following(follower_df, instagram_data.timezone))
+
+
+class FollowDiff(NamedTuple):
+    """
+    The result of comparing followers and followings.
+
+    Attributes:
+        not_following_back (DataFrame): Accounts the user follows that do not follow them back.
+        fans (DataFrame): Accounts following the user that the user does not follow back.
+        mutuals (DataFrame): Accounts the user follows that also follow them back.
+    """
+    not_following_back: pd.DataFrame
+    fans: pd.DataFrame
+    mutuals: pd.DataFrame
+
+
+def _username_keys(df):
+    """
+    Hashes the usernames of a DataFrame into 64-bit integer keys.
+
+    :param df: DataFrame with a 'value' column of usernames.
+    :return: Numpy array of uint64 username keys.
+    """
+    return pd.util.hash_array(df['value'].to_numpy(dtype=object), categorize=False)
+
+
+@profiling.traced('followers.follow_diff')
+def follow_diff(follower_df, following_df):
+    """
+    Splits followers and followings into non-followers, fans, and mutuals at once.
 
+    Usernames are hashed into integer keys and looked up in a hash table, so the 
+    diff runs in linear time without materializing a joined DataFrame.
 
+    :param follower_df: DataFrame of followers with a 'value' column of usernames.
+    :param following_df: DataFrame of followings with a 'value' column of usernames.
+    :return: FollowDiff of the non-followers, fans, and mutuals DataFrames.
+    """
+    following_df = following_df[~pd.Index(_username_keys(following_df)).duplicated()]
+    follower_keys = _username_keys(follower_df)
+    following_keys = _username_keys(following_df)
+
+    follows_back = pd.Index(following_keys).isin(follower_keys)
+    followed = pd.Index(follower_keys).isin(following_keys)
+
+    return FollowDiff(not_following_back=following_df[~follows_back],
+                      fans=follower_df[~followed],
+                      mutuals=following_df[follows_back])
+
+
+@profiling.traced('followers.not_following_back')
 def not_following_back(instagram_data):
     """
     Displays users who are not following the user back.
@@ -136,38 +190,62 @@ def not_following_back(instagram_data):
     Asks for the paths to the 'followers_1.json' and 'following.json' files.
     Displays the users who are not following back based on the data in these files.
     """
-    follower_df = create_follower_df(instagram_data.followers_path, instagram_data)[['href', 'value']]
-    following_df = create_following_df(instagram_data.following_path, instagram_data)[['href', 'value']]
+    follower_df = instagram_data.followers_df()
+    following_df = instagram_data.following_df()
+    if follower_df is None or following_df is None:
+        print('\nERROR: Both the followers and the following files are needed.')
+        return
 
-    non_follow_back_df = follower_df.merge(following_df.drop_duplicates(), on=[
-                                            'href', 'value'], how='right', indicator=True)
-    non_follow_back_df = non_follow_back_df[non_follow_back_df['_merge'] == 'right_only'][[
-        'href', 'value']]
-    non_follow_back_df.rename(columns={
-        'href': 'Profile Link', 'value': 'Username'}, inplace=True)
+    non_follow_back_df = follow_diff(follower_df[['href', 'value']], following_df[['href', 'value']]).not_following_back
+    non_follow_back_df = non_follow_back_df.rename(columns={
+        'href': 'Profile Link', 'value': 'Username'})
     non_follow_back_df = non_follow_back_df.to_string()
 
     print('\nUsers Not Following You Back:')
     print(non_follow_back_df)
 
 
+@profiling.traced('followers.fans_not_followed')
+def fans_not_followed(instagram_data):
+    """
+    Displays users who follow the user but are not followed back, 
+    along with the number of mutual followers.
+    """
+    follower_df = instagram_data.followers_df()
+    following_df = instagram_data.following_df()
+    if follower_df is None or following_df is None:
+        print('\nERROR: Both the followers and the following files are needed.')
+        return
+
+    diff = follow_diff(follower_df[['href', 'value']], following_df[['href', 'value']])
+    fans_df = diff.fans.rename(columns={'href': 'Profile Link', 'value': 'Username'})
+
+    print('\nUsers You Don\'t Follow Back:')
+    print(fans_df.to_string())
+    print(f'\nNumber Of Mutual Followers: \n{len(diff.mutuals)}')
+
+
 def follow_data(instagram_data: ig_data.InstagramData):
+    """
+    Shows the follow data menu until the user returns to the main menu.
+    """
     print('\nWelcome To The Follow Data Section!')
     print('------------------------------------')
-    menu_choice = input('\nPlease choose an option below!:'
-                        '\n[1] : Get Following Data\n'
-                        '[2] : Check Who Isn\'t Following You Back\n'
-                        '\n[return] : Return to main menu\n'
-                        '-------------------------------------\n')
-    while menu_choice != 'return':
-        if menu_choice == '1':
+    while True:
+        menu_choice = input('\nPlease choose an option below!:'
+                            '\n[1] : Get Following Data\n'
+                            '[2] : Check Who Isn\'t Following You Back\n'
+                            '[3] : Check Who You Don\'t Follow Back\n'
+                            '\n[return] : Return to main menu\n'
+                            '-------------------------------------\n')
+        if menu_choice == 'return':
+            print()
+            return
+        elif menu_choice == '1':
             following_data(instagram_data)
-            follow_data(instagram_data)
         elif menu_choice == '2':
             not_following_back(instagram_data)
-            follow_data(instagram_data)
+        elif menu_choice == '3':
+            fans_not_followed(instagram_data)
         else:
             print('ERROR: Invalid choice, please try again')
-            follow_data(instagram_data)
-    print()
-    main.main(instagram_data)
@@ -0,0 +1,150 @@
+"""
+Inbox Analysis Module
+
+This module runs the message analyses over every conversation in messages/inbox at once
+instead of one message JSON file at a time. Main features include:
+- Discovering every conversation folder and its message_1.json, message_2.json, ... shards.
+- Parsing the shards of each conversation in a process pool and merging them into one
+  DataFrame per conversation as well as one global DataFrame for the whole inbox.
+- Summarizing the number of messages and most common words for every conversation.
+- Running the existing message analyses and visualizations on the whole inbox or on
+  any single conversation chosen by the user.
+
+Functions:
+- find_conversation_shards(inbox_path): Maps every conversation folder to its sorted shard paths.
+- create_inbox_dfs(inbox_path, max_workers, cache): Parses every conversation in a process pool,
+  reusing the cached frames of shards that did not change.
+- create_global_df(conversations): Merges every conversation into one inbox-wide DataFrame.
+- inbox_summary(conversations): Creates a per-conversation summary DataFrame.
+- inbox_data(instagram_data): Runs the inbox analyses and lets the user pick a conversation.
+"""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import instagram_data_class as ig_data
+import message as msg
+import profiling
+import word_freq
+
+def find_conversation_shards(inbox_path) -> dict:
+    """
+    Finds every conversation folder in the inbox and the message JSON shards inside it.
+    :param inbox_path: Path to the messages/inbox folder, on disk or inside an export ZIP
+    :return: Dictionary mapping conversation folder names to their shard paths,
+             ordered message_1.json, message_2.json, ...
+    """
+    conversations = {}
+    inbox_path = Path(inbox_path) if isinstance(inbox_path, str) else inbox_path
+    for conversation_dir in sorted(inbox_path.iterdir(), key=lambda path: path.name):
+        shards = ig_data.find_shards(conversation_dir, 'message')
+        if shards:
+            conversations[conversation_dir.name] = shards
+    return conversations
+
+
+def _parse_shard(shard_path) -> pd.DataFrame:
+    """
+    Parses a single message JSON shard in a worker process.
+    :param shard_path: Path to a message JSON shard
+    :return: A dataframe containing the messages of the shard
+    """
+    return msg.create_msg_df(shard_path, streaming=True)
+
+
+@profiling.traced('inbox.create_inbox_dfs')
+def create_inbox_dfs(inbox_path, max_workers=None, cache=None) -> dict:
+    """
+    Parses every conversation in the inbox in a process pool. When a cache is given,
+    only the shards that changed since the last run are parsed again.
+    :param inbox_path: Path to the messages/inbox folder
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param cache: ParseCache object holding previously parsed shards, or None
+    :return: Dictionary mapping conversation folder names to their message DataFrames
+    """
+    conversation_shards = find_conversation_shards(inbox_path)
+    shard_paths = [shard_path for shards in conversation_shards.values() for shard_path in shards]
+    shard_dfs = dict(zip(shard_paths, ig_data.parse_shards(shard_paths, _parse_shard, 'messages',
+                                                           cache, max_workers)))
+
+    conversations = {}
+    for name, shards in conversation_shards.items():
+        frames = [shard_dfs[shard_path] for shard_path in shards if shard_dfs[shard_path] is not None]
+        if frames:
+            conversations[name] = pd.concat(frames, ignore_index=True)
+    return conversations
+
+
+@profiling.traced('inbox.create_global_df')
+def create_global_df(conversations: dict) -> pd.DataFrame:
+    """
+    Merges every conversation into one DataFrame with a categorical conversation column.
+    :param conversations: Dictionary mapping conversation names to message DataFrames
+    :return: A dataframe containing every message of the inbox
+    """
+    if not conversations:
+        return pd.DataFrame(columns=['conversation', 'sender_name', 'timestamp_ms', 'content'])
+
+    global_df = pd.concat(conversations.values(), ignore_index=True)
+    codes = np.repeat(np.arange(len(conversations)), [len(df) for df in conversations.values()])
+    global_df.insert(0, 'conversation', pd.Categorical.from_codes(codes, categories=list(conversations)))
+    return global_df
+
+
+@profiling.traced('inbox.inbox_summary')
+def inbox_summary(conversations: dict) -> pd.DataFrame:
+    """
+    Creates a summary of every conversation with its message count and most common word,
+    sorted from the most to the least active conversation.
+    :param conversations: Dictionary mapping conversation names to message DataFrames
+    :return: Summary dataframe with one row per conversation
+    """
+    rows = []
+    for name, df in conversations.items():
+        content_column = msg.filter_msg_content(df) if not df.empty else pd.Series(dtype=object)
+        most_common = word_freq.count_words(content_column, top_k=1, max_workers=1)
+        rows.append({
+            'Conversation': name,
+            'Messages': msg.get_message_df_length(content_column),
+            'Most Common Word': most_common[0][0] if most_common else '',
+        })
+    summary_df = pd.DataFrame(rows, columns=['Conversation', 'Messages', 'Most Common Word'])
+    return summary_df.sort_values(by=['Messages'], ascending=False, ignore_index=True)
+
+
+def inbox_data(instagram_data: ig_data.InstagramData):
+    """
+    Parses every conversation of the inbox, prints the inbox-wide analyses and plots,
+    then lets the user pick any conversation to see its individual analysis.
+    :param instagram_data: InstagramData class object
+    """
+    inbox_path = instagram_data.inbox_path
+    if inbox_path is None or not inbox_path.exists():
+        print(f'\nERROR: {inbox_path} does not exist.')
+        return
+
+    print('\nLoading every conversation in your inbox...')
+    conversations = create_inbox_dfs(inbox_path, cache=instagram_data.cache)
+    if not conversations:
+        print('\nERROR: No message JSON files were found in your inbox.')
+        return
+
+    global_df = create_global_df(conversations)
+    summary_df = inbox_summary(conversations)
+
+    # Each conversation is aggregated once, the inbox cube is merged from those
+    cubes = {name: msg.build_message_cube(df, instagram_data.timezone) for name, df in conversations.items()}
+    inbox_cube = msg.merge_message_cubes(cubes.values())
+
+    print(f'\nNumber Of Conversations In Your Inbox: \n{len(conversations)}')
+    print(f'\nYour Most Active Conversations: \n{summary_df.head(10).to_string(index=False)}')
+    msg.conversation_analysis(global_df, instagram_data.timezone, inbox_cube)
+
+    while True:
+        name = input('\nPlease enter a conversation name to analyze it or type "return": \n')
+        if name == 'return':
+            break
+        elif name in conversations:
+            msg.conversation_analysis(conversations[name], instagram_data.timezone, cubes[name])
+        else:
+            print('\nERROR: That conversation does not exist in your inbox.')
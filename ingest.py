@@ -0,0 +1,390 @@
+"""
+Incremental Ingestion Module
+
+This module keeps a store of everything already analysed across a series of exports of the
+same account, so a newer export that repeats years of history only costs the work of its new
+records. The store remembers a watermark per data type and per conversation, the timestamp of
+the newest record already ingested, together with content hashes of the records at that exact
+timestamp. It appends only the records past the watermark and the records at it that were not
+ingested yet, so records sharing a timestamp with the newest ingested one are never dropped.
+Main features include:
+- Reading every conversation newest first and stopping at its watermark, so older messages and
+  shards of a newer export are never decoded.
+- Appending the post comments, liked posts and liked comments newer than their watermarks.
+- Skipping only the conversations and data types whose files are missing or cannot be read,
+  reported in the summary with their watermarks and snapshots left in place, so one broken
+  file does not stop the ingestion or leave the store half updated.
+- Keeping a snapshot of the followers and following lists and recording every account that was
+  added to or removed from them since the previous export, which watermarks alone cannot show.
+- Writing the new records as chunk files and then the state atomically, so an interrupted
+  ingestion never advances a watermark past records that were not stored.
+
+Classes:
+    IngestStore: The store directory, its watermarks, and the ingest and load operations.
+
+Functions:
+- ingest_export(main_path, store_dir, max_workers): Ingests the new records of one export.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+import cache
+import inbox
+import instagram_data_class as ig_data
+import message as msg
+import profiling
+
+DEFAULT_STORE_DIR = cache.DEFAULT_CACHE_DIR / 'ingest'
+
+STATE_FILE = 'state.json'
+# Bumped whenever the layout of the stored chunks changes, so older stores are started over
+INGEST_VERSION = 2
+
+MESSAGE_COLUMNS = msg.COMPACT_COLUMNS + list(msg.FLAG_COLUMNS)
+
+# Data types appended past their watermark, mapped to their timestamp column
+TIMESTAMPED_SOURCES = {
+    'post_comments': 'Time',
+    'liked_posts': 'timestamp',
+    'liked_comments': 'timestamp',
+}
+
+# Data types kept as a snapshot of accounts, diffed against the previous export
+SNAPSHOT_SOURCES = ('followers', 'following')
+
+FOLLOW_EVENT_COLUMNS = ['value', 'href', 'timestamp', 'event', 'observed']
+
+
+def _new_messages(task) -> tuple:
+    """
+    Parses the messages of one conversation at or after its watermark, in a worker process,
+    catching any error so one broken conversation does not stop the others.
+    :param task: Tuple of the ordered shard paths of the conversation and its watermark
+    :return: Tuple of a dataframe of the messages, newest first, or None and the error message or None
+    """
+    shard_paths, watermark = task
+    try:
+        return msg.messages_df(msg.iter_messages_since(shard_paths, watermark), MESSAGE_COLUMNS), None
+    except Exception as error:
+        return None, ''.join(traceback.format_exception_only(error)).strip()
+
+
+def _record_hashes(df: pd.DataFrame) -> pd.Series:
+    """
+    :return: A content hash of every record of a dataframe, equal for equal values whatever their dtype
+    """
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+class IngestStore:
+    """
+    A directory of the records ingested from a series of exports of one account.
+
+    Attributes:
+        store_dir (Path): The directory holding the chunk files and the state.
+        state (dict): The watermarks, the hashes of the records at every watermark, the chunk files
+                      of every source, the snapshot files of the follow lists and the history of
+                      ingestions.
+
+    Methods:
+        watermark(source): Returns the timestamp of the newest record ingested from a source.
+        ingest(instagram_data, max_workers): Appends the records of an export past the watermarks.
+        load(source): Returns every record ingested from a source.
+        messages(): Returns every ingested message of every conversation.
+        follow_events(source): Returns the accounts added to and removed from a follow list.
+        flush(): Writes the state to disk.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR) -> None:
+        """
+        Opens the store directory, creating it if needed, and reads its state.
+
+        :param store_dir: The directory holding the chunk files and the state.
+        """
+        self.store_dir = Path(store_dir)
+        (self.store_dir / 'chunks').mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self.store_dir / STATE_FILE, encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.state = {}
+        if self.state.get('version') != INGEST_VERSION:
+            self.state = {'version': INGEST_VERSION, 'watermarks': {}, 'watermark_records': {},
+                          'chunks': {}, 'snapshots': {}, 'ingests': []}
+
+    def watermark(self, source: str) -> int | None:
+        """
+        :param source: A data type like 'liked_posts', or 'messages/' and a conversation folder name
+        :return: The timestamp of the newest record ingested from the source, or None if there is none
+        """
+        return self.state['watermarks'].get(source)
+
+    def flush(self) -> None:
+        """
+        Writes the state to disk, replacing the previous state atomically.
+        """
+        temp_path = self.store_dir / f'{STATE_FILE}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.store_dir / STATE_FILE)
+
+    def _write_chunk(self, source: str, df: pd.DataFrame, number: int) -> None:
+        """
+        Stores the new records of a source in a chunk file of this ingestion.
+        """
+        name = hashlib.blake2b(source.encode('utf-8'), digest_size=8).hexdigest()
+        file_name = f'{number:05d}_{name}.pkl'
+        df.reset_index(drop=True).to_pickle(self.store_dir / 'chunks' / file_name)
+        self.state['chunks'].setdefault(source, []).append(file_name)
+
+    def _past_watermark(self, source: str, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """
+        Keeps the records of a source newer than its watermark and the records at the watermark
+        whose hashes were not stored with it.
+        """
+        watermark = self.watermark(source)
+        if watermark is None:
+            return df
+        timestamps = df[column].to_numpy()
+        keep = timestamps > watermark
+        at_watermark = timestamps == watermark
+        if at_watermark.any():
+            seen = self.state['watermark_records'].get(source, [])
+            keep[at_watermark] = ~_record_hashes(df[at_watermark]).isin(seen).to_numpy()
+        return df[keep]
+
+    def _append(self, source: str, df: pd.DataFrame, column: str, number: int) -> None:
+        """
+        Stores the new records of a source and advances its watermark to the newest of them,
+        remembering the hashes of every record ingested at the new watermark.
+        """
+        self._write_chunk(source, df, number)
+        newest = int(df[column].max())
+        records = set(_record_hashes(df[df[column].to_numpy() == newest]).tolist())
+        if newest == self.watermark(source):
+            records.update(self.state['watermark_records'].get(source, []))
+        self.state['watermarks'][source] = newest
+        self.state['watermark_records'][source] = sorted(records)
+
+    def _ingest_messages(self, instagram_data: ig_data.InstagramData, number: int, max_workers=None) -> tuple:
+        """
+        Appends the messages of every conversation past its watermark.
+        :return: Tuple of a dictionary mapping the sources that got new messages to their number
+                 and a dictionary mapping the sources that could not be read to their error
+        """
+        inbox_path = instagram_data.inbox_path
+        if inbox_path is None or not inbox_path.exists():
+            return {}, {}
+        conversation_shards = inbox.find_conversation_shards(inbox_path)
+        sources = [f'messages/{name}' for name in conversation_shards]
+        tasks = [(shards, -1 if self.watermark(source) is None else self.watermark(source))
+                 for source, shards in zip(sources, conversation_shards.values())]
+        if len(tasks) == 1:
+            results = [_new_messages(tasks[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(profiling.traced_map(executor, _new_messages, tasks))
+
+        appended = {}
+        errors = {}
+        for source, (df, error) in zip(sources, results):
+            if error is not None:
+                # The watermark stays where it was, so the next export retries the conversation
+                print(f'ERROR: {source} could not be read: {error}')
+                errors[source] = error
+                continue
+            df = self._past_watermark(source, df, 'timestamp_ms')
+            if df.empty:
+                continue
+            self._append(source, df, 'timestamp_ms', number)
+            appended[source] = len(df)
+        return appended, errors
+
+    @staticmethod
+    def _load_source(instagram_data: ig_data.InstagramData, source: str, errors: dict) -> pd.DataFrame | None:
+        """
+        Loads every record of a data type, recording the error of a missing or broken file.
+        :return: The records, or None if the files could not be read
+        """
+        try:
+            df = getattr(instagram_data, f'{source}_df')()
+            error = None if df is not None else 'missing or could not be parsed'
+        except Exception as exception:
+            df, error = None, ''.join(traceback.format_exception_only(exception)).strip()
+        if error is not None:
+            # The watermark or snapshot stays where it was, so the next export retries the source
+            print(f'ERROR: {source} could not be read: {error}')
+            errors[source] = error
+        return df
+
+    def _ingest_timestamped(self, instagram_data: ig_data.InstagramData, number: int, errors: dict) -> dict:
+        """
+        Appends the post comments, liked posts and liked comments past their watermarks.
+        :return: Dictionary mapping the sources that got new records to their number
+        """
+        appended = {}
+        for source, column in TIMESTAMPED_SOURCES.items():
+            df = self._load_source(instagram_data, source, errors)
+            if df is None or df.empty:
+                continue
+            df = self._past_watermark(source, df, column)
+            if df.empty:
+                continue
+            self._append(source, df, column, number)
+            appended[source] = len(df)
+        return appended
+
+    def _ingest_snapshots(self, instagram_data: ig_data.InstagramData, number: int, observed: int,
+                          errors: dict) -> dict:
+        """
+        Diffs the followers and following lists against their previous snapshots. The first
+        export only stores the snapshots, later ones record every added and removed account.
+        :return: Dictionary mapping the follow lists to their numbers of added and removed accounts
+        """
+        changes = {}
+        for source in SNAPSHOT_SOURCES:
+            df = self._load_source(instagram_data, source, errors)
+            if df is None:
+                continue
+            current = pd.DataFrame({'value': df['value'].astype(str).to_numpy(dtype=object),
+                                    'href': df['href'].to_numpy(dtype=object),
+                                    'timestamp': df['timestamp'].to_numpy()})
+            previous_file = self.state['snapshots'].get(source)
+            file_name = f'{number:05d}_{source}_snapshot.pkl'
+            current.to_pickle(self.store_dir / 'chunks' / file_name)
+            self.state['snapshots'][source] = file_name
+            if previous_file is None:
+                continue
+
+            previous = pd.read_pickle(self.store_dir / 'chunks' / previous_file)
+            added = current[~current['value'].isin(previous['value'])].assign(event='added')
+            removed = previous[~previous['value'].isin(current['value'])].assign(event='removed')
+            changes[source] = {'added': len(added), 'removed': len(removed)}
+            if len(added) or len(removed):
+                events = pd.concat([added, removed], ignore_index=True).assign(observed=observed)
+                self._write_chunk(f'{source}_events', events[FOLLOW_EVENT_COLUMNS], number)
+        return changes
+
+    @profiling.traced('ingest.ingest')
+    def ingest(self, instagram_data: ig_data.InstagramData, max_workers=None) -> dict:
+        """
+        Appends the records of an export newer than the watermarks and diffs the follow lists.
+
+        :param instagram_data: InstagramData object with initialized paths.
+        :param max_workers: The number of worker processes, defaults to the number of CPUs.
+        :return: The summary of the ingestion added to the history of the store, with the
+                 conversations and data types that could not be read and their errors under 'errors'.
+        """
+        number = len(self.state['ingests']) + 1
+        observed = int(time.time())
+        appended, errors = self._ingest_messages(instagram_data, number, max_workers)
+        summary = {
+            'export': str(instagram_data.main_path),
+            'ingested_at': observed,
+            'appended': {**appended, **self._ingest_timestamped(instagram_data, number, errors)},
+            'follow_changes': self._ingest_snapshots(instagram_data, number, observed, errors),
+            'errors': errors,
+        }
+        self.state['ingests'].append(summary)
+        # The chunk files are complete before the state that points to them is replaced
+        previous_snapshots = set((self.store_dir / 'chunks').glob('*_snapshot.pkl'))
+        self.flush()
+        current_snapshots = {self.store_dir / 'chunks' / name for name in self.state['snapshots'].values()}
+        for path in previous_snapshots - current_snapshots:
+            path.unlink(missing_ok=True)
+        return summary
+
+    def load(self, source: str) -> pd.DataFrame | None:
+        """
+        Reads every chunk ingested from a source, oldest ingestion first.
+
+        :param source: A key of the watermarks, or a follow list name followed by '_events'.
+        :return: The concatenated records, or None if nothing was ingested from the source.
+        """
+        files = self.state['chunks'].get(source)
+        if not files:
+            return None
+        frames = [pd.read_pickle(self.store_dir / 'chunks' / file_name) for file_name in files]
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def messages(self) -> pd.DataFrame | None:
+        """
+        Reads every ingested message with the name of its conversation as a categorical column,
+        the messages of every conversation newest first like in a message JSON file.
+
+        :return: The messages of every conversation, or None if no messages were ingested.
+        """
+        conversations = {}
+        for source, files in self.state['chunks'].items():
+            if source.startswith('messages/'):
+                # Every chunk is newest first, so reading the latest ingestion first keeps the
+                # newest-first order of a conversation across exports
+                frames = [pd.read_pickle(self.store_dir / 'chunks' / file_name) for file_name in reversed(files)]
+                conversations[source.removeprefix('messages/')] = pd.concat(frames, ignore_index=True)
+        if not conversations:
+            return None
+        global_df = inbox.create_global_df(conversations)
+        # Senders of conversations and chunks with different categories are merged back into one categorical
+        global_df['sender_name'] = global_df['sender_name'].astype('category')
+        return global_df
+
+    def follow_events(self, source='followers') -> pd.DataFrame:
+        """
+        Reads the accounts added to and removed from a follow list across the ingested exports.
+
+        :param source: 'followers' or 'following'.
+        :return: DataFrame of the account, href, follow timestamp, 'added' or 'removed', and
+                 the UNIX time of the ingestion that observed the change.
+        """
+        events = self.load(f'{source}_events')
+        return events if events is not None else pd.DataFrame(columns=FOLLOW_EVENT_COLUMNS)
+
+
+def ingest_export(main_path, store_dir=DEFAULT_STORE_DIR, max_workers=None) -> dict:
+    """
+    Ingests the records of an export newer than the watermarks of a store.
+
+    :param main_path: The path to the export folder or ZIP file.
+    :param store_dir: The directory of the store.
+    :param max_workers: The number of worker processes, defaults to the number of CPUs.
+    :return: The summary of the ingestion.
+    """
+    instagram_data = ig_data.InstagramData(main_path)
+    instagram_data.init_paths()
+    return IngestStore(store_dir).ingest(instagram_data, max_workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append the records of an export that are newer than '
+                                                 'the ones already ingested from earlier exports.')
+    parser.add_argument('export', help='path to the Instagram Data folder or downloaded .zip file')
+    parser.add_argument('-s', '--store', default=str(DEFAULT_STORE_DIR),
+                        help=f'directory of the ingested records (default: {DEFAULT_STORE_DIR})')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    args = parser.parse_args()
+
+    ingestion = ingest_export(args.export, args.store, args.workers)
+    messages = sum(count for source, count in ingestion['appended'].items() if source.startswith('messages/'))
+    print(f'\nNew messages: {messages} in '
+          f'{sum(source.startswith("messages/") for source in ingestion["appended"])} conversations')
+    for source in TIMESTAMPED_SOURCES:
+        print(f'New {source.replace("_", " ")}: {ingestion["appended"].get(source, 0)}')
+    for source in SNAPSHOT_SOURCES:
+        changes = ingestion['follow_changes'].get(source)
+        if source in ingestion['errors']:
+            print(f'{source.capitalize()}: could not be read, previous snapshot kept')
+        elif changes is None:
+            print(f'{source.capitalize()}: first snapshot stored')
+        else:
+            print(f'{source.capitalize()}: {changes["added"]} added, {changes["removed"]} removed')
+    if ingestion['errors']:
+        print(f'Skipped {len(ingestion["errors"])} conversations and data types that could not be read, '
+              f'they are retried with the next export')
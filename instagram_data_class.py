@@ -1,5 +1,113 @@
-import sys
+import importlib
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import export_files
+import profiling
+import timeutil
+from cache import ParseCache
+
+# The attribute holding the first shard path of each data type
+SINGLE_PATH_ATTRIBUTES = {
+    'followers': 'followers_path',
+    'following': 'following_path',
+    'liked_comments': 'liked_comments',
+    'liked_posts': 'liked_posts',
+    'post_comments': 'post_comments',
+}
+
+# The module and parser function of each data type, and the column its shards are sorted by.
+# The modules are imported on first use, so a data type only loads the libraries it needs.
+DATA_TYPE_PARSERS = {
+    'followers': ('followers', 'create_follower_df', None),
+    'following': ('followers', 'create_following_df', None),
+    'liked_comments': ('liked', 'create_liked_comments_df', None),
+    'liked_posts': ('liked', 'create_liked_posts_df', None),
+    'post_comments': ('comments', 'create_post_df', 'Time'),
+}
+
+
+def find_shards(directory, stem):
+    """
+    Finds every shard of an export file. Large accounts get their data split into 
+    stem_1.json, stem_2.json, ... while smaller ones get a single stem.json file.
+
+    :param directory: The directory holding the export file, on disk or inside an export ZIP.
+    :param stem: The file name without the shard number and extension, like 'followers'.
+    :return: The list of shard paths ordered by shard number, or an empty list.
+    """
+    directory = Path(directory) if isinstance(directory, str) else directory
+    if not directory.is_dir():
+        return []
+
+    shard_pattern = re.compile(rf'^{re.escape(stem)}(?:_(\d+))?\.json$')
+    shards = []
+    for path in directory.iterdir():
+        match = shard_pattern.match(path.name)
+        if match:
+            shards.append((int(match.group(1) or 0), path))
+    return [path for _, path in sorted(shards)]
+
+
+def parse_shards(paths, parser, name, cache=None, max_workers=None):
+    """
+    Parses every shard of an export file, reusing cached DataFrames when a cache is 
+    given and parsing the remaining shards concurrently in a process pool.
+
+    :param paths: The list of shard paths.
+    :param parser: A picklable function taking a path and returning the parsed DataFrame.
+    :param name: The name the parsed DataFrames are cached under.
+    :param cache: The ParseCache holding previously parsed shards, or None.
+    :param max_workers: The number of worker processes, defaults to the number of CPUs,
+                        1 to parse in this process.
+    :return: The list of parsed DataFrames in shard order, None for shards that failed.
+    """
+    frames = [None] * len(paths)
+    if cache is not None:
+        frames = [cache.get(path, name, flush=False) for path in paths]
+    missing = [i for i, frame in enumerate(frames) if frame is None]
+
+    tasks = [(parser, paths[i]) for i in missing]
+    if len(tasks) == 1 or max_workers == 1:
+        results = [_timed_parse(task) for task in tasks]
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Thousands of small shards are cheaper to ship to the workers in batches
+            chunksize = max(1, len(tasks) // ((max_workers or 8) * 4))
+            results = list(profiling.traced_map(executor, _timed_parse, tasks, chunksize))
+    else:
+        results = []
+    for i, (frame, _, error) in zip(missing, results):
+        if error is not None:
+            # A broken shard is reported and left out instead of failing the whole data type
+            print(f'ERROR: {paths[i]}: {error}')
+        frames[i] = frame
+
+    if cache is not None:
+        for i in missing:
+            if frames[i] is not None:
+                cache.put(paths[i], frames[i], name, flush=False)
+        cache.flush()
+    return frames
+
+
+def _timed_parse(task):
+    """
+    Parses a single shard in a worker process, catching any error so one broken file does
+    not stop the other files from loading.
+
+    :param task: Tuple of the parser function and the shard path.
+    :return: Tuple of the parsed DataFrame or None, the seconds it took and the error message or None.
+    """
+    parser, path = task
+    start = time.perf_counter()
+    try:
+        df = parser(path)
+        error = None if df is not None else 'could not be parsed'
+    except Exception as exception:
+        df, error = None, f'{type(exception).__name__}: {exception}'
+    return df, time.perf_counter() - start, error
 
 
 class InstagramData:
@@ -7,64 +115,316 @@ class InstagramData:
     A class to represent the Instagram data.
     
     Attributes:
-        main_path (str): The main path to the Instagram data.
+        main_path (str): The main path to the Instagram data, an extracted folder or the export ZIP.
+        root (Path): The root of the export, an ExportZipPath when reading straight from the ZIP.
         post_comments (Path): The path to the post comments JSON file.
         followers_path (Path): The path to the followers JSON file.
         following_path (Path): The path to the following JSON file.
         liked_comments (Path): The path to the liked comments JSON file.
         liked_posts (Path): The path to the liked posts JSON file.
+        shard_paths (dict): Every shard of each data type, keyed by the data type name.
+        timezone (str): The timezone timestamps are shown and bucketed in.
+        inbox_path (Path): The path to the messages/inbox folder of conversations.
+        cache (ParseCache): The on-disk cache of parsed DataFrames, or None if caching is off.
+        max_workers (int): The number of worker processes shards are parsed with, 1 to parse in this process.
     
     Methods:
         init_paths(): Initializes the paths for post comments, 
                       followers, following, liked comments, and liked posts.
-        check_paths(): Checks if the initialized paths exist and raises an 
-                       exception if any path does not exist.
+        check_paths(): Checks if the initialized paths exist and returns the missing ones.
+        preload(max_workers): Parses every shard of every data type concurrently and 
+                              reports the load time and error of every file.
+        export_file(file_path): Resolves a file path typed by the user inside the export.
+        load_df(path, parser, name): Loads the DataFrame parsed from a file, 
+                                     using the cache when it is enabled.
+        clear_cache(): Drops every cached DataFrame.
+        followers_df(), following_df(), post_comments_df(), liked_comments_df(), 
+        liked_posts_df(): Parse every shard of their file on first use and return 
+                          the memoized DataFrame until a shard changes.
     """
 
 
-    def __init__(self, main_path) -> None:
+    def __init__(self, main_path, cache_dir=None, timezone=timeutil.DEFAULT_TIMEZONE, max_workers=None) -> None:
         """
         Initializes the Instagram_data object with the main path to the Instagram data.
 
-        :param main_path: The main path to the Instagram data.
+        :param main_path: The main path to the Instagram data, either the extracted 
+                          folder or the downloaded ZIP file.
         :type main_path: str
+        :param cache_dir: The directory to cache parsed DataFrames in, or None to disable caching.
+        :type cache_dir: str
+        :param timezone: The timezone timestamps are shown and bucketed in.
+        :type timezone: str
+        :param max_workers: The number of worker processes shards are parsed with, defaults to
+                            the number of CPUs, 1 to parse in this process.
+        :type max_workers: int
         """
         self.main_path = main_path
+        self.root = export_files.export_root(main_path)
         self.followers_path = None
         self.following_path = None
         self.liked_comments = None
         self.liked_posts = None
         self.post_comments = None
+        self.inbox_path = None
+        self.shard_paths = {}
+        self.timezone = timezone
+        self.cache = ParseCache(cache_dir) if cache_dir else None
+        self.max_workers = max_workers
+        self._loaded = {}
 
 
     def init_paths(self):
         """
         Initializes the paths for post comments, followers, 
-        following, liked comments, and liked posts.
+        following, liked comments, liked posts, and the messages inbox.
 
         :return: None
         """
-        self.followers_path = Path(self.main_path + '/connections/followers_and_following/followers_1.json')
-        self.following_path = Path(self.main_path + '/connections/followers_and_following/following.json')
-        self.liked_comments = Path(self.main_path + '/your_instagram_activity/likes/liked_comments.json')
-        self.liked_posts = Path(self.main_path + '/your_instagram_activity/likes/liked_posts.json')
-        self.post_comments = Path(self.main_path + '/your_instagram_activity/comments/post_comments_1.json')
+        self.followers_path = self.root / 'connections/followers_and_following/followers_1.json'
+        self.following_path = self.root / 'connections/followers_and_following/following.json'
+        self.liked_comments = self.root / 'your_instagram_activity/likes/liked_comments.json'
+        self.liked_posts = self.root / 'your_instagram_activity/likes/liked_posts.json'
+        self.post_comments = self.root / 'your_instagram_activity/comments/post_comments_1.json'
+
+        # Large accounts get followers_2.json, post_comments_2.json, ... next to the first shard
+        for name, attribute in SINGLE_PATH_ATTRIBUTES.items():
+            path = getattr(self, attribute)
+            self.shard_paths[name] = find_shards(path.parent, name) or [path]
+
+        # Older exports keep messages at the top level instead of under your_instagram_activity
+        self.inbox_path = self.root / 'your_instagram_activity/messages/inbox'
+        if not self.inbox_path.exists() and (self.root / 'messages/inbox').exists():
+            self.inbox_path = self.root / 'messages/inbox'
 
 
     def check_paths(self):
         """
-        Checks if the initialized paths exist and raises a FileNotFoundError 
-        if any path does not exist.
+        Checks if the initialized paths exist and prints every missing one, so all of 
+        the missing files are reported together.
 
-        :return: None
-        :raise FileNotFoundError: If any initialized path does not exist.
+        :return: The list of paths that do not exist, empty if every path exists.
         """
-        paths = [self.followers_path, self.following_path, self.liked_comments, self.liked_posts,
-                 self.post_comments]
+        paths = [path for name in SINGLE_PATH_ATTRIBUTES for path in self._shards(name)]
+        missing = []
         print()
         for path in paths:
             if path and path.exists():
                 print(f"{path} loaded.")
             else:
                 print(f"ERROR: {path} does not exist.")
-                sys.exit()
+                missing.append(path)
+        return missing
+
+
+    @profiling.traced('instagram_data.preload')
+    def preload(self, max_workers=None):
+        """
+        Parses every shard of the followers, following, liked comments, liked posts and 
+        post comments files at once in a single process pool, largest files first, so 
+        loading everything takes about as long as the slowest file. Shards found in the 
+        cache are not parsed again. Missing and broken files are reported with the rest 
+        instead of stopping the load, and the data types they belong to stay unloaded,
+        so their accessors report them again instead of returning partial data.
+
+        :param max_workers: The number of worker processes, defaults to the number of CPUs.
+        :return: DataFrame with the data type, file, load seconds, number of rows, whether 
+                 it came from the cache and the error of every file.
+        """
+        import pandas as pd
+
+        results = {}
+        signatures = {}
+        tasks = []
+        for name in DATA_TYPE_PARSERS:
+            paths = self._shards(name)
+            missing = [path for path in paths if not path.exists()]
+            for path in missing:
+                results[name, str(path)] = (None, 0.0, False, 'does not exist')
+            if missing:
+                continue
+            signatures[name] = tuple(export_files.file_signature(path) for path in paths)
+            parser = self._parser(name)[0]
+            for path, signature in zip(paths, signatures[name]):
+                start = time.perf_counter()
+                df = self.cache.get(path, name, flush=False) if self.cache is not None else None
+                if df is not None:
+                    results[name, str(path)] = (df, time.perf_counter() - start, True, None)
+                else:
+                    tasks.append((name, path, parser, signature[1]))
+
+        # The largest files are started first so no worker is left parsing a big file alone at the end
+        tasks.sort(key=lambda task: task[3], reverse=True)
+        if tasks:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                parsed = profiling.traced_map(executor, _timed_parse, [(parser, path) for _, path, parser, _ in tasks])
+                for (name, path, _, _), (df, seconds, error) in zip(tasks, parsed):
+                    results[name, str(path)] = (df, seconds, False, error)
+                    if df is not None and self.cache is not None:
+                        self.cache.put(path, df, name, flush=False)
+        if self.cache is not None:
+            self.cache.flush()
+
+        for name, signature in signatures.items():
+            frames = [results[name, str(path)][0] for path in self._shards(name)]
+            # A data type with a broken shard is parsed again on first use instead of serving partial data
+            if all(frame is not None for frame in frames):
+                self._store_frames(name, signature, frames)
+
+        rows = []
+        for name in DATA_TYPE_PARSERS:
+            for path in self._shards(name):
+                df, seconds, cached, error = results[name, str(path)]
+                rows.append((name, str(path), seconds, None if df is None else len(df), cached, error))
+        report = pd.DataFrame(rows, columns=['data_type', 'file', 'seconds', 'rows', 'cached', 'error'])
+        return report.astype({'rows': 'Int64'})
+
+
+    def export_file(self, file_path):
+        """
+        Resolves a file path typed by the user. Paths that do not exist on disk are 
+        looked up relative to the root of the export, so files inside an export ZIP 
+        can be given as e.g. your_instagram_activity/messages/inbox/name/message_1.json.
+
+        :param file_path: The file path typed by the user.
+        :return: A Path on disk, or a path relative to the export root.
+        """
+        if Path(file_path).exists():
+            return Path(file_path)
+        return self.root / file_path.lstrip('/')
+
+
+    def load_df(self, path, parser, name):
+        """
+        Loads the DataFrame parsed from a file. When caching is enabled, the cached 
+        frame is returned if the file has not changed since it was last parsed.
+
+        :param path: The path to the JSON file to parse.
+        :param parser: A function taking the path and returning the parsed DataFrame.
+        :param name: The name the parsed DataFrame is cached under.
+        :return: The parsed DataFrame.
+        """
+        if self.cache is None:
+            return parser(path)
+        return self.cache.get_or_parse(path, parser, name)
+
+
+    def clear_cache(self):
+        """
+        Drops every cached DataFrame so the next loads parse the JSON files again.
+
+        :return: None
+        """
+        self._loaded.clear()
+        if self.cache is not None:
+            self.cache.invalidate()
+
+
+    def _shards(self, name):
+        """
+        :param name: The data type name, a key of SINGLE_PATH_ATTRIBUTES.
+        :return: The list of shard paths of the data type.
+        """
+        return self.shard_paths.get(name) or [getattr(self, SINGLE_PATH_ATTRIBUTES[name])]
+
+
+    @staticmethod
+    def _parser(name):
+        """
+        Imports the module parsing a data type.
+
+        :param name: The data type name, a key of DATA_TYPE_PARSERS.
+        :return: Tuple of the picklable parser function and the column the shards are sorted by.
+        """
+        module_name, function_name, sort_by = DATA_TYPE_PARSERS[name]
+        return getattr(importlib.import_module(module_name), function_name), sort_by
+
+
+    def _store_frames(self, name, signature, frames, memoize=True):
+        """
+        Concatenates the parsed shards of a data type and memoizes the result under 
+        the signature of its shards.
+
+        :param name: The data type name.
+        :param signature: The tuple of file signatures of the shards.
+        :param frames: The list of parsed DataFrames of the shards that could be parsed.
+        :param memoize: Whether to memoize the result, False when some shards failed.
+        :return: The DataFrame, or None if no shard could be parsed.
+        """
+        if not frames:
+            return None
+        if len(frames) == 1:
+            df = frames[0]
+        else:
+            import pandas as pd
+            df = pd.concat(frames, ignore_index=True)
+            sort_by = DATA_TYPE_PARSERS[name][2]
+            if sort_by is not None:
+                df = df.sort_values(by=[sort_by])
+        if memoize:
+            self._loaded[name] = (signature, df)
+        return df
+
+
+    def _memoized_df(self, name):
+        """
+        Returns the DataFrame parsed from every shard of a data type, parsing the shards 
+        only on first use or when a shard was added, removed, or changed its size or 
+        modification time. Missing shards are reported and skipped. The DataFrame is only 
+        memoized when every remaining shard could be parsed, so a broken shard is retried.
+
+        :param name: The data type name the parsed DataFrame is memoized and cached under.
+        :return: The parsed DataFrame, or None if no shard exists or could be parsed.
+        """
+        paths = []
+        for path in self._shards(name):
+            if path.exists():
+                paths.append(path)
+            else:
+                print(f"ERROR: {path} does not exist.")
+        if not paths:
+            return None
+        signature = tuple(export_files.file_signature(path) for path in paths)
+        loaded = self._loaded.get(name)
+        if loaded is not None and loaded[0] == signature:
+            return loaded[1]
+
+        parser = self._parser(name)[0]
+        frames = parse_shards(paths, parser, name, self.cache, self.max_workers)
+        return self._store_frames(name, signature, [frame for frame in frames if frame is not None],
+                                  memoize=all(frame is not None for frame in frames))
+
+
+    def followers_df(self):
+        """
+        :return: The DataFrame of every followers JSON shard.
+        """
+        return self._memoized_df('followers')
+
+
+    def following_df(self):
+        """
+        :return: The DataFrame of every following JSON shard.
+        """
+        return self._memoized_df('following')
+
+
+    def post_comments_df(self):
+        """
+        :return: The DataFrame of every post comments JSON shard.
+        """
+        return self._memoized_df('post_comments')
+
+
+    def liked_comments_df(self):
+        """
+        :return: The DataFrame of every liked comments JSON shard.
+        """
+        return self._memoized_df('liked_comments')
+
+
+    def liked_posts_df(self):
+        """
+        :return: The DataFrame of every liked posts JSON shard.
+        """
+        return self._memoized_df('liked_posts')
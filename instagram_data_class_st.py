@@ -1,15 +1,46 @@
+import hashlib
+import io
+import pandas as pd
+import streamlit as st
+
+# Number of parsed uploads kept in memory across reruns and pages
+UPLOAD_CACHE_ENTRIES = 32
+
+
+@st.cache_data(max_entries=UPLOAD_CACHE_ENTRIES, show_spinner=False)
+def _parse_json_bytes(content_hash, _data):
+    """
+    Parses the bytes of an uploaded JSON file. Streamlit keys the cache by the content 
+    hash only, since arguments starting with an underscore are not hashed.
+    """
+    return pd.read_json(io.BytesIO(_data))
+
+
+def parse_upload(uploaded_file):
+    """
+    Parses an uploaded JSON file once per distinct content, so reruns and other pages 
+    reuse the parsed DataFrame instead of parsing the upload again.
+
+    :param uploaded_file: A file returned by st.file_uploader, or None.
+    :return: The parsed DataFrame, or None if no file was uploaded.
+    """
+    if uploaded_file is None:
+        return None
+    data = uploaded_file.getvalue()
+    return _parse_json_bytes(hashlib.sha256(data).hexdigest(), data)
+
 
 class InstagramData_ST:
     """
-    Class used to store all Instagram data information
+    Class used to store all Instagram data information as parsed DataFrames
     """
     
     def __init__(self, following_file, followers_file, liked_comments, liked_posts, post_comments):
-        self.following_file = following_file
-        self.followers_file = followers_file
-        self.liked_comments = liked_comments
-        self.liked_posts = liked_posts
-        self.post_comments = post_comments
+        self.following_file = parse_upload(following_file)
+        self.followers_file = parse_upload(followers_file)
+        self.liked_comments = parse_upload(liked_comments)
+        self.liked_posts = parse_upload(liked_posts)
+        self.post_comments = parse_upload(post_comments)
         
     
         
@@ -0,0 +1,129 @@
+"""
+JSON Streaming Module
+
+This module provides an incremental reader for the large JSON files of an Instagram export.
+Instead of loading the whole file with json.load, the file is read in fixed size chunks and
+the items of a single array are decoded and yielded one at a time, so only the current chunk
+and the current item are held in memory.
+
+Functions:
+- iter_array_items(input_path, key, chunk_size): Yields each item of a JSON array, either the
+  top-level array of the file or the array stored under a top-level key.
+"""
+
+import json
+import export_files
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = ' \t\n\r'
+# Characters that can follow a complete value
+_DELIMITERS = _WHITESPACE + ',:]}'
+
+
+class _ChunkReader:
+    """
+    Keeps a sliding text buffer over a file, refilled from the file in chunks
+    """
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Drops the consumed part of the buffer and reads the next chunk from the file.
+        :return: False if the end of the file was already reached
+        """
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it.
+        :return: The next non-whitespace character or an empty string at the end of the file
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, character: str) -> None:
+        """
+        Consumes the next non-whitespace character, which must be the given character.
+        :raise json.JSONDecodeError: If a different character is found
+        """
+        if self.peek() != character:
+            raise json.JSONDecodeError(f'Expecting {character!r}', self.buffer, self.pos)
+        self.pos += 1
+
+    def decode(self, decoder: json.JSONDecoder):
+        """
+        Decodes the next complete JSON value, reading more chunks until the value is complete.
+        :return: The decoded Python object
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number cut by the end of the buffer, even right after '1.' or '1e-' where only
+                # its integer prefix decodes, is complete only once a delimiter follows it
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if not is_number or self.eof or (end < len(self.buffer) and self.buffer[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_array_items(input_path, key=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the items of a JSON array one at a time without loading the whole file.
+    :param input_path: Path to a JSON file
+    :param key: Top-level key of the array to stream, or None if the file itself is an array
+    :param chunk_size: Number of characters read from the file at a time
+    :return: Generator of the decoded array items
+    :raise KeyError: If the key does not exist in the top-level object
+    :raise json.JSONDecodeError: If the file is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    with export_files.open_text(input_path) as file:
+        reader = _ChunkReader(file, chunk_size)
+
+        if key is not None:
+            reader.expect('{')
+            while True:
+                if reader.peek() == '}':
+                    raise KeyError(key)
+                current_key = reader.decode(decoder)
+                reader.expect(':')
+                if current_key == key:
+                    break
+                # Skip over the values of every other top-level key
+                reader.decode(decoder)
+                if reader.peek() == ',':
+                    reader.pos += 1
+
+        reader.expect('[')
+        if reader.peek() == ']':
+            return
+        while True:
+            yield reader.decode(decoder)
+            if reader.peek() == ',':
+                reader.pos += 1
+            else:
+                reader.expect(']')
+                return
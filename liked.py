@@ -1,64 +1,126 @@
-import json
 import pathlib
+from typing import TYPE_CHECKING
+import numpy as np
 import pandas as pd
 import instagram_data_class as ig_data
 import message as msg
-import main
+import profiling
+import string_list
+import timeutil
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
+# The value column is dropped because it only holds the thumbs up emoji of the like
+LIKED_COLUMNS = ['title', 'href', 'timestamp']
+
+
+@profiling.traced('liked.create_liked_comments_df')
 def create_liked_comments_df(file_path: pathlib.Path):
     try:
-        # load the json data
-        with open(file_path, encoding='UTF-8') as f:
-            liked_cmt_json = json.load(f)
+        # one pass over the entries gives the post owner, the href and the timestamp columns,
+        # the timestamp kept as int64 UNIX seconds for timeutil to format when shown
+        return string_list.create_string_list_df(file_path, 'likes_comment_likes', LIKED_COLUMNS)
+    except Exception as error:
+        print(f'\nERROR: {error}')
 
-        # break up json into two dataframes
-        post_owner = pd.DataFrame([cmt['title'] for cmt in liked_cmt_json['likes_comment_likes']])
-        metadata_df = pd.DataFrame([cmt['string_list_data'][0] for cmt in liked_cmt_json['likes_comment_likes']])
+@profiling.traced('liked.create_liked_posts_df')
+def create_liked_posts_df(file_path: pathlib.Path):
+    try:
+        # one pass over the entries gives the post owner, the href and the timestamp columns
+        return string_list.create_string_list_df(file_path, 'likes_media_likes', LIKED_COLUMNS)
+    except Exception as error:
+        print(f'\nERROR: {error}')
 
-        # combine dfs into one horizontal df with postowner, post href, comment value, and timestamp
-        df = pd.concat([post_owner, metadata_df], axis=1)
 
-        # delete the value column bc it just shows thumbs up emoji (user liked it)
-        df = df.drop(['value'], axis=1)
+@profiling.traced('liked.top_liked_accounts')
+def top_liked_accounts(df: pd.DataFrame, top_k=10) -> pd.DataFrame:
+    """
+    Counts the likes given to every account from the categorical title column.
+    :param df: DataFrame of liked posts or liked comments
+    :param top_k: Number of accounts to return
+    :return: DataFrame of the most liked accounts and their number of likes
+    """
+    counts = df['title'].value_counts(sort=True).head(top_k)
+    return pd.DataFrame({'Account': counts.index.astype(str), 'Likes': counts.to_numpy()})
 
-        # convert the timestamp column to show correct date unit, not in ms
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
 
-        print(df.head())
+@profiling.traced('liked.likes_per_month')
+def likes_per_month(df: pd.DataFrame, tz=timeutil.DEFAULT_TIMEZONE) -> pd.Series:
+    """
+    Counts the likes of every local month from the first to the last like, months
+    without likes included, with one bincount over the month numbers.
+    :param df: DataFrame of liked posts or liked comments
+    :param tz: Timezone the months are counted in
+    :return: Series of like counts indexed by the datetime64 start of every month
+    """
+    if df.empty:
+        return pd.Series(dtype=np.int64)
+    months = (timeutil.local_dates(df['timestamp'], 's', tz).astype('datetime64[M]').astype(np.int64))
+    first_month = months.min()
+    counts = np.bincount(months - first_month)
+    index = np.arange(first_month, first_month + len(counts)).astype('datetime64[M]').astype('datetime64[ns]')
+    return pd.Series(counts, index=pd.DatetimeIndex(index, name='month'), name='likes')
+
+
+@profiling.traced('liked.plot_likes_over_time')
+def plot_likes_over_time(monthly_likes: pd.Series) -> 'Figure':
+    """
+    Plots the number of likes given every month
+    :param monthly_likes: Series of like counts per month from likes_per_month
+    :return: The Matplotlib figure of the time series
+    """
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(monthly_likes.index, monthly_likes.to_numpy())
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Number of Likes')
+    ax.set_title('Number of Posts Liked Each Month')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+
+def liked_posts_data(instagram_data: ig_data.InstagramData):
+    """
+    Prints the number of liked posts, the most liked accounts and the likes of every
+    year, then plots the likes of every month.
+    """
+    df = instagram_data.liked_posts_df()
+    if df is None or df.empty:
+        print('\nERROR: No liked posts were found.')
+        return
+
+    monthly_likes = likes_per_month(df, instagram_data.timezone)
+    yearly_likes = monthly_likes.groupby(monthly_likes.index.year).sum()
+    print(f'\nNumber Of Liked Posts: \n{len(df)}')
+    print(f'\nAccounts You Liked The Most Posts Of: \n{top_liked_accounts(df).to_string(index=False)}')
+    print(f'\nLiked Posts Per Year: \n{yearly_likes.rename_axis("Year").to_string()}')
+    msg.show_figure(plot_likes_over_time(monthly_likes))
 
-        return df
-    except Exception as error:
-        print(f'\nERROR: {error}')
 
 def liked_menu(instagram_data: ig_data.InstagramData):
+    """
+    Shows the liked data menu until the user returns to the main menu.
+    """
     print('\nWelcome To The Liked Data Section!')
     print('------------------------------------')
-    menu_choice = input('\nPlease choose an option below!:'
-                        '\n[1] : Check Liked Comments Data\n'
-                        '[2] : Check Liked Posts Data\n'
-                        '\n[return] : Return to main menu\n'
-                        '-------------------------------------\n')
-    while menu_choice != 'return':
-        if menu_choice == '1':
-            create_liked_comments_df(instagram_data.liked_comments)
-            liked_menu(instagram_data)
+    while True:
+        menu_choice = input('\nPlease choose an option below!:'
+                            '\n[1] : Check Liked Comments Data\n'
+                            '[2] : Check Liked Posts Data\n'
+                            '\n[return] : Return to main menu\n'
+                            '-------------------------------------\n')
+        if menu_choice == 'return':
+            print()
+            return
+        elif menu_choice == '1':
+            df = instagram_data.liked_comments_df()
+            if df is not None:
+                liked_head = df.head().copy()
+                liked_head['timestamp'] = timeutil.format_times(liked_head['timestamp'], 's', instagram_data.timezone)
+                print(liked_head)
         elif menu_choice == '2':
-            print('\nliked post section coming soon')
-
-            menu_choice = input('\nPlease choose an option below!:'
-                                '\n[1] : Check Liked Comments Data\n'
-                                '[2] : Check Liked Posts Data\n'
-                                '\n[return] : Return to main menu\n'
-                                '-------------------------------------\n')
+            liked_posts_data(instagram_data)
         else:
             print('\nInvalid choice, please try again!')
-
-            menu_choice = input('\nPlease choose an option below!:'
-                                '\n[1] : Check Liked Comments Data\n'
-                                '[2] : Check Liked Posts Data\n'
-                                '\n[return] : Return to main menu\n'
-                                '-------------------------------------\n')
-
-
-    main.main(instagram_data)
@@ -15,84 +15,222 @@ Functions:
     an InstagramData object with the given path, further initiates various data paths 
     (like post comments, followers, etc.), and verifies the existence of these paths. 
     Returns the initialized InstagramData object.
+
+    preload_data(instagram_data: ig_data.InstagramData): Parses every core file concurrently 
+    and prints the load time and error of every file.
     
+    main_menu(instagram_data: ig_data.InstagramData): Presents the main menu once and returns 
+    the next state of the menu controller.
+
     main(instagram_data: ig_data.InstagramData): Facilitates user interaction with the program 
-    through a menu-driven interface. Based on user input, it triggers specific data retrieval 
+    through a loop-driven menu controller. Based on user input, it triggers specific data retrieval 
     and analysis operations pertaining to messages, follow data, comments, or liked posts, 
     or exits the program.
+
+    parse_args(argv): Parses the command line options of the headless batch report mode.
+
+    run(args): Runs the interactive menu or the batch report for the parsed options.
+
+Running the module with an export path, e.g. `python main.py export.zip --output reports`, 
+skips the menus and writes the reports of the report module instead. Adding `--profile trace.json` 
+to either mode records the time and memory of every stage with the profiling module.
 """
 
+import argparse
+import importlib
 import sys
+import time
+import cache
 import instagram_data_class as ig_data
-import message as msg
-import followers as follow
-import comments as cmt
-import liked
+import profiling
+import report
+import timeutil
 
 # I should add menu with choice where files might look diff
 
+# States of the menu controller besides the sections
+MAIN_MENU = 'main'
+QUIT = 'quit'
+
+# The module and function of the section entered by each main menu option, each runs until the
+# user types "return". Sections are imported when first entered, so pandas and the plotting
+# libraries are only loaded by the sections that use them instead of at startup.
+SECTIONS = {
+    '1': ('message', 'message_data'),
+    '2': ('followers', 'follow_data'),
+    '3': ('comments', 'comment_menu'),
+    '4': ('liked', 'liked_menu'),
+    '5': ('search_index', 'search_menu'),
+}
 
 
-def path_test_and_init():
+def path_test_and_init(preload=False):
     """
     Prompts the user for the main path to their Instagram data, initializes an InstagramData object 
     with the provided path, initializes the paths for post comments, followers, following, 
-    liked comments, and liked posts, and checks if the initialized paths exist.
+    liked comments, and liked posts, and checks if the initialized paths exist. The user is asked 
+    again when none of the files exist.
 
-    :return: None
+    :param preload: Whether to parse every file concurrently before showing the menu.
+    :return: The initialized InstagramData object.
+    """
+    while True:
+        main_path = input('Please put in the path to your Instagram Data folder or downloaded .zip file: \n')
+        timezone = input(f'Please put in your timezone (press enter for {timeutil.DEFAULT_TIMEZONE}): \n').strip()
+        while timezone and not timeutil.check_timezone(timezone):
+            timezone = input('Invalid timezone! Please try again, e.g. Europe/London: \n').strip()
+        instagram_data_obj = ig_data.InstagramData(main_path, cache_dir=cache.DEFAULT_CACHE_DIR,
+                                                   timezone=timezone or timeutil.DEFAULT_TIMEZONE)
+        instagram_data_obj.init_paths()
+        if preload:
+            missing = preload_data(instagram_data_obj)
+        else:
+            missing = instagram_data_obj.check_paths()
+        if len(missing) < len(ig_data.SINGLE_PATH_ATTRIBUTES):
+            return instagram_data_obj
+        print('\nERROR: No Instagram data was found there, please try again.\n')
+
+
+def preload_data(instagram_data: ig_data.InstagramData) -> list:
     """
-    main_path = input('Please put in the path to your Instagram Data: \n')
-    instagram_data_obj = ig_data.InstagramData(main_path)
-    instagram_data_obj.init_paths()
-    instagram_data_obj.check_paths()
+    Parses every followers, following, liked and post comments file concurrently and prints 
+    the load time and error of every file.
 
-    return instagram_data_obj
+    :return: The list of files that do not exist.
+    """
+    start = time.perf_counter()
+    loads = instagram_data.preload()
+    print(f'\nLoaded {loads["rows"].sum()} rows from {len(loads)} files in {time.perf_counter() - start:.2f}s:')
+    table = loads.assign(seconds=loads['seconds'].round(3), cached=loads['cached'].map({True: 'yes', False: ''}),
+                         error=loads['error'].fillna(''))
+    print(table[['file', 'seconds', 'rows', 'cached', 'error']].to_string(index=False))
+    return loads.loc[loads['error'] == 'does not exist', 'file'].tolist()
 
 
-def main(instagram_data: ig_data.InstagramData):
+def main_menu(instagram_data: ig_data.InstagramData) -> str:
     """
-    Presents a menu to the user and executes the selected option.
+    Presents the main menu once and returns the next state of the menu controller.
 
-    The user is presented with a menu of three options:
+    The user is presented with a menu of these options:
     1. Get DMs With Specific User Data
     2. Get Follow Data
+    3. Check Comments Data
+    4. Check Liked Data
+    5. Search Messages And Comments
+    C. Clear Cached Data
     Q. Quit Program
 
-    If the user selects '1', the message_data function of the message module is executed.
-    If the user selects '2', the follow_data function of the follow module is executed.
-    If the user selects 'Q' or 'q', the program is terminated.
+    If the user selects '1' to '5', the state of that section is returned.
+    If the user selects 'C' or 'c', every cached DataFrame is dropped.
+    If the user selects 'Q' or 'q', the QUIT state is returned.
 
-    If an invalid option is entered, the menu is presented again.
+    If an invalid option is entered, the main menu state is returned to present it again.
 
-    :return: None
+    :return: The next state, a key of SECTIONS, MAIN_MENU or QUIT
     """
-
-    valid_options = ['1', '2', '3', '4', 'Q', 'q']
     menu_choice = input('\nPlease choose an option below!:'
                         '\n[1] : Get DMs With Specific User Data\n'
                         '[2] : Get Follow Data\n'
                         '[3] : Check Comments Data\n'
                         '[4] : Check Liked Data\n'
+                        '[5] : Search Messages And Comments\n'
+                        '[C] : Clear Cached Data\n'
                         '[Q] : Quit Program\n'
                         '-------------------------------------\n')
 
-    if menu_choice not in valid_options:
-        print('\nInvalid option! Please try again.\n')
-        main(instagram_data)
+    if menu_choice in SECTIONS:
+        return menu_choice
+    elif menu_choice in ('C', 'c'):
+        instagram_data.clear_cache()
+        print('\nCached data cleared.')
+    elif menu_choice in ('Q', 'q'):
+        print('\nEnding program...Goodbye!')
+        return QUIT
     else:
-        if menu_choice == '1':
-            msg.message_data(instagram_data)
-        elif menu_choice == '2':
-            follow.follow_data(instagram_data)
-        elif menu_choice == '3':
-            cmt.comment_menu(instagram_data)
-        elif menu_choice == '4':
-            liked.liked_menu(instagram_data)
-        elif menu_choice in ('Q', 'q'):
-            print('\nEnding program...Goodbye!')
-            sys.exit()
+        print('\nInvalid option! Please try again.\n')
+    return MAIN_MENU
+
+
+def main(instagram_data: ig_data.InstagramData):
+    """
+    Runs the menu controller until the user quits. The current menu is kept in an explicit 
+    state variable: the main menu returns the section to enter, and every section runs its 
+    own loop and returns when the user types "return". No menu calls another one, so the 
+    stack and the memory held by finished actions stay constant however long the session is.
+
+    :return: None
+    """
+    state = MAIN_MENU
+    while state != QUIT:
+        if state == MAIN_MENU:
+            state = main_menu(instagram_data)
+        else:
+            module_name, function_name = SECTIONS[state]
+            getattr(importlib.import_module(module_name), function_name)(instagram_data)
+            state = MAIN_MENU
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line options. Without an export path the interactive menu is used.
+
+    :param argv: The command line arguments, defaults to sys.argv
+    :return: The parsed argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Analyze an Instagram data export. Give an export path '
+                                                 'to write a batch report instead of using the menus.')
+    parser.add_argument('export', nargs='?',
+                        help='path to the Instagram Data folder or downloaded .zip file')
+    parser.add_argument('-o', '--output', default='report',
+                        help='directory the report files are written to (default: report)')
+    parser.add_argument('-a', '--analyses', nargs='+', choices=list(report.ANALYSES),
+                        default=list(report.ANALYSES), help='analyses to run (default: all)')
+    parser.add_argument('-f', '--formats', nargs='+', choices=report.FIGURE_FORMATS,
+                        default=['png'], help='image formats of the figures (default: png)')
+    parser.add_argument('-t', '--timezone', default=timeutil.DEFAULT_TIMEZONE,
+                        help=f'timezone dates are shown in (default: {timeutil.DEFAULT_TIMEZONE})')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the parsed data cache')
+    parser.add_argument('--preload', action='store_true',
+                        help='parse every file concurrently before showing the menu')
+    parser.add_argument('--profile', metavar='TRACE',
+                        help='record the time and memory of every stage and write a JSON trace to TRACE')
+    parser.add_argument('--profile-time-only', action='store_true',
+                        help='only record times while profiling, which is faster than tracking memory')
+    args = parser.parse_args(argv)
+    if not timeutil.check_timezone(args.timezone):
+        parser.error(f'invalid timezone: {args.timezone}')
+    return args
+
+
+def run(args):
+    """
+    Runs the interactive menu, or the batch report when an export path was given.
+
+    :param args: The parsed command line options of parse_args
+    :return: The exit status, 1 if a batch report analysis failed
+    """
+    if args.export is None:
+        ig_data_obj = path_test_and_init(args.preload)
+        main(ig_data_obj)
+        return 0
+    manifest = report.run_report(args.export, args.output, args.analyses, args.formats, args.timezone,
+                                 cache_dir=None if args.no_cache else cache.DEFAULT_CACHE_DIR,
+                                 max_workers=args.workers)
+    print(f'\nReport written to {args.output}')
+    return 1 if manifest['errors'] else 0
 
 
 if __name__ == '__main__':
-    ig_data_obj = path_test_and_init()
-    main(ig_data_obj)
+    args = parse_args()
+    if args.profile:
+        profiling.enable(memory=not args.profile_time_only)
+    try:
+        status = run(args)
+    finally:
+        if args.profile:
+            spans = profiling.write_trace(args.profile)
+            profiling.print_summary(spans)
+            print(f'\nProfile trace written to {args.profile}')
+    sys.exit(status)
\ No newline at end of file
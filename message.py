@@ -3,152 +3,641 @@ Message Analysis Module
 
 This module provides a collection of functions to process, analyze, 
 and visualize Instagram direct messages (DMs) from JSON files. Main features include:
-- Loading and processing message JSON files into a Pandas DataFrame.
+- Loading and processing message JSON files into a Pandas DataFrame, optionally streaming
+  the messages one at a time to keep memory bounded on very large conversations.
+- Keeping only the requested columns in compact dtypes: categorical senders, int64 timestamps
+  and boolean flags for media, shares and reactions instead of their raw object columns.
 - Decoding messages from their original encoding to UTF-8.
+- Aggregating each conversation once into a compact cube of message counts by sender,
+  local date and hour, which every visualization renders from.
 - Generating various visualizations of the messages, such as:
     - A pie chart illustrating the distribution of chats between participants.
     - A heatmap showing message frequency for each hour across months.
     - A time series graph for daily message counts.
+- Tagging every message once at load time as text, attachment, story share, reaction,
+  like or system action in a categorical msg_type column.
+- Flattening the nested reactions, shares and media of the messages into compact child tables
+  joined to the messages by msg_id, and counting the reactions and shares of every sender
+  from them with array operations.
 - Extracting message content while filtering out system-generated content and actions.
 - Providing summaries like the five most common words used in messages.
+- Recording every loading, decoding, filtering, aggregation and plotting stage in a profiling
+  span, so profiled runs show where the time and memory of an analysis go.
 - Interactively prompting users for a JSON file and shows available analyses and visualizations.
-This module depends on several external libraries including pandas, seaborn, and matplotlib. 
-Additionally, it relies on the 'main' module for certain operations.
+This module depends on several external libraries including pandas, seaborn, and matplotlib.
+Seaborn and matplotlib are only imported by the plotting functions, so loading and analyzing
+messages without plots never pays for their import time.
 
 Note: To ensure correct execution, the provided JSON file should adhere to a specific structure,
 especially when keys like 'messages' are accessed directly.
 """
 
+import functools
 import json
-from collections import Counter
+import re
+from array import array
+from typing import TYPE_CHECKING, NamedTuple
+import numpy as np
 import pandas as pd
-import seaborn as sns
-from matplotlib import pyplot as plt
+import export_files
 import instagram_data_class as ig_data
-import main
+import json_stream
+import profiling
+import timeutil
+import word_freq
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
-def create_msg_df(input_path) -> pd.DataFrame:
+DECODE_CACHE_SIZE = 1 << 16
+
+# Categories of the msg_type column, every downstream analysis filters on these tags
+MESSAGE_TYPES = ['text', 'attachment', 'story_share', 'reaction', 'like', 'system']
+MEDIA_FIELDS = ['photos', 'videos', 'audio_files', 'files', 'gifs', 'sticker', 'share']
+
+# Columns kept by streaming loads unless other columns are requested
+COMPACT_COLUMNS = ['sender_name', 'timestamp_ms', 'content', 'msg_type']
+
+# Boolean flag columns a load can keep instead of the raw object columns, and the message
+# fields that set each flag
+FLAG_COLUMNS = {
+    'has_media': MEDIA_FIELDS,
+    'has_photos': ['photos'],
+    'has_videos': ['videos'],
+    'has_audio': ['audio_files'],
+    'has_share': ['share'],
+    'has_reactions': ['reactions'],
+}
+
+# Media lists of a message, flattened into the media child table with their kind as a categorical
+MEDIA_KINDS = ['photos', 'videos', 'audio_files', 'files', 'gifs']
+# Nested message fields moved out of the messages into child tables joined by msg_id
+NESTED_FIELDS = ['reactions', 'share'] + MEDIA_KINDS
+
+# Errors of a message JSON file with a missing messages list, missing or broken fields, or
+# invalid JSON, printed by both parsers instead of stopping the other files from loading
+MESSAGE_FILE_ERRORS = (AttributeError, TypeError, KeyError, ValueError)
+
+
+class MessageTables(NamedTuple):
+    """
+    The messages of a conversation and the child tables of their nested fields. Every child
+    row holds the msg_id of its message, the row of the message in the messages table.
+
+    Attributes:
+        messages (DataFrame): One row per message with its msg_id, without the nested fields.
+        reactions (DataFrame): msg_id and the categorical reaction and actor of every reaction.
+        shares (DataFrame): msg_id, link, share_text and categorical original_content_owner of every share.
+        media (DataFrame): msg_id, categorical kind, uri and int64 creation_timestamp of every media file.
+    """
+    messages: pd.DataFrame
+    reactions: pd.DataFrame
+    shares: pd.DataFrame
+    media: pd.DataFrame
+
+
+# A single precompiled pattern for every action message, the matching group names the type
+ACTION_MESSAGE_PATTERN = re.compile(
+    r'(?P<attachment>sent an attachment\.)'
+    r'|(?P<story_share>shared a story\.)'
+    r'|(?P<like>[Ll]iked a message)'
+    r'|(?P<reaction>Reacted|to your message)'
+    r'|(?P<system>started a video chat|started an audio call|[Vv]ideo chat ended|[Aa]udio call ended'
+    r'|missed a video chat|missed an audio call|named the group|changed the group photo'
+    r'|left the group|unsent a message)')
+
+
+@profiling.traced('message.create_msg_df')
+def create_msg_df(input_path, streaming=False, columns=None, child_tables=False):
     """
     Loads JSON from path and creates a dataframe from message section of JSON
     :param input_path: A Path object of a path to a message JSON file
-    :return: A dataframe containing information in the message JSON file
+    :param streaming: If True, the messages are parsed one at a time and only the requested
+                      columns are collected, COMPACT_COLUMNS by default
+    :param columns: Columns to keep, any of COMPACT_COLUMNS, FLAG_COLUMNS or raw message fields
+                    like 'reactions', or None for every column (COMPACT_COLUMNS when streaming)
+    :param child_tables: If True, the nested reactions, share and media fields are flattened
+                         into child tables instead of being kept as object columns
+    :return: A dataframe containing information in the message JSON file, or MessageTables
+             of the messages and their child tables when child_tables is True
     """
+    if streaming:
+        if child_tables:
+            columns = list(COMPACT_COLUMNS if columns is None else columns)
+            df = stream_msg_df(input_path, columns + [field for field in NESTED_FIELDS if field not in columns])
+            return None if df is None else split_child_tables(df)
+        return stream_msg_df(input_path, columns)
     try:
-        with open(input_path, encoding='UTF-8') as message_file:
+        with profiling.span('message.json_load'), export_files.open_text(input_path) as message_file:
             message_json = json.load(message_file)
 
         # Enter the actual messages section from JSON data
         messages_dict = message_json['messages']
+        if not messages_dict:
+            # An empty conversation gets the same empty columns as from the streaming parser
+            df = messages_df([], COMPACT_COLUMNS + list(FLAG_COLUMNS))
+            if child_tables:
+                return split_child_tables(df)
+            return df if columns is None else df.reindex(columns=list(columns))
 
         # Create DF
         df = pd.DataFrame.from_dict(messages_dict)
 
-        # Convert timestamps from milliseconds
-        df['timestamp_ms'] = pd.to_datetime(df['timestamp_ms'], unit='ms')
+        # Timestamps stay int64 epoch milliseconds, timeutil converts them when needed
+        df['timestamp_ms'] = df['timestamp_ms'].astype(np.int64)
+
+        # A handful of senders repeat on every message, so they are stored as a categorical
+        df['sender_name'] = df['sender_name'].astype('category')
+
+        # Tag every message once so later analyses never re-run the action regex
+        present = {field: df[field].notna().to_numpy() for field in MEDIA_FIELDS + ['reactions']
+                   if field in df.columns}
+        no_field = np.zeros(len(df), dtype=np.bool_)
+        for flag, fields in FLAG_COLUMNS.items():
+            df[flag] = np.logical_or.reduce([present.get(field, no_field) for field in fields])
+        df['msg_type'] = classify_messages(df['content'] if 'content' in df.columns else pd.Series(index=df.index),
+                                           df['has_media'].to_numpy())
+
+        if child_tables:
+            tables = split_child_tables(df)
+            if columns is None:
+                return tables
+            return tables._replace(messages=tables.messages.reindex(columns=['msg_id'] + list(columns)))
+        if columns is None:
+            return df
+        # Fields missing from this file become empty columns so every shard has the same columns
+        return df.reindex(columns=list(columns))
+    except MESSAGE_FILE_ERRORS as error:
+        print(f'ERROR: {error}')
+
 
-        return df
-    except (AttributeError, TypeError) as error:
+@profiling.traced('message.stream_msg_df')
+def stream_msg_df(input_path, columns=None) -> pd.DataFrame:
+    """
+    Walks the messages array of a message JSON file one message at a time and writes only
+    the requested fields straight into compact column buffers, so peak memory stays close
+    to the size of the final columns instead of the whole file. Senders are stored as a
+    categorical, timestamps as int64, flags as bools and message types as a categorical.
+    :param input_path: A Path object of a path to a message JSON file
+    :param columns: Columns to keep, any of COMPACT_COLUMNS, FLAG_COLUMNS or raw message
+                    fields like 'reactions', COMPACT_COLUMNS by default
+    :return: A dataframe with the requested columns in the requested order
+    """
+    try:
+        return messages_df(json_stream.iter_array_items(input_path, key='messages'), columns)
+    except MESSAGE_FILE_ERRORS as error:
         print(f'ERROR: {error}')
 
 
+def iter_messages_since(shard_paths, since: int):
+    """
+    Yields the messages of a conversation sent at or after a timestamp. Instagram writes
+    messages newest first, message_1.json holding the newest ones, so reading stops at the
+    first message before the timestamp and the older messages and shards are never decoded.
+    Messages sent at the timestamp itself are yielded too, since several messages can share
+    one timestamp and only the caller knows which of them it already processed.
+    :param shard_paths: Ordered list of paths to the message JSON shards of a conversation
+    :param since: Epoch milliseconds of the newest message already processed
+    :return: Generator of the message dictionaries at or after the timestamp, newest first
+    """
+    for shard_path in shard_paths:
+        for message in json_stream.iter_array_items(shard_path, key='messages'):
+            if message.get('timestamp_ms', 0) < since:
+                return
+            yield message
+
+
+def messages_df(messages, columns=None) -> pd.DataFrame:
+    """
+    Writes only the requested fields of an iterable of message dictionaries straight into
+    compact column buffers, one message at a time.
+    :param messages: Iterable of message dictionaries, like the items of a messages array
+    :param columns: Columns to keep, any of COMPACT_COLUMNS, FLAG_COLUMNS or raw message
+                    fields like 'reactions', COMPACT_COLUMNS by default
+    :return: A dataframe with the requested columns in the requested order
+    """
+    columns = list(COMPACT_COLUMNS if columns is None else columns)
+    keep_senders = 'sender_name' in columns
+    keep_timestamps = 'timestamp_ms' in columns
+    keep_content = 'content' in columns or 'msg_type' in columns
+    flags = {flag: FLAG_COLUMNS[flag] for flag in columns if flag in FLAG_COLUMNS}
+    if 'msg_type' in columns:
+        flags.setdefault('has_media', FLAG_COLUMNS['has_media'])
+    raw_fields = [column for column in columns if column not in COMPACT_COLUMNS and column not in FLAG_COLUMNS]
+    sender_codes = array('i')
+    sender_names = {}
+    timestamps = array('q')
+    contents = []
+    flag_buffers = {flag: bytearray() for flag in flags}
+    raw_values = {field: [] for field in raw_fields}
+
+    for message in messages:
+        if keep_senders:
+            # Senders repeat on every message, so they are stored as category codes
+            sender = message.get('sender_name')
+            sender_codes.append(sender_names.setdefault(sender, len(sender_names)) if sender is not None else -1)
+        if keep_timestamps:
+            timestamps.append(message.get('timestamp_ms', 0))
+        if keep_content:
+            contents.append(message.get('content'))
+        for flag, fields in flags.items():
+            flag_buffers[flag].append(any(field in message for field in fields))
+        for field in raw_fields:
+            raw_values[field].append(message.get(field))
+
+    data = {}
+    content = pd.Series(contents, dtype=object)
+    for column in columns:
+        if column == 'sender_name':
+            data[column] = pd.Categorical.from_codes(np.frombuffer(sender_codes, dtype=np.int32),
+                                                     categories=list(sender_names))
+        elif column == 'timestamp_ms':
+            data[column] = np.frombuffer(timestamps, dtype=np.int64)
+        elif column == 'content':
+            data[column] = content
+        elif column == 'msg_type':
+            data[column] = classify_messages(content, np.frombuffer(flag_buffers['has_media'], dtype=np.bool_))
+        elif column in flags:
+            data[column] = np.frombuffer(flag_buffers[column], dtype=np.bool_)
+        else:
+            data[column] = pd.Series(raw_values[column], dtype=object)
+    return pd.DataFrame(data, columns=columns)
+
+
+def _flatten_records(column, fields: list, lists=True) -> pd.DataFrame:
+    """
+    Flattens an object column holding a list of dictionaries, or a single dictionary, per message
+    into one row per dictionary, with the msg_id of the row each dictionary came from.
+    :param column: Object Series indexed by msg_id, missing values for messages without the field
+    :param fields: Keys of the dictionaries kept as columns
+    :param lists: False if the column holds single dictionaries, which explode would split into keys
+    :return: Dataframe of the int32 msg_id and the fields
+    """
+    records = column.dropna()
+    if lists:
+        records = records.explode().dropna()
+    table = pd.DataFrame(records.to_list(), columns=None).reindex(columns=fields)
+    table.insert(0, 'msg_id', records.index.to_numpy(dtype=np.int32))
+    return table
+
+
+@profiling.traced('message.split_child_tables')
+def split_child_tables(df: pd.DataFrame) -> MessageTables:
+    """
+    Moves the reactions, share and media object columns of a message dataframe into compact
+    child tables, each flattened with one explode over the whole column. The messages get an
+    int32 msg_id, their row number, which the child tables refer to.
+    :param df: A message dataframe with some or all of the NESTED_FIELDS as raw object columns
+    :return: MessageTables of the messages without the nested fields and the child tables
+    """
+    df = df.reset_index(drop=True)
+    empty = pd.Series(index=pd.RangeIndex(0), dtype=object)
+
+    reactions = _flatten_records(df['reactions'] if 'reactions' in df.columns else empty, ['reaction', 'actor'])
+    reactions = reactions.astype({'reaction': 'category', 'actor': 'category'})
+    shares = _flatten_records(df['share'] if 'share' in df.columns else empty,
+                              ['link', 'share_text', 'original_content_owner'], lists=False)
+    shares = shares.astype({'original_content_owner': 'category'})
+
+    media = pd.concat([_flatten_records(df[kind], ['uri', 'creation_timestamp']).assign(kind=kind)
+                       for kind in MEDIA_KINDS if kind in df.columns]
+                      or [_flatten_records(empty, ['uri', 'creation_timestamp']).assign(kind=None)],
+                      ignore_index=True)
+    media = pd.DataFrame({
+        'msg_id': media['msg_id'].to_numpy(dtype=np.int32),
+        'kind': pd.Categorical(media['kind'], categories=MEDIA_KINDS),
+        'uri': media['uri'].to_numpy(dtype=object),
+        'creation_timestamp': pd.to_numeric(media['creation_timestamp']).fillna(0).to_numpy(dtype=np.int64),
+    })
+
+    messages = df.drop(columns=[field for field in NESTED_FIELDS if field in df.columns])
+    messages.insert(0, 'msg_id', np.arange(len(messages), dtype=np.int32))
+    return MessageTables(messages, reactions, shares, media)
+
+
+def load_msg_tables(instagram_data: ig_data.InstagramData, path) -> MessageTables:
+    """
+    Loads the messages and child tables of a message JSON file, each table cached under its
+    own name so a file is only parsed again once it changes.
+    :param instagram_data: InstagramData class object holding the cache
+    :param path: Path to a message JSON file
+    :return: MessageTables of the file, or None if it could not be parsed
+    """
+    names = [f'message_{table}' for table in MessageTables._fields]
+    cache = instagram_data.cache
+    if cache is not None:
+        frames = [cache.get(path, name, flush=False) for name in names]
+        if all(frame is not None for frame in frames):
+            cache.flush()
+            return MessageTables(*frames)
+    tables = create_msg_df(path, streaming=True, child_tables=True)
+    if cache is not None and tables is not None:
+        for name, frame in zip(names, tables):
+            cache.put(path, frame, name, flush=False)
+        cache.flush()
+    return tables
+
+
+def _sender_codes(tables: MessageTables, msg_ids) -> np.ndarray:
+    """
+    :return: The sender category codes of the messages of a child table, -1 for unknown senders
+    """
+    return tables.messages['sender_name'].astype('category').cat.codes.to_numpy()[np.asarray(msg_ids, dtype=np.intp)]
+
+
+def _top_per_group(keys: pd.Series, values: pd.Series) -> pd.Series:
+    """
+    :return: The most common value of every key, indexed by key
+    """
+    counts = pd.DataFrame({'key': keys, 'value': values}).value_counts(sort=True)
+    return counts.reset_index().drop_duplicates('key').set_index('key')['value']
+
+
+@profiling.traced('message.reaction_stats')
+def reaction_stats(tables: MessageTables) -> pd.DataFrame:
+    """
+    Counts the reactions every sender got on their messages and gave to others, joining the
+    reactions to the senders of their messages by msg_id with array indexing.
+    :param tables: MessageTables of a conversation
+    :return: Dataframe indexed by the decoded sender with the messages, reactions_received,
+             reactions_given and reactions_per_message counts and the most_used_reaction
+    """
+    senders = tables.messages['sender_name'].astype('category')
+    categories = senders.cat.categories
+    codes = _sender_codes(tables, tables.reactions['msg_id'])
+    received = np.bincount(codes[codes >= 0], minlength=len(categories))
+    stats = pd.DataFrame({
+        'messages': senders.value_counts().reindex(categories, fill_value=0).to_numpy(),
+        'reactions_received': received,
+    }, index=categories)
+    stats = stats.join(tables.reactions['actor'].value_counts().rename('reactions_given'), how='outer')
+    stats = stats.fillna(0).astype(np.int64)
+    stats['reactions_per_message'] = (stats['reactions_received'] / stats['messages'].where(stats['messages'] > 0)).fillna(0)
+    stats['most_used_reaction'] = _top_per_group(tables.reactions['actor'].astype(object),
+                                                 tables.reactions['reaction'].astype(object)).reindex(stats.index)
+    stats['most_used_reaction'] = decode_messages(stats['most_used_reaction'])
+    stats.index = decode_messages(pd.Series(stats.index, dtype=object)).to_numpy()
+    return stats.rename_axis('sender').sort_values(by=['reactions_received'], ascending=False)
+
+
+@profiling.traced('message.share_stats')
+def share_stats(tables: MessageTables) -> pd.DataFrame:
+    """
+    Counts the posts and reels every sender shared, joining the shares to the senders of their
+    messages by msg_id with array indexing.
+    :param tables: MessageTables of a conversation
+    :return: Dataframe indexed by the decoded sender with the shares, distinct_accounts and
+             media counts and the most shared account
+    """
+    categories = tables.messages['sender_name'].astype('category').cat.categories
+    share_codes = _sender_codes(tables, tables.shares['msg_id'])
+    media_codes = _sender_codes(tables, tables.media['msg_id'])
+    shared = share_codes >= 0
+    owners = tables.shares['original_content_owner'].astype(object).to_numpy()[shared]
+    share_senders = categories.to_numpy()[share_codes[shared]]
+    stats = pd.DataFrame({
+        'shares': np.bincount(share_codes[shared], minlength=len(categories)),
+        'distinct_accounts': pd.DataFrame({'sender': share_senders, 'owner': owners}).dropna()
+                             .drop_duplicates().groupby('sender').size().reindex(categories, fill_value=0).to_numpy(),
+        'media': np.bincount(media_codes[media_codes >= 0], minlength=len(categories)),
+    }, index=categories)
+    stats['most_shared_account'] = _top_per_group(pd.Series(share_senders), pd.Series(owners)).reindex(categories)
+    stats['most_shared_account'] = decode_messages(stats['most_shared_account'])
+    stats.index = decode_messages(pd.Series(stats.index, dtype=object)).to_numpy()
+    return stats.rename_axis('sender').sort_values(by=['shares'], ascending=False)
+
+
+def classify_content(content) -> str:
+    """
+    Classifies the content of a single message.
+    :param content: The content of a message, or a missing value
+    :return: One of MESSAGE_TYPES, or None if the message has no text content
+    """
+    if not isinstance(content, str):
+        return None
+    match = ACTION_MESSAGE_PATTERN.search(content)
+    return match.lastgroup if match else 'text'
+
+
+@profiling.traced('message.classify_messages')
+def classify_messages(content: pd.Series, has_media=None) -> pd.Categorical:
+    """
+    Tags every message as text, attachment, story_share, reaction, like or system in a
+    single pass. Each distinct content string is matched against the action pattern once,
+    and messages without text content are attachments if they carry media, else system actions.
+    :param content: Series containing the content of every message
+    :param has_media: Boolean array marking messages with photos, videos, shares or other media
+    :return: Categorical of the message types with the categories of MESSAGE_TYPES
+    """
+    codes, uniques = pd.factorize(content)
+    unique_types = [classify_content(unique) for unique in uniques]
+    unique_codes = np.array([MESSAGE_TYPES.index(unique_type) if unique_type else -1
+                             for unique_type in unique_types] + [-1], dtype=np.int8)
+
+    # Missing content has code -1, which also picks the trailing -1 of unique_codes
+    type_codes = unique_codes[codes]
+    no_text = type_codes == -1
+    if has_media is None:
+        has_media = np.zeros(len(type_codes), dtype=np.bool_)
+    type_codes[no_text & has_media] = MESSAGE_TYPES.index('attachment')
+    type_codes[no_text & ~has_media] = MESSAGE_TYPES.index('system')
+    return pd.Categorical.from_codes(type_codes, categories=MESSAGE_TYPES)
+
+
+def message_types(df: pd.DataFrame) -> pd.Series:
+    """
+    Gets the msg_type column of a message dataframe, classifying the messages if the
+    dataframe was created without it.
+    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :return: Categorical series of the message types
+    """
+    if 'msg_type' in df.columns:
+        return df['msg_type']
+    media_columns = [column for column in MEDIA_FIELDS if column in df.columns]
+    return pd.Series(classify_messages(df['content'], df[media_columns].notna().any(axis=1).to_numpy()),
+                     index=df.index)
+
+
+@functools.lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode_message(message: str) -> str:
+    """
+    Decode a single message from its original encoding to UTF-8. Instagram exports encode
+    UTF-8 text as latin-1 escapes, so the text is re-encoded as latin-1 and decoded as UTF-8.
+    Results are memoized since reactions and stock phrases repeat across conversations.
+    :param message: The message to be decoded
+    :return: The decoded message, or the message itself if it is plain ASCII or already decoded
+    """
+    if message.isascii():
+        return message
+    try:
+        return message.encode('latin-1').decode('utf-8')
+    except UnicodeError:
+        # Characters outside latin-1 or invalid UTF-8 mean the text is already decoded
+        return message
+
+
+@profiling.traced('message.decode_messages')
 def decode_messages(messages: pd.Series) -> pd.Series:
     """
-    Decode words from their original encoding to UTF-8.
+    Decode words from their original encoding to UTF-8. Every distinct message is decoded
+    only once and the results are mapped back onto the whole column, while missing and
+    non-string values are left untouched.
     :param messages: Series containing the messages to be decoded
     :return: Decoded messages series
     """
-    decoded_messages = messages.apply(lambda message: message.encode('latin-1').decode('utf-8'))
-    return decoded_messages
+    if isinstance(messages.dtype, pd.CategoricalDtype):
+        decoded_categories = messages.cat.categories.map(
+            lambda category: decode_message(category) if isinstance(category, str) else category)
+        if decoded_categories.is_unique:
+            return messages.cat.rename_categories(decoded_categories)
+        messages = messages.astype(object)
 
+    codes, uniques = pd.factorize(messages)
+    decoded_uniques = np.array([decode_message(unique) if isinstance(unique, str) else unique
+                                for unique in uniques], dtype=object)
 
-def plot_message_distribution_graph(df: pd.DataFrame) -> None:
+    decoded_messages = messages.to_numpy(dtype=object, copy=True)
+    valid = codes >= 0
+    decoded_messages[valid] = decoded_uniques[codes[valid]]
+    return pd.Series(decoded_messages, index=messages.index, name=messages.name)
+
+
+@profiling.traced('message.build_message_cube')
+def build_message_cube(df: pd.DataFrame, tz=timeutil.DEFAULT_TIMEZONE) -> pd.DataFrame:
+    """
+    Builds the aggregate every DM plot renders from: the number of messages and of text
+    messages sent by each sender on each local date and hour. It is built once per
+    conversation, so the plots never copy or regroup the raw message dataframe.
+    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param tz: Timezone the dates and hours are counted in
+    :return: Dataframe with the categorical sender_name, the int32 local day number since
+             1970-01-01, the int8 local hour, and the int32 messages and texts counts
+    """
+    # One timezone conversion gives both the day and the hour buckets
+    local = timeutil.local_epoch(timeutil.to_epoch(df['timestamp_ms'], 'ms'), 'ms', tz)
+    buckets = pd.DataFrame({
+        'sender_name': decode_messages(df['sender_name'].astype('category')).to_numpy(),
+        'day': (local // timeutil.SECONDS_PER_DAY).astype(np.int32),
+        'hour': (local // timeutil.SECONDS_PER_HOUR % 24).astype(np.int8),
+        'texts': df['content'].notna().to_numpy(),
+    })
+    cube = buckets.groupby(['sender_name', 'day', 'hour'], observed=True, sort=False)['texts'] \
+        .agg(messages='size', texts='sum').reset_index()
+    return cube.astype({'messages': np.int32, 'texts': np.int32})
+
+
+@profiling.traced('message.merge_message_cubes')
+def merge_message_cubes(cubes) -> pd.DataFrame:
+    """
+    Merges message cubes, for example of every conversation in the inbox, into one cube.
+    Merging the cube of new messages into an existing cube updates it incrementally.
+    :param cubes: Iterable of message cubes built by build_message_cube
+    :return: A single message cube with the summed counts
+    """
+    cubes = [cube.astype({'sender_name': 'category'}) for cube in cubes]
+    if not cubes:
+        return pd.DataFrame({'sender_name': pd.Categorical([]), 'day': np.array([], dtype=np.int32),
+                             'hour': np.array([], dtype=np.int8), 'messages': np.array([], dtype=np.int32),
+                             'texts': np.array([], dtype=np.int32)})
+    sender_names = pd.api.types.union_categoricals([cube['sender_name'] for cube in cubes]).categories
+    merged = pd.concat([cube.assign(sender_name=cube['sender_name'].cat.set_categories(sender_names))
+                        for cube in cubes], ignore_index=True)
+    merged = merged.groupby(['sender_name', 'day', 'hour'], observed=True, sort=False)[['messages', 'texts']] \
+        .sum().reset_index()
+    return merged.astype({'messages': np.int32, 'texts': np.int32})
+
+
+@profiling.traced('message.plot_message_distribution_graph')
+def plot_message_distribution_graph(cube: pd.DataFrame) -> 'Figure':
     """
     Plots a pie chart showing the distribution of chats sent between each participant
     of a direct message conversation
-    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param cube: Message cube of the conversation built by build_message_cube
+    :return: The Matplotlib figure of the pie chart
     """
-    # Filter out dataframe for only messages, timestamps, and sender names
-    df = df.loc[:, ['content', 'timestamp_ms', 'sender_name']]
-
-    # Remove all NaN elements, correctly encode messages, & convert timestamps
-    df.dropna(inplace=True)
-    df['content'] = decode_messages(df['content'])
+    # Sum the text messages of each sender, skipping senders without any texts
+    sender_texts = cube.groupby('sender_name', observed=True)['texts'].sum()
+    sender_texts = sender_texts[sender_texts > 0].sort_values(ascending=False)
 
     # Plot figure
-    plt.figure(figsize=(8, 8))
-    df["sender_name"].value_counts().plot(kind='pie', autopct='%1.2f%%', shadow=True,
-                                          fontsize=15.0, title='Percentage of sent texts in conversation')
-    with plt.ion():
-        plt.show(block=False)
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(figsize=(8, 8))
+    sender_texts.plot(kind='pie', ax=ax, autopct='%1.2f%%', shadow=True,
+                      fontsize=15.0, title='Percentage of sent texts in conversation')
+    return fig
 
 
-def plot_message_heatmap(df: pd.DataFrame) -> None:
+@profiling.traced('message.plot_message_heatmap')
+def plot_message_heatmap(cube: pd.DataFrame) -> 'Figure':
     """
     Plots a heatmap showing the number of messages sent between each hour of the day
     across all months of a year
-    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param cube: Message cube of the conversation built by build_message_cube
+    :return: The Matplotlib figure of the heatmap
     """
-    time_data = df.copy()
-
-    # drop columns we don't need
-    time_data.drop(["share", "reactions", "photos", "audio_files", "videos"], axis=1, inplace=True, errors='ignore')
-
-    # drop rows where timestamp_ms is NaN
-    time_data.dropna(subset=['timestamp_ms'], inplace=True)
+    # derive the month of the year of each day bucket
+    months = cube['day'].to_numpy().astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
 
-    # convert timestamp_ms to datetime if it is not already
-    if not pd.api.types.is_datetime64_any_dtype(time_data['timestamp_ms']):
-        time_data['timestamp_ms'] = pd.to_datetime(time_data['timestamp_ms'], unit='ms')
-
-    # convert timezone
-    time_data['timestamp_ms'] = time_data['timestamp_ms'].dt.tz_localize('UTC').dt.tz_convert('US/Pacific')
-
-    time_data['month'] = time_data['timestamp_ms'].dt.month
-    time_data['hour'] = time_data['timestamp_ms'].dt.hour
-
-    # count messages using timestamp_ms column
-    df_heatmap = time_data.groupby(['hour', 'month'])['timestamp_ms'].count().reset_index()
-    df_heat2 = df_heatmap.pivot(index="hour", columns="month", values="timestamp_ms")
+    # count messages per hour and month
+    df_heatmap = cube.groupby(['hour', months])['messages'].sum().reset_index()
+    df_heatmap.columns = ['hour', 'month', 'messages']
+    df_heat2 = df_heatmap.pivot(index="hour", columns="month", values="messages")
     df_heat2 = df_heat2.fillna(0)
 
     # configure plot settings and plot
+    import seaborn as sns
+    from matplotlib import pyplot as plt
     fig, ax = plt.subplots(figsize=(12, 9))
     cmap = sns.cubehelix_palette(as_cmap=True, reverse=True)
     cmap.set_bad(color="gray")
-    sns.heatmap(df_heat2, cmap=cmap, mask=df_heat2.isnull(), annot=True, fmt='g')
-    plt.title('Number of Texts Per Hour Each Month', size=14)
-    with plt.ion():
-        plt.show(block=False)
+    sns.heatmap(df_heat2, ax=ax, cmap=cmap, mask=df_heat2.isnull(), annot=True, fmt='g')
+    ax.set_title('Number of Texts Per Hour Each Month', size=14)
+    return fig
+
 
-def plot_message_time_series(df: pd.DataFrame) -> None:
+@profiling.traced('message.plot_message_time_series')
+def plot_message_time_series(cube: pd.DataFrame) -> 'Figure':
     """
     Plots a time series graph of the number of messages sent per day across chat history
-    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param cube: Message cube of the conversation built by build_message_cube
+    :return: The Matplotlib figure of the time series
     """
-    time_data = df.copy()
-
-    # Drop NaN rows and columns we don't need
-    time_data.dropna(inplace=True)
-    time_data.drop(["share", "reactions", "photos", "audio_files", "videos"], 
-                   axis=1, inplace=True, errors='ignore')
-
-    # Convert date column to datetime & group data by date
-    time_data['date'] = pd.to_datetime(df.timestamp_ms).dt.date
-    daily_counts = time_data.groupby('date').size()
+    # Sum the messages of each day bucket
+    daily_counts = cube.groupby('day')['messages'].sum()
 
     # configure plot settings and plot
-    plt.figure(figsize=(12, 6))
-    plt.plot(daily_counts.index, daily_counts.values)
-    plt.xlabel('Date')
-    plt.ylabel('Number of Messages')
-    plt.title('Number of Messages Sent Each Day')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(daily_counts.index.to_numpy().astype('datetime64[D]'), daily_counts.values)
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Messages')
+    ax.set_title('Number of Messages Sent Each Day')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+
+# Every DM plot by its output name, each one renders from a message cube
+MESSAGE_PLOTS = {
+    'sender_distribution': plot_message_distribution_graph,
+    'hour_month_heatmap': plot_message_heatmap,
+    'daily_time_series': plot_message_time_series,
+}
+
+
+@profiling.traced('message.show_figure')
+def show_figure(fig: 'Figure') -> None:
+    """
+    Shows a figure in an interactive window without blocking the menu
+    :param fig: The Matplotlib figure to show
+    """
+    from matplotlib import pyplot as plt
+    plt.figure(fig.number)
     with plt.ion():
         plt.show(block=False)
 
 
+@profiling.traced('message.filter_msg_content')
 def filter_msg_content(df: pd.DataFrame) -> pd.DataFrame:
     """
     Creates new DF skipping action messages, returning the messages while 
@@ -157,26 +646,28 @@ def filter_msg_content(df: pd.DataFrame) -> pd.DataFrame:
     :param df: A Pandas Dataframe of an Instagram direct message JSON file
     :return: Column of only the messages from the dataframe
     """
-    # Creates a copy of the df removing the following phrases within the content column
-    content_df = df.loc[
-        df['content'].str.contains(
-            "sent an attachment.|shared a story.|Liked a message|Reacted|to your message") == False].copy()
-    content_df['content'].dropna(inplace=True)  # Skips all NotANumber values
-    content_column = content_df['content']  # Returns the content column of the newly copied dataframe
+    # Text messages always have content, so action messages and NotANumber values are both skipped
+    content_column = df.loc[message_types(df) == 'text', 'content']
     return content_column
 
 
-def five_most_common_words(word_column: pd.Series) -> str:
+@profiling.traced('message.five_most_common_words')
+def five_most_common_words(word_column: pd.Series, ngram=1, stopwords=None, casefold=False) -> str:
     """
     Prints a dataframe with the 5 most common words and their counts.
     :param word_column: A Pandas Series consisting of words/messages
+    :param ngram: Number of consecutive words counted together, 2 or 3 for common phrases
+    :param stopwords: Collection of words to skip, True for the built-in English stopwords
+    :param casefold: Whether to count words regardless of their case
     """
 
     # Creates and prints a list of tuples with the five most common words and their counts
-    common_word_counter = Counter(" ".join(word_column).split()).most_common(5)
-    common_word_df = pd.DataFrame(common_word_counter, columns=['Word', 'Count'])
+    common_word_counter = word_freq.count_words(word_column, top_k=5, ngram=ngram,
+                                                stopwords=stopwords, casefold=casefold)
+    common_word_df = pd.DataFrame(common_word_counter, columns=['Word' if ngram == 1 else 'Phrase', 'Count'])
     common_word_df = common_word_df.to_string(index=False)
-    return f'\nYour Five Most Common Words: \n{common_word_df}'
+    title = 'Words' if ngram == 1 else 'Phrases'
+    return f'\nYour Five Most Common {title}: \n{common_word_df}'
 
 
 def get_message_df_length(word_column: pd.Series) -> int:
@@ -188,25 +679,25 @@ def get_message_df_length(word_column: pd.Series) -> int:
     return word_column.size
 
 
-def get_first_five_messages(df: pd.DataFrame):
+@profiling.traced('message.get_first_five_messages')
+def get_first_five_messages(df: pd.DataFrame, tz=timeutil.DEFAULT_TIMEZONE):
     """
     Gets the first five messages in a DM conversation and shows each sender and the timestamp
     along with their message.
     :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param tz: Timezone the timestamps are shown in
     :return: F-string containing a DataFrame string of the first five messages
     """
     # Filter df from any action statements and remove any NotANumber values
-    filtered_df = df.loc[
-        df['content'].str.contains(
-            "sent an attachment.|shared a story.|Liked a message|Reacted|to your message|liked a message") == False].copy()
-    filtered_df['content'].dropna(inplace=True)
+    filtered_df = df.loc[message_types(df) == 'text']
 
     # Get first five messages and reverse the order
-    reversed_filtered_df_head = filtered_df.tail(5)[['sender_name', 'timestamp_ms', 'content']].iloc[::-1]
+    reversed_filtered_df_head = filtered_df.tail(5)[['sender_name', 'timestamp_ms', 'content']].iloc[::-1].copy()
 
     # Decode messages & format timestamps
     reversed_filtered_df_head['content'] = decode_messages(reversed_filtered_df_head['content'])
-    reversed_filtered_df_head['timestamp_ms'] = pd.to_datetime(reversed_filtered_df_head['timestamp_ms'], unit='ms')
+    reversed_filtered_df_head['timestamp_ms'] = timeutil.format_times(
+        reversed_filtered_df_head['timestamp_ms'], 'ms', tz, '%Y-%m-%d %H:%M:%S')
     reversed_filtered_df_head['sender_name'] = decode_messages(reversed_filtered_df_head['sender_name'])
     
     # Renaming columns to fit new changes
@@ -217,14 +708,41 @@ def get_first_five_messages(df: pd.DataFrame):
     return f'\nYour First Five Messages: \n{reversed_filtered_df_head}\n'
 
 
+@profiling.traced('message.conversation_analysis')
+def conversation_analysis(df: pd.DataFrame, tz=timeutil.DEFAULT_TIMEZONE, cube=None) -> None:
+    """
+    Prints the text summaries of a DM conversation and plots its visualizations
+    :param df: A Pandas Dataframe of an Instagram direct message JSON file
+    :param tz: Timezone the timestamps are shown and bucketed in
+    :param cube: Message cube of the conversation, built from df if not given
+    """
+    content_column = decode_messages(filter_msg_content(df))
+    print(five_most_common_words(content_column))
+    print(five_most_common_words(content_column, ngram=2, stopwords=True, casefold=True))
+    print(get_first_five_messages(df, tz))
+    print(f'\nNumber Of Messages In The Conversation: '
+          f'\n{get_message_df_length(content_column)}')
+    if cube is None:
+        cube = build_message_cube(df, tz)
+    # Figures of the previous analysis are released instead of piling up over a session
+    from matplotlib import pyplot as plt
+    plt.close('all')
+    for plot in MESSAGE_PLOTS.values():
+        show_figure(plot(cube))
+
+
 def message_data(instagram_data: ig_data.InstagramData):
     """
     Prompts the user to input a file path to a message JSON file and presents
     corresponding data visualizations
     """
+    # inbox imports this module, so importing it at the top would be circular
+    import inbox
+
     print('\nWelcome To The Message Data Section!')
     print('------------------------------------')
     print('To return to the main menu please type "return"')
+    print('To analyze every conversation in your inbox at once please type "inbox"')
 
 
     while True:
@@ -232,19 +750,17 @@ def message_data(instagram_data: ig_data.InstagramData):
             file_path = input('\nPlease enter the path to a .json file in any file located in /messages/inbox: \n')
             if file_path == 'return':
                 print()
-                main.main(instagram_data)
-                break
+                return
+            elif file_path == 'inbox':
+                inbox.inbox_data(instagram_data)
             elif file_path.endswith('.json'):
                 try:
-                    df = create_msg_df(file_path)
-
-                    print(five_most_common_words(filter_msg_content(df)))
-                    print(get_first_five_messages(df))
-                    print(f'\nNumber Of Messages In The Conversation: '
-                          f'\n{get_message_df_length(filter_msg_content(df))}')
-                    plot_message_distribution_graph(df)
-                    plot_message_heatmap(df)
-                    plot_message_time_series(df)
+                    tables = load_msg_tables(instagram_data, instagram_data.export_file(file_path))
+                    if tables is None:
+                        continue
+                    conversation_analysis(tables.messages, instagram_data.timezone)
+                    print(f'\nReactions Per Sender: \n{reaction_stats(tables).to_string()}')
+                    print(f'\nShares And Media Per Sender: \n{share_stats(tables).to_string()}')
 
                 except (FileNotFoundError, json.JSONDecodeError):
                     print('\nERROR: The given file path does not exist or is not a valid path')
@@ -1,4 +1,22 @@
 import streamlit as st
+from instagram_data_class_st import InstagramData_ST
 
-st.write("# Please drag and drop your followers_and_following folder below")
-uploaded_files = st.file_uploader("followers_and_following", accept_multiple_files=True)
\ No newline at end of file
+instagram_data = st.session_state.get('instagram_data')
+
+if instagram_data is None or (instagram_data.followers_file is None and instagram_data.following_file is None):
+    st.write("# Please drag and drop your followers_and_following folder below")
+    uploaded_files = st.file_uploader("followers_and_following", accept_multiple_files=True)
+
+    if uploaded_files:
+        file_dict = {uploaded_file.name: uploaded_file for uploaded_file in uploaded_files}
+        instagram_data = InstagramData_ST(file_dict.get('following.json', None),
+                                          file_dict.get('followers_1.json', None), None, None, None)
+        st.session_state['instagram_data'] = instagram_data
+
+# Reuse the DataFrames already parsed on the homepage instead of parsing the uploads again
+if instagram_data is not None:
+    if instagram_data.followers_file is not None:
+        st.write("Followers Data", instagram_data.followers_file)
+
+    if instagram_data.following_file is not None:
+        st.write("Following Data", instagram_data.following_file)
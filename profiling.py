@@ -0,0 +1,273 @@
+"""
+Profiling Module
+
+This module is the opt-in instrumentation of the analyzer. Every stage of the message, follower,
+comment and liked analyses runs inside a span, and while profiling is enabled each span records
+its wall time, CPU time and the peak memory traced by tracemalloc above the memory in use when it
+started. While profiling is disabled a span does nothing besides a single flag check. Spans of work
+done in worker processes are sent back with the results and merged into the trace of the run.
+Main features include:
+- Timing nested stages with the span context manager or the traced decorator.
+- Running functions in worker processes with their spans collected by traced_call.
+- Writing every span of a run to a structured JSON trace file.
+- Printing a summary table of the total time, CPU time and peak memory of every stage.
+
+Functions:
+- enable(memory): Turns profiling on, optionally with tracemalloc memory tracking.
+- disable(): Turns profiling off.
+- is_enabled(): Returns whether profiling is on.
+- traces_memory(): Returns whether spans record their peak memory.
+- span(name, **attributes): Context manager recording one stage.
+- traced(name): Decorator running every call of a function in a span.
+- collect(): Returns and clears the spans recorded in this process.
+- record(spans): Adds spans recorded in another process.
+- traced_call(function, args, memory): Runs a function with profiling on and returns its spans.
+- traced_map(executor, function, iterable, chunksize): executor.map that records worker spans.
+- summary(spans): Aggregates spans by stage name into a DataFrame.
+- write_trace(path, spans): Writes the JSON trace of the run.
+- print_summary(spans): Prints the summary table.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+_enabled = False
+_trace_memory = False
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+_run_started = time.time()
+
+
+def enable(memory=True) -> None:
+    """
+    Turns profiling on. Memory tracking makes the analyses noticeably slower, so it can be
+    switched off to only record times.
+    :param memory: Whether to record the peak memory of spans with tracemalloc
+    """
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """
+    Turns profiling off and stops tracemalloc if it was tracking span memory.
+    """
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    """
+    :return: True if spans are being recorded
+    """
+    return _enabled
+
+
+def traces_memory() -> bool:
+    """
+    :return: True if spans record their peak memory
+    """
+    return _enabled and _trace_memory
+
+
+def _stack() -> list:
+    """
+    :return: The stack of spans open in the current thread
+    """
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Records the wall time, CPU time and peak memory of the code run inside the with block.
+    :param name: Name of the stage, like 'message.decode_messages'
+    :param attributes: JSON serializable details of the span, like a file name or row count
+    """
+    if not _enabled:
+        yield
+        return
+
+    stack = _stack()
+    memory = _trace_memory and tracemalloc.is_tracing()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        # The enclosing span keeps the peak reached so far before the peak is reset for this one
+        if stack:
+            stack[-1]['peak_bytes'] = max(stack[-1]['peak_bytes'], peak)
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+    entry = {'name': name, 'attributes': attributes, 'depth': len(stack),
+             'parent': stack[-1]['name'] if stack else None,
+             'start_bytes': current, 'peak_bytes': current}
+    stack.append(entry)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    started = time.time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        stack.pop()
+        if memory and tracemalloc.is_tracing():
+            entry['peak_bytes'] = max(entry['peak_bytes'], tracemalloc.get_traced_memory()[1])
+            # The enclosing span also reached this peak
+            if stack:
+                stack[-1]['peak_bytes'] = max(stack[-1]['peak_bytes'], entry['peak_bytes'])
+        record([{
+            'name': name,
+            'attributes': attributes,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'depth': entry['depth'],
+            'parent': entry['parent'],
+            'start': started,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'peak_mib': (entry['peak_bytes'] - entry['start_bytes']) / (1 << 20) if memory else None,
+        }])
+
+
+def traced(name: str):
+    """
+    Decorator running every call of a function in a span.
+    :param name: Name of the stage, like 'followers.follow_diff'
+    :return: The decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def collect() -> list:
+    """
+    :return: Every span recorded in this process so far, which are cleared
+    """
+    global _spans
+    with _lock:
+        spans, _spans = _spans, []
+    return spans
+
+
+def record(spans: list) -> None:
+    """
+    Adds finished spans to this process, such as the spans of a worker process.
+    :param spans: List of span dictionaries
+    """
+    if spans:
+        with _lock:
+            _spans.extend(spans)
+
+
+def traced_call(function, args=(), memory=True):
+    """
+    Runs a function with profiling on, in a worker process, and returns its spans with
+    its result so the parent process can record them.
+    :param function: A picklable function
+    :param args: Tuple of the positional arguments of the function
+    :param memory: Whether to record the peak memory of spans
+    :return: Tuple of the result of the function and the list of recorded spans
+    """
+    enable(memory)
+    collect()
+    # A forked worker starts with a copy of the spans open in its parent, which it does not run in
+    _local.stack = []
+    try:
+        return function(*args), collect()
+    except BaseException:
+        collect()
+        raise
+
+
+def traced_map(executor, function, iterable, chunksize=1):
+    """
+    Maps a function over an iterable in a process pool like executor.map. While profiling is
+    enabled the spans of the worker processes are recorded in this process as well.
+    :param executor: A ProcessPoolExecutor
+    :param function: A picklable function taking one item
+    :param iterable: The items to map the function over
+    :param chunksize: Number of items sent to a worker at a time
+    :return: Generator of the results in the order of the items
+    """
+    if not _enabled:
+        yield from executor.map(function, iterable, chunksize=chunksize)
+        return
+    items = [(item,) for item in iterable]
+    for result, spans in executor.map(traced_call, [function] * len(items), items,
+                                      [_trace_memory] * len(items), chunksize=chunksize):
+        record(spans)
+        yield result
+
+
+def summary(spans: list):
+    """
+    Aggregates spans by stage name, slowest first.
+    :param spans: List of span dictionaries
+    :return: DataFrame with the calls, total and maximum wall seconds, total CPU seconds and
+             maximum peak memory in MiB of every stage
+    """
+    import pandas as pd
+
+    columns = ['stage', 'calls', 'wall_seconds', 'max_wall_seconds', 'cpu_seconds', 'peak_mib']
+    if not spans:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(spans)
+    table = df.groupby('name', sort=False).agg(
+        calls=('wall_seconds', 'size'), wall_seconds=('wall_seconds', 'sum'),
+        max_wall_seconds=('wall_seconds', 'max'), cpu_seconds=('cpu_seconds', 'sum'),
+        peak_mib=('peak_mib', 'max'))
+    table = table.reset_index().rename(columns={'name': 'stage'})
+    return table.sort_values(by=['wall_seconds'], ascending=False, ignore_index=True)[columns]
+
+
+def write_trace(path, spans=None) -> list:
+    """
+    Writes the JSON trace of the run with every span and the per stage summary.
+    :param path: Path of the JSON trace file
+    :param spans: List of span dictionaries, defaults to every span recorded in this process
+    :return: The spans written to the trace
+    """
+    spans = collect() if spans is None else spans
+    trace = {
+        'started': datetime.fromtimestamp(_run_started, timezone.utc).isoformat(),
+        'argv': sys.argv,
+        'pid': os.getpid(),
+        'memory_traced': _trace_memory,
+        'spans': sorted(spans, key=lambda entry: entry['start']),
+        'summary': summary(spans).to_dict(orient='records'),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=2, default=str)
+    return spans
+
+
+def print_summary(spans: list) -> None:
+    """
+    Prints the per stage summary table of spans.
+    :param spans: List of span dictionaries
+    """
+    table = summary(spans)
+    print('\nProfile Summary:')
+    print(table.to_string(index=False, float_format=lambda value: f'{value:.4f}') if not table.empty
+          else 'No stages were recorded.')
@@ -0,0 +1,327 @@
+"""
+Batch Report Module
+
+This module runs the analyzer without any menus or windows, so it can be scheduled with
+cron or looped over many exports. The chosen analyses run independently of each other in a
+process pool. Each one writes its machine-readable summaries as JSON and CSV files, and every
+figure it produces is rendered with the non-GUI Agg backend in the same pool as soon as its
+data is ready. Main features include:
+- Writing the inbox, follow, comment and liked summaries as JSON and CSV files.
+- Rendering the DM plots from the inbox message cube to PNG and/or SVG files.
+- Writing a manifest.json listing every written file and every analysis that failed.
+
+Functions:
+- render_figure(plot, data, output_dir, stem, formats): Renders one figure to image files.
+- messages_report(instagram_data, output_dir): Writes the inbox summaries and figure tasks.
+- followers_report(instagram_data, output_dir): Writes the follow diff summaries.
+- comments_report(instagram_data, output_dir): Writes the post comment summaries.
+- liked_report(instagram_data, output_dir): Writes the liked comments and posts summaries.
+- run_report(main_path, output_dir, analyses, formats, timezone, cache_dir, max_workers, parse_workers):
+  Runs the analyses and figure renders in a process pool and writes the manifest.
+"""
+
+import json
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import instagram_data_class as ig_data
+import profiling
+import timeutil
+
+FIGURE_FORMATS = ('png', 'svg')
+
+
+def _use_agg_backend() -> None:
+    """
+    Switches matplotlib to the non-GUI Agg backend, run once in every worker process.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _write_json(path: Path, summary: dict) -> Path:
+    """
+    Writes a summary dictionary as an indented JSON file.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+
+def _write_csv(path: Path, df) -> Path:
+    """
+    Writes a DataFrame as a CSV file without its index.
+    """
+    df.to_csv(path, index=False)
+    return path
+
+
+def _top_counts(column, top_k=5) -> list:
+    """
+    :return: List of {'name', 'count'} dictionaries of the most common values of a column
+    """
+    counts = column.value_counts().head(top_k)
+    return [{'name': str(name), 'count': int(count)} for name, count in counts.items()]
+
+
+def render_figure(plot, data, output_dir, stem: str, formats=FIGURE_FORMATS) -> list:
+    """
+    Renders one figure with the Agg backend and saves it in every requested format.
+    :param plot: A picklable plotting function taking data and returning a Matplotlib figure
+    :param data: The data the figure is rendered from, such as a message cube
+    :param output_dir: Directory the image files are written to
+    :param stem: File name of the images without the extension
+    :param formats: Image formats to write, 'png' and/or 'svg'
+    :return: List of the written file paths
+    """
+    _use_agg_backend()
+    from matplotlib import pyplot as plt
+
+    fig = plot(data)
+    try:
+        paths = []
+        for image_format in formats:
+            path = Path(output_dir) / f'{stem}.{image_format}'
+            with profiling.span('report.savefig', figure=stem, format=image_format):
+                fig.savefig(path, format=image_format, bbox_inches='tight')
+            paths.append(str(path))
+        return paths
+    finally:
+        plt.close(fig)
+
+
+def messages_report(instagram_data: ig_data.InstagramData, output_dir: Path):
+    """
+    Writes the per-conversation summary, the inbox message cube and the most common words
+    and phrases of the whole inbox.
+    :param instagram_data: InstagramData class object with initialized paths
+    :param output_dir: Directory the summaries are written to
+    :return: Tuple of the written file paths and the (plot, data, stem) figure tasks
+    """
+    import inbox
+    import message as msg
+    import word_freq
+
+    inbox_path = instagram_data.inbox_path
+    if inbox_path is None or not inbox_path.exists():
+        raise FileNotFoundError(f'{inbox_path} does not exist.')
+
+    conversations = inbox.create_inbox_dfs(inbox_path, instagram_data.max_workers, instagram_data.cache)
+    cube = msg.merge_message_cubes(msg.build_message_cube(df, instagram_data.timezone)
+                                   for df in conversations.values())
+    content_column = msg.decode_messages(msg.filter_msg_content(inbox.create_global_df(conversations)))
+
+    summary = {
+        'conversations': len(conversations),
+        'messages': int(cube['messages'].sum()),
+        'texts': msg.get_message_df_length(content_column),
+        'first_message_date': str(cube['day'].min().astype('datetime64[D]')) if len(cube) else None,
+        'last_message_date': str(cube['day'].max().astype('datetime64[D]')) if len(cube) else None,
+        'most_common_words': [{'name': word, 'count': count}
+                              for word, count in word_freq.count_words(content_column, top_k=20,
+                                                                     max_workers=instagram_data.max_workers)],
+        'most_common_phrases': [{'name': phrase, 'count': count}
+                                for phrase, count in word_freq.count_words(content_column, top_k=20, ngram=2,
+                                                                           stopwords=True, casefold=True,
+                                                                           max_workers=instagram_data.max_workers)],
+    }
+    files = [
+        _write_json(output_dir / 'messages.json', summary),
+        _write_csv(output_dir / 'inbox_summary.csv', inbox.inbox_summary(conversations)),
+        _write_csv(output_dir / 'message_cube.csv',
+                   cube.assign(date=cube['day'].to_numpy().astype('datetime64[D]'))),
+    ]
+    figures = [(plot, cube, f'messages_{name}') for name, plot in msg.MESSAGE_PLOTS.items()]
+    return files, figures
+
+
+def followers_report(instagram_data: ig_data.InstagramData, output_dir: Path):
+    """
+    Writes the accounts not following back, the fans and the mutuals along with their counts.
+    :param instagram_data: InstagramData class object with initialized paths
+    :param output_dir: Directory the summaries are written to
+    :return: Tuple of the written file paths and an empty list of figure tasks
+    """
+    import followers
+
+    follower_df = instagram_data.followers_df()
+    following_df = instagram_data.following_df()
+    if follower_df is None or following_df is None:
+        raise ValueError('The followers or following JSON files are missing or could not be parsed.')
+
+    diff = followers.follow_diff(follower_df[['href', 'value', 'timestamp']],
+                                 following_df[['href', 'value', 'timestamp']])
+    columns = {'href': 'profile_link', 'value': 'username'}
+    summary = {
+        'followers': len(follower_df),
+        'following': len(following_df),
+        'not_following_back': len(diff.not_following_back),
+        'fans': len(diff.fans),
+        'mutuals': len(diff.mutuals),
+    }
+    files = [_write_json(output_dir / 'followers.json', summary)]
+    for name, df in diff._asdict().items():
+        files.append(_write_csv(output_dir / f'{name}.csv', df.rename(columns=columns)))
+    return files, []
+
+
+def comments_report(instagram_data: ig_data.InstagramData, output_dir: Path):
+    """
+    Writes the number of post comments, the accounts commented under the most and the
+    most common words of the comments.
+    :param instagram_data: InstagramData class object with initialized paths
+    :param output_dir: Directory the summaries are written to
+    :return: Tuple of the written file paths and an empty list of figure tasks
+    """
+    import word_freq
+
+    df = instagram_data.post_comments_df()
+    if df is None:
+        raise ValueError('The post comments JSON files are missing or could not be parsed.')
+
+    summary = {
+        'comments': len(df),
+        'top_accounts': _top_counts(df['Media Owner'], 10),
+        'most_common_words': [{'name': word, 'count': count}
+                              for word, count in word_freq.count_words(df['Comment'], top_k=20,
+                                                                     max_workers=instagram_data.max_workers)],
+    }
+    comments_df = df.assign(Time=timeutil.format_times(df['Time'], 's', instagram_data.timezone,
+                                                       '%Y-%m-%d %H:%M:%S'))
+    files = [_write_json(output_dir / 'comments.json', summary),
+             _write_csv(output_dir / 'post_comments.csv', comments_df)]
+    return files, []
+
+
+def liked_report(instagram_data: ig_data.InstagramData, output_dir: Path):
+    """
+    Writes the number of liked comments and posts, the accounts liked the most and the
+    liked posts of every month.
+    :param instagram_data: InstagramData class object with initialized paths
+    :param output_dir: Directory the summaries are written to
+    :return: Tuple of the written file paths and the likes over time figure task
+    """
+    import liked
+
+    summary, files, figures = {}, [], []
+    # Each file is checked on its own, so a missing liked comments file still writes the liked posts
+    for name, df in (('liked_comments', instagram_data.liked_comments_df()),
+                     ('liked_posts', instagram_data.liked_posts_df())):
+        if df is None:
+            summary[name] = None
+            continue
+        top_accounts = liked.top_liked_accounts(df)
+        summary[name] = {'count': len(df), 'top_accounts': [{'name': account, 'count': int(likes)}
+                                                            for account, likes in top_accounts.itertuples(index=False)]}
+        if name == 'liked_posts' and not df.empty:
+            monthly_likes = liked.likes_per_month(df, instagram_data.timezone)
+            files.append(_write_csv(output_dir / 'liked_posts_per_month.csv',
+                                    monthly_likes.rename_axis('month').reset_index()))
+            figures.append((liked.plot_likes_over_time, monthly_likes, 'liked_posts_per_month'))
+    if all(value is None for value in summary.values()):
+        raise ValueError('The liked comments and posts JSON files are missing or could not be parsed.')
+    return [_write_json(output_dir / 'liked.json', summary)] + files, figures
+
+
+# Every analysis the batch report can run, by the name given on the command line
+ANALYSES = {
+    'messages': messages_report,
+    'followers': followers_report,
+    'comments': comments_report,
+    'liked': liked_report,
+}
+
+
+def _run_analysis(name: str, main_path, output_dir, timezone, cache_dir, parse_workers):
+    """
+    Runs one analysis in a worker process on its own InstagramData object, whose shards
+    are parsed and words counted with parse_workers processes.
+    :return: Tuple of the written file paths and the figure tasks of the analysis
+    """
+    instagram_data = ig_data.InstagramData(main_path, cache_dir=cache_dir, timezone=timezone,
+                                           max_workers=parse_workers)
+    instagram_data.init_paths()
+    with profiling.span(f'report.{name}'):
+        files, figures = ANALYSES[name](instagram_data, Path(output_dir))
+    return [str(path) for path in files], figures
+
+
+def _submit(executor, function, *args):
+    """
+    Submits a function to the pool, collecting the spans of the worker while profiling.
+    """
+    if profiling.is_enabled():
+        return executor.submit(profiling.traced_call, function, args, profiling.traces_memory())
+    return executor.submit(function, *args)
+
+
+def _result(future):
+    """
+    Returns the result of a future of _submit, recording the spans of the worker while profiling.
+    """
+    if profiling.is_enabled():
+        result, spans = future.result()
+        profiling.record(spans)
+        return result
+    return future.result()
+
+
+def run_report(main_path, output_dir, analyses=tuple(ANALYSES), formats=FIGURE_FORMATS,
+               timezone=timeutil.DEFAULT_TIMEZONE, cache_dir=None, max_workers=None, parse_workers=None) -> dict:
+    """
+    Runs the chosen analyses of an export and renders their figures in a process pool,
+    then writes a manifest.json of every written file and every failed analysis.
+    :param main_path: Path to the extracted export folder or to the downloaded ZIP file
+    :param output_dir: Directory the reports are written to, created if needed
+    :param analyses: Names of the analyses to run, keys of ANALYSES
+    :param formats: Image formats the figures are written in, 'png' and/or 'svg'
+    :param timezone: Timezone the dates and hours are bucketed in
+    :param cache_dir: Directory to cache parsed DataFrames in, or None to disable caching
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param parse_workers: Number of processes each analysis parses shards and counts words with,
+                          1 to keep them in the worker process. Defaults to 1 when there are
+                          several workers, so the report never runs more processes than
+                          max_workers plus this one, and to the number of CPUs when a single
+                          worker runs the analyses one after the other.
+    :return: The manifest dictionary
+    :raise ValueError: If an unknown analysis or image format is given
+    """
+    unknown = [name for name in analyses if name not in ANALYSES]
+    unknown += [image_format for image_format in formats if image_format not in FIGURE_FORMATS]
+    if unknown:
+        raise ValueError(f'Unknown analyses or formats: {", ".join(unknown)}')
+
+    if parse_workers is None:
+        # Nested pools in every worker would start about max_workers times the CPUs in processes
+        parse_workers = None if max_workers == 1 else 1
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'export': str(main_path), 'timezone': timezone, 'analyses': {}, 'figures': [], 'errors': {}}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg_backend) as executor:
+        pending = {_submit(executor, _run_analysis, name, str(main_path), str(output_dir), timezone, cache_dir,
+                           parse_workers): name
+                   for name in analyses}
+        while pending:
+            for future in as_completed(list(pending)):
+                name = pending.pop(future)
+                try:
+                    result = _result(future)
+                except Exception as error:
+                    print(f'ERROR: {name} failed: {error}')
+                    manifest['errors'][name] = ''.join(traceback.format_exception_only(error)).strip()
+                    continue
+                if isinstance(result, tuple):
+                    # An analysis finished, its figures render while the other analyses run
+                    files, figures = result
+                    manifest['analyses'][name] = files
+                    print(f'{name} written.')
+                    for plot, data, stem in figures:
+                        pending[_submit(executor, render_figure, plot, data, str(output_dir), stem, formats)] = stem
+                else:
+                    manifest['figures'].extend(result)
+                    print(f'{name} rendered.')
+
+    _write_json(output_dir / 'manifest.json', manifest)
+    return manifest
@@ -0,0 +1,329 @@
+"""
+Search Index Module
+
+This module keeps a persistent full-text index of the direct messages and post comments of an
+export in an SQLite database, so finding when a word or phrase came up answers from the index
+in milliseconds instead of parsing every conversation JSON file again. Main features include:
+- Indexing the decoded text of every message and comment with the positions of its tokens, which
+  are the same word and emoji tokens the word counts use, case folded.
+- Updating incrementally: only message and comment shards whose size or modification time
+  changed are indexed again, and shards that disappeared are dropped.
+- Querying by terms, which must all appear, and by "quoted phrases", whose tokens must appear
+  next to each other, filtered by sender and date range.
+
+Queries typed in the search menu can mix terms and phrases with from:name, after:YYYY-MM-DD and
+before:YYYY-MM-DD filters, e.g. "see you" tonight from:alice after:2023-01-01
+
+Classes:
+    SearchIndex: The SQLite index and its update and search operations.
+
+Functions:
+- index_path_for(main_path, cache_dir): Returns the index file of an export.
+- parse_query(query): Splits a typed query into its terms, phrases and filters.
+- search_menu(instagram_data): Updates the index and answers queries typed by the user.
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+from pathlib import Path
+import pandas as pd
+import cache
+import comments
+import export_files
+import inbox
+import instagram_data_class as ig_data
+import message as msg
+import profiling
+import timeutil
+import word_freq
+
+# Bumped whenever the tables or the tokenizer change, so older indexes are rebuilt
+INDEX_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime NUMERIC NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    conversation TEXT NOT NULL,
+    sender TEXT COLLATE NOCASE,
+    timestamp_ms INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_source ON documents(source_id);
+CREATE INDEX IF NOT EXISTS documents_time ON documents(timestamp_ms);
+CREATE INDEX IF NOT EXISTS documents_sender ON documents(sender, timestamp_ms);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (token, document_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_document ON postings(document_id);
+'''
+
+QUERY_PATTERN = re.compile(r'(?P<filter>from|after|before):(?:"(?P<quoted_value>[^"]*)"|(?P<value>\S+))'
+                           r'|"(?P<phrase>[^"]*)"'
+                           r'|(?P<term>\S+)')
+
+
+def index_path_for(main_path, cache_dir=cache.DEFAULT_CACHE_DIR) -> Path:
+    """
+    Returns the index file of an export, so every export gets its own index.
+    :param main_path: Path to the extracted export folder or to the downloaded ZIP file
+    :param cache_dir: Directory the index files are kept in
+    :return: Path of the SQLite index file
+    """
+    export_id = hashlib.blake2b(str(Path(main_path).resolve()).encode('utf-8'), digest_size=8).hexdigest()
+    return Path(cache_dir) / f'search-{export_id}.sqlite3'
+
+
+def parse_query(query: str) -> dict:
+    """
+    Splits a typed query into token groups and filters. Every plain term and every quoted
+    phrase becomes a group of tokens that must appear next to each other.
+    :param query: The query, like '"see you" tonight from:alice after:2023-01-01'
+    :return: Dictionary with the 'groups' list of token lists and the 'sender', 'after' and
+             'before' filters, None when not given
+    """
+    parsed = {'groups': [], 'sender': None, 'after': None, 'before': None}
+    for match in QUERY_PATTERN.finditer(query):
+        if match.group('filter'):
+            value = match.group('quoted_value') if match.group('quoted_value') is not None else match.group('value')
+            parsed['sender' if match.group('filter') == 'from' else match.group('filter')] = value
+        else:
+            tokens = word_freq.tokenize(match.group('phrase') or match.group('term') or '', casefold=True)
+            if tokens:
+                parsed['groups'].append(tokens)
+    return parsed
+
+
+class SearchIndex:
+    """
+    A persistent inverted index of messages and comments in an SQLite database.
+
+    Attributes:
+        index_path (Path): The SQLite database file.
+        connection (sqlite3.Connection): The open database connection.
+
+    Methods:
+        update(instagram_data): Indexes new and changed message and comment shards.
+        index_source(path, documents): Replaces the documents of one source file.
+        search(groups, sender, start_ms, end_ms, kind, limit): Finds matching documents.
+        close(): Closes the database.
+    """
+
+    def __init__(self, index_path) -> None:
+        """
+        Opens the index database, creating it or rebuilding an outdated one.
+
+        :param index_path: The SQLite database file.
+        """
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.index_path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            with self.connection:
+                for table in ('postings', 'documents', 'sources'):
+                    self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+                self.connection.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
+
+    def _indexed_sources(self) -> dict:
+        """
+        :return: Dictionary mapping the path of every indexed source to its (size, mtime)
+        """
+        return {path: (size, mtime) for path, size, mtime
+                in self.connection.execute('SELECT path, size, mtime FROM sources')}
+
+    def index_source(self, path, documents: pd.DataFrame) -> int:
+        """
+        Replaces every document of one source file in a single transaction.
+
+        :param path: The source file the documents were parsed from.
+        :param documents: DataFrame with kind, conversation, sender, timestamp_ms and content columns.
+        :return: The number of documents indexed.
+        """
+        source, size, mtime = export_files.file_signature(path)
+        with self.connection:
+            self.connection.execute('DELETE FROM sources WHERE path = ?', (source,))
+            source_id = self.connection.execute('INSERT INTO sources (path, size, mtime) VALUES (?, ?, ?)',
+                                                (source, size, mtime)).lastrowid
+            postings = []
+            for row in documents.itertuples(index=False):
+                document_id = self.connection.execute(
+                    'INSERT INTO documents (source_id, kind, conversation, sender, timestamp_ms, content) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (source_id, row.kind, row.conversation, row.sender, int(row.timestamp_ms), row.content)).lastrowid
+                postings.extend((token, document_id, position)
+                                for position, token in enumerate(word_freq.tokenize(row.content, casefold=True)))
+            self.connection.executemany('INSERT INTO postings VALUES (?, ?, ?)', postings)
+        return len(documents)
+
+    @profiling.traced('search_index.update')
+    def update(self, instagram_data: ig_data.InstagramData) -> int:
+        """
+        Indexes the message and comment shards that are new or changed since the last update
+        and drops the shards that no longer exist.
+
+        :param instagram_data: InstagramData object with initialized paths.
+        :return: The number of shards indexed.
+        """
+        sources = []
+        if instagram_data.inbox_path is not None and instagram_data.inbox_path.exists():
+            for conversation, shards in inbox.find_conversation_shards(instagram_data.inbox_path).items():
+                sources.extend((shard, conversation, _message_documents) for shard in shards)
+        comment_shards = instagram_data.shard_paths.get('post_comments') or []
+        sources.extend((shard, None, _comment_documents) for shard in comment_shards if shard.exists())
+
+        indexed = self._indexed_sources()
+        current = set()
+        updated = 0
+        for path, conversation, parser in sources:
+            source, size, mtime = export_files.file_signature(path)
+            current.add(source)
+            if indexed.get(source) == (size, mtime):
+                continue
+            documents = parser(path, conversation)
+            if documents is not None:
+                self.index_source(path, documents)
+                updated += 1
+
+        removed = [(source,) for source in indexed if source not in current]
+        if removed:
+            with self.connection:
+                self.connection.executemany('DELETE FROM sources WHERE path = ?', removed)
+        return updated
+
+    @profiling.traced('search_index.search')
+    def search(self, groups=(), sender=None, start_ms=None, end_ms=None, kind=None, limit=100) -> pd.DataFrame:
+        """
+        Finds the documents containing every token group, each group's tokens next to each other.
+
+        :param groups: List of token lists, like [['see', 'you'], ['tonight']]; empty to only filter.
+        :param sender: Sender name to match regardless of case, or None.
+        :param start_ms: Earliest epoch millisecond timestamp, or None.
+        :param end_ms: Epoch millisecond timestamp the documents must be before, or None.
+        :param kind: 'message' or 'comment' to search only one kind, or None for both.
+        :param limit: The maximum number of documents returned.
+        :return: DataFrame of the matching documents from the newest to the oldest.
+        """
+        conditions, parameters = [], []
+        for tokens in groups:
+            # A phrase joins one postings row per token at consecutive positions of the same document
+            joins = ' '.join(f'JOIN postings p{i} ON p{i}.document_id = p0.document_id '
+                             f'AND p{i}.position = p0.position + {i} AND p{i}.token = ?'
+                             for i in range(1, len(tokens)))
+            conditions.append(f'id IN (SELECT p0.document_id FROM postings p0 {joins} WHERE p0.token = ?)')
+            parameters.extend(tokens[1:] + tokens[:1])
+        for condition, value in (('sender = ?', sender), ('timestamp_ms >= ?', start_ms),
+                                 ('timestamp_ms < ?', end_ms), ('kind = ?', kind)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        return pd.read_sql_query(
+            f'SELECT kind, conversation, sender, timestamp_ms, content FROM documents {where} '
+            f'ORDER BY timestamp_ms DESC LIMIT ?', self.connection, params=parameters + [limit])
+
+
+def _message_documents(path, conversation) -> pd.DataFrame | None:
+    """
+    Parses the text messages of one message shard into index documents.
+    """
+    df = msg.create_msg_df(path, streaming=True)
+    if df is None:
+        return None
+    texts = df[msg.message_types(df) == 'text']
+    return pd.DataFrame({
+        'kind': 'message',
+        'conversation': conversation,
+        'sender': msg.decode_messages(texts['sender_name'].astype(object)).to_numpy(),
+        'timestamp_ms': texts['timestamp_ms'].to_numpy(),
+        'content': msg.decode_messages(texts['content']).to_numpy(),
+    })
+
+
+def _comment_documents(path, conversation=None) -> pd.DataFrame | None:
+    """
+    Parses the comments of one post comments shard into index documents, with the owner of
+    the post as the conversation.
+    """
+    df = comments.create_post_df(path)
+    if df is None:
+        return None
+    df = df[df['Comment'].map(lambda comment: isinstance(comment, str))]
+    return pd.DataFrame({
+        'kind': 'comment',
+        'conversation': df['Media Owner'].fillna('').to_numpy(),
+        'sender': None,
+        'timestamp_ms': df['Time'].to_numpy() * 1000,
+        'content': df['Comment'].to_numpy(),
+    })
+
+
+def _date_to_epoch_ms(date: str, tz: str) -> int:
+    """
+    :return: The epoch milliseconds of local midnight at the start of a YYYY-MM-DD date
+    """
+    return pd.Timestamp(date, tz=tz).value // 1_000_000
+
+
+def search_menu(instagram_data: ig_data.InstagramData):
+    """
+    Updates the search index of the export, then answers queries typed by the user until
+    they return to the main menu.
+    """
+    print('\nWelcome To The Search Section!')
+    print('------------------------------------')
+    cache_dir = instagram_data.cache.cache_dir if instagram_data.cache is not None else cache.DEFAULT_CACHE_DIR
+    index = SearchIndex(index_path_for(instagram_data.main_path, cache_dir))
+    try:
+        print('Updating the search index...')
+        updated = index.update(instagram_data)
+        print(f'{updated} new or changed files indexed.')
+
+        while True:
+            query = input('\nSearch your messages and comments, e.g. "see you" tonight from:alice '
+                          'after:2023-01-01 before:2024-01-01, or type "return": \n').strip()
+            if query == 'return':
+                print()
+                return
+            parsed = parse_query(query)
+            try:
+                start_ms = _date_to_epoch_ms(parsed['after'], instagram_data.timezone) if parsed['after'] else None
+                end_ms = _date_to_epoch_ms(parsed['before'], instagram_data.timezone) if parsed['before'] else None
+            except ValueError:
+                print('\nERROR: Dates must look like 2023-01-31')
+                continue
+
+            started = time.perf_counter()
+            results = index.search(parsed['groups'], parsed['sender'], start_ms, end_ms)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if results.empty:
+                print(f'\nNo results found ({elapsed_ms:.1f} ms).')
+                continue
+            results['timestamp_ms'] = timeutil.format_times(results['timestamp_ms'], 'ms',
+                                                            instagram_data.timezone, '%Y-%m-%d %H:%M')
+            results = results.rename(columns={'timestamp_ms': 'time'}).fillna('')
+            print(f'\n{len(results)} results ({elapsed_ms:.1f} ms):')
+            print(results.to_string(index=False, max_colwidth=80))
+    finally:
+        index.close()
@@ -0,0 +1,378 @@
+"""
+Analysis Service Module
+
+This module runs the analyzer as a small local HTTP service for analysing the exports of many
+accounts. Exports are submitted as jobs to a bounded queue, and a fixed number of jobs run at a
+time, each one the batch report of the report module in its own process. Every job process gets
+a fixed number of worker processes, which parse and count words without further pools, and its
+memory budget is split evenly between the job process and its workers as address space limits.
+The processes of a job can then use at most its memory budget together, and one huge inbox can
+only fail its own job with a MemoryError. It cannot starve the other jobs of memory or CPUs.
+Process groups and address space limits are only available on Unix, elsewhere jobs run without
+them and a timeout only stops the job process. Main features include:
+- POST /jobs with {"export": path} and optional analyses, formats, timezone, memory_mb and
+  timeout to queue a job, answered with its id, or 503 while the queue is full.
+- GET /jobs to list every job and GET /jobs/<id> for the status, timings, errors and the
+  manifest of written files of one job. Only the most recently finished jobs are kept in
+  memory, older ones are forgotten while their reports stay on disk.
+- Stopping a job and every worker process of it when it runs longer than its timeout.
+
+Classes:
+    JobQueue: The queue of jobs, the worker threads running them and their status.
+    ServiceHandler: The HTTP request handler of the job API.
+
+Functions:
+- serve(host, port, output_root, max_jobs, workers_per_job, memory_mb, max_queued, cache_dir, max_finished):
+  Runs the service until it is interrupted.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import cache
+import report
+import timeutil
+
+try:
+    import resource
+except ImportError:
+    # Address space limits are only available on Unix
+    resource = None
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_JOBS = 2
+DEFAULT_WORKERS_PER_JOB = 2
+DEFAULT_MEMORY_MB = 4096
+DEFAULT_MAX_QUEUED = 100
+DEFAULT_MAX_FINISHED = 1000
+
+# Exit status of a job process whose report finished with failed analyses
+EXIT_ANALYSES_FAILED = 1
+
+
+def _run_job(main_path, output_dir, analyses, formats, timezone, cache_dir, max_workers, memory_mb) -> None:
+    """
+    Runs the batch report of one job in its own process. The process starts a new process
+    group so it can be stopped with all of its workers, limits its address space to its share
+    of memory_mb, which the workers inherit, and sends its output and the output of its
+    workers to job.log.
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    log = open(output_dir / 'job.log', 'w', encoding='utf-8')
+    os.dup2(log.fileno(), sys.stdout.fileno())
+    os.dup2(log.fileno(), sys.stderr.fileno())
+    if resource is not None and memory_mb:
+        # Every process of the job gets the same limit, so the budget is split between them
+        limit = (memory_mb << 20) // (max_workers + 1)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    manifest = report.run_report(main_path, output_dir, analyses, formats, timezone,
+                                 cache_dir=cache_dir, max_workers=max_workers, parse_workers=1)
+    sys.stdout.flush()
+    sys.exit(EXIT_ANALYSES_FAILED if manifest['errors'] else 0)
+
+
+class JobQueue:
+    """
+    A bounded queue of report jobs run by a fixed number of worker threads, each of which
+    runs one job process at a time.
+
+    Attributes:
+        output_root (Path): The directory the reports of every job are written under.
+        workers_per_job (int): The number of worker processes of each job.
+        memory_mb (int): The default memory budget of each job, split between its processes.
+        cache_dir (Path): The directory to cache parsed DataFrames in, or None to disable caching.
+        max_finished (int): The number of finished jobs whose status is kept.
+        jobs (dict): The status of every queued, running and recently finished job, keyed by job id.
+
+    Methods:
+        submit(options): Validates and queues a job, returning its status.
+        status(job_id): Returns the status of a job.
+        list_jobs(): Returns the status of every job.
+        stop(): Stops the worker threads once the running jobs are done.
+    """
+
+    def __init__(self, output_root, max_jobs=DEFAULT_MAX_JOBS, workers_per_job=DEFAULT_WORKERS_PER_JOB,
+                 memory_mb=DEFAULT_MEMORY_MB, max_queued=DEFAULT_MAX_QUEUED, cache_dir=None,
+                 max_finished=DEFAULT_MAX_FINISHED) -> None:
+        """
+        Starts the worker threads.
+
+        :param output_root: The directory the reports of every job are written under.
+        :param max_jobs: The number of jobs running at the same time.
+        :param workers_per_job: The number of worker processes of each job.
+        :param memory_mb: The default memory budget in MiB of each job, 0 for no limit.
+        :param max_queued: The number of jobs that can wait in the queue.
+        :param cache_dir: The directory to cache parsed DataFrames in, or None to disable caching.
+        :param max_finished: The number of finished jobs whose status is kept, oldest dropped first.
+        """
+        self.output_root = Path(output_root)
+        self.output_root.mkdir(parents=True, exist_ok=True)
+        self.workers_per_job = workers_per_job
+        self.memory_mb = memory_mb
+        self.cache_dir = cache_dir
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queued)
+        # Job processes are spawned, forking a threaded server could copy a held lock into them
+        self._context = multiprocessing.get_context('spawn')
+        self._threads = [threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                         for i in range(max_jobs)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, options: dict) -> dict:
+        """
+        Validates the options of a job and queues it.
+
+        :param options: Dictionary with the export path and optionally the analyses, formats,
+                        timezone, memory_mb and timeout in seconds of the job.
+        :return: The status of the queued job.
+        :raise ValueError: If the options are invalid.
+        :raise queue.Full: If the queue is full.
+        """
+        export = options.get('export')
+        if not isinstance(export, str) or not Path(export).exists():
+            raise ValueError(f'export does not exist: {export}')
+        analyses = options.get('analyses', list(report.ANALYSES))
+        formats = options.get('formats', ['png'])
+        unknown = [name for name in analyses if name not in report.ANALYSES]
+        unknown += [image_format for image_format in formats if image_format not in report.FIGURE_FORMATS]
+        if unknown:
+            raise ValueError(f'Unknown analyses or formats: {", ".join(map(str, unknown))}')
+        timezone = options.get('timezone', timeutil.DEFAULT_TIMEZONE)
+        if not timeutil.check_timezone(timezone):
+            raise ValueError(f'invalid timezone: {timezone}')
+        memory_mb = int(options.get('memory_mb', self.memory_mb))
+        if memory_mb < 0:
+            raise ValueError(f'memory_mb must not be negative: {memory_mb}')
+        timeout = options.get('timeout')
+        if timeout is not None:
+            timeout = float(timeout)
+            if not timeout > 0:
+                raise ValueError(f'timeout must be a positive number of seconds: {timeout:g}')
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'export': export,
+            'analyses': analyses,
+            'formats': formats,
+            'timezone': timezone,
+            'memory_mb': memory_mb,
+            'timeout': timeout,
+            'output_dir': str(self.output_root / job_id),
+            'status': 'queued',
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'errors': {},
+            'manifest': None,
+        }
+        with self._lock:
+            self._queue.put_nowait(job_id)
+            self.jobs[job_id] = job
+        return dict(job)
+
+    def status(self, job_id: str) -> dict | None:
+        """
+        :param job_id: The id of a job.
+        :return: A copy of the status of the job, or None if there is no such job.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list_jobs(self) -> list:
+        """
+        :return: Copies of the status of every job, oldest first.
+        """
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def stop(self) -> None:
+        """
+        Stops the worker threads once the jobs they are running are done.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _update(self, job_id: str, **fields) -> None:
+        """
+        Updates fields of the status of a job, forgetting the oldest finished jobs once
+        more than max_finished jobs have finished.
+        """
+        with self._lock:
+            self.jobs[job_id].update(fields)
+            if fields.get('finished') is not None:
+                finished = sorted((job for job in self.jobs.values() if job['finished'] is not None),
+                                  key=lambda job: job['finished'])
+                for job in finished[:max(len(finished) - self.max_finished, 0)]:
+                    del self.jobs[job['id']]
+
+    def _work(self) -> None:
+        """
+        Runs queued jobs one at a time until stopped.
+        """
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run(self.status(job_id))
+            except Exception as error:
+                self._update(job_id, status='failed', finished=time.time(),
+                             errors={'service': ''.join(traceback.format_exception_only(error)).strip()})
+
+    def _run(self, job: dict) -> None:
+        """
+        Runs the report of a job in its own process and records the outcome.
+        """
+        self._update(job['id'], status='running', started=time.time())
+        process = self._context.Process(
+            target=_run_job, name=f'job-{job["id"]}',
+            args=(job['export'], job['output_dir'], job['analyses'], job['formats'], job['timezone'],
+                  self.cache_dir, self.workers_per_job, job['memory_mb']))
+        process.start()
+        process.join(job['timeout'])
+        errors = {}
+        if process.is_alive():
+            # The job process leads its own process group, which holds every worker of the job
+            if hasattr(os, 'killpg'):
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    # The job process was stopped before it started its process group
+                    process.kill()
+            else:
+                process.kill()
+            process.join()
+            errors['service'] = f'stopped after the timeout of {job["timeout"]:g} seconds'
+
+        manifest_path = Path(job['output_dir']) / 'manifest.json'
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8')) if manifest_path.exists() else None
+        if manifest is not None:
+            errors.update(manifest['errors'])
+        elif not errors:
+            errors['service'] = f'the job process exited with status {process.exitcode}, see job.log'
+        self._update(job['id'], status='failed' if errors else 'succeeded', finished=time.time(),
+                     errors=errors, manifest=manifest)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    Answers the job API with JSON. The JobQueue is the jobs attribute of the server.
+    """
+
+    def _send_json(self, status: HTTPStatus, body) -> None:
+        """
+        Sends a JSON response.
+        """
+        data = json.dumps(body, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        """
+        GET /jobs lists every job, GET /jobs/<id> returns the status of one job.
+        """
+        parts = self.path.strip('/').split('/')
+        if parts == ['jobs']:
+            self._send_json(HTTPStatus.OK, self.server.jobs.list_jobs())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.server.jobs.status(parts[1])
+            if job is None:
+                self._send_json(HTTPStatus.NOT_FOUND, {'error': f'no job {parts[1]}'})
+            else:
+                self._send_json(HTTPStatus.OK, job)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        """
+        POST /jobs queues a job from a JSON body of its options.
+        """
+        if self.path.strip('/') != 'jobs':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'unknown path {self.path}'})
+            return
+        try:
+            options = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(options, dict):
+                raise ValueError('the body must be a JSON object')
+            job = self.server.jobs.submit(options)
+        except (ValueError, TypeError) as error:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': str(error)})
+        except queue.Full:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'the job queue is full, try again later'})
+        else:
+            self._send_json(HTTPStatus.ACCEPTED, job)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, output_root='reports', max_jobs=DEFAULT_MAX_JOBS,
+          workers_per_job=DEFAULT_WORKERS_PER_JOB, memory_mb=DEFAULT_MEMORY_MB, max_queued=DEFAULT_MAX_QUEUED,
+          cache_dir=None, max_finished=DEFAULT_MAX_FINISHED) -> None:
+    """
+    Runs the service until it is interrupted.
+
+    :param host: The address to listen on, local only by default.
+    :param port: The port to listen on.
+    :param output_root: The directory the reports of every job are written under.
+    :param max_jobs: The number of jobs running at the same time.
+    :param workers_per_job: The number of worker processes of each job.
+    :param memory_mb: The default memory budget in MiB of each job, 0 for no limit.
+    :param max_queued: The number of jobs that can wait in the queue.
+    :param cache_dir: The directory to cache parsed DataFrames in, or None to disable caching.
+    :param max_finished: The number of finished jobs whose status is kept.
+    """
+    if resource is None and memory_mb:
+        print('WARNING: memory limits are not supported on this platform, jobs run without them.')
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.jobs = JobQueue(output_root, max_jobs, workers_per_job, memory_mb, max_queued, cache_dir, max_finished)
+    print(f'Serving on http://{host}:{server.server_address[1]} with {max_jobs} jobs of '
+          f'{workers_per_job} workers at a time, reports in {output_root}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nStopping the service...')
+    finally:
+        server.jobs.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the analyzer as a local HTTP service with a job queue.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help=f'port (default: {DEFAULT_PORT})')
+    parser.add_argument('-o', '--output', default='reports', help='directory of the job reports (default: reports)')
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_MAX_JOBS,
+                        help=f'jobs running at the same time (default: {DEFAULT_MAX_JOBS})')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS_PER_JOB,
+                        help=f'worker processes of each job (default: {DEFAULT_WORKERS_PER_JOB})')
+    parser.add_argument('-m', '--memory-mb', type=int, default=DEFAULT_MEMORY_MB,
+                        help=f'memory budget of each job in MiB, split between its processes, 0 for none '
+                             f'(default: {DEFAULT_MEMORY_MB})')
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                        help=f'jobs that can wait in the queue (default: {DEFAULT_MAX_QUEUED})')
+    parser.add_argument('--max-finished', type=int, default=DEFAULT_MAX_FINISHED,
+                        help=f'finished jobs whose status is kept (default: {DEFAULT_MAX_FINISHED})')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the parsed data cache')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.output, args.jobs, args.workers, args.memory_mb, args.max_queued,
+          cache_dir=None if args.no_cache else str(cache.DEFAULT_CACHE_DIR), max_finished=args.max_finished)
@@ -0,0 +1,68 @@
+"""
+String List Data Module
+
+Followers, following, liked posts and liked comments files all store their entries in the same
+layout: a title, usually the account, and a string_list_data list whose first item holds the
+href, value and timestamp. This module normalizes any of these files into a DataFrame in a
+single pass over the entries, appending every field straight into its own column buffer, so
+histories with hundreds of thousands of entries never build intermediate DataFrames. Main
+features include:
+- Reading entries from a top-level array or from the array under a key like likes_media_likes.
+- Falling back to the title when an entry has no value, like the following files of newer exports.
+- Storing titles as a categorical, timestamps as int64 UNIX seconds and links as strings.
+
+Functions:
+- create_string_list_df(path_input, key, columns): Normalizes a string_list_data file into a DataFrame.
+"""
+
+import json
+from array import array
+import numpy as np
+import pandas as pd
+import export_files
+import profiling
+
+STRING_LIST_COLUMNS = ['title', 'href', 'value', 'timestamp']
+
+
+@profiling.traced('string_list.create_string_list_df')
+def create_string_list_df(path_input, key=None, columns=None) -> pd.DataFrame:
+    """
+    Normalizes a followers, following, liked posts or liked comments file into a DataFrame.
+    :param path_input: Path to the JSON file, on disk or inside an export ZIP
+    :param key: Top-level key of the array of entries, or None if the file itself is the array
+    :param columns: Columns to keep out of STRING_LIST_COLUMNS, all of them by default
+    :return: DataFrame with the categorical title, the href and value strings and the int64 timestamp
+    :raise KeyError: If the key does not exist in the file
+    :raise TypeError: If the file does not hold an array of entries
+    """
+    columns = STRING_LIST_COLUMNS if columns is None else list(columns)
+    with profiling.span('string_list.json_load'), export_files.open_text(path_input) as f:
+        entries = json.load(f)
+    if key is not None:
+        entries = entries[key]
+    if not isinstance(entries, list):
+        raise TypeError(f'Expected an array of entries, found {type(entries).__name__}')
+
+    title_codes = array('i')
+    title_names = {}
+    hrefs, values = [], []
+    timestamps = array('q')
+    no_data = [{}]
+    for entry in entries:
+        # Accounts repeat across entries, so titles are stored as category codes
+        title = entry.get('title') or None
+        title_codes.append(title_names.setdefault(title, len(title_names)) if title is not None else -1)
+        data = (entry.get('string_list_data') or no_data)[0]
+        hrefs.append(data.get('href'))
+        values.append(data.get('value', title))
+        timestamps.append(data.get('timestamp', 0))
+
+    buffers = {
+        'title': lambda: pd.Categorical.from_codes(np.frombuffer(title_codes, dtype=np.int32),
+                                                   categories=list(title_names)),
+        'href': lambda: pd.Series(hrefs, dtype=object),
+        'value': lambda: pd.Series(values, dtype=object),
+        'timestamp': lambda: np.frombuffer(timestamps, dtype=np.int64),
+    }
+    return pd.DataFrame({column: buffers[column]() for column in columns}, columns=columns)
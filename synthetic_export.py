@@ -0,0 +1,214 @@
+"""
+Synthetic Export Module
+
+This module writes synthetic Instagram exports of any size, laid out and encoded like a real
+JSON export, so the analyses can be benchmarked and profiled without anyone's private data.
+Main features include:
+- Generating N conversations of M messages each, split into message_1.json, message_2.json, ...
+  shards with the newest messages first, mixing texts with reactions, likes, shares, media
+  and system actions.
+- Writing message and comment text the way Instagram does, as UTF-8 bytes escaped as latin-1
+  characters, so the decoding step sees the same mojibake as on real exports.
+- Writing sharded followers and post comments files, the following file and the liked files.
+- Optionally packing the export into a .zip file like the one Instagram sends.
+
+The same seed always generates the same export.
+
+Functions:
+- mojibake(text): Encodes a text the way Instagram exports store it.
+- generate_export(output_path, conversations, messages, followers, following, comments, liked,
+  shard_size, seed, as_zip): Writes a synthetic export and returns its path.
+"""
+
+import argparse
+import json
+import random
+import shutil
+from pathlib import Path
+
+FIRST_TIMESTAMP = 1_420_070_400  # 2015-01-01
+LAST_TIMESTAMP = 1_704_067_200  # 2024-01-01
+
+OWNER = 'me'
+
+WORDS = ('the', 'you', 'i', 'to', 'a', 'and', 'is', 'it', 'that', 'lol', 'haha', 'yeah', 'ok', 'what',
+         'are', 'we', 'so', 'no', 'this', 'do', 'me', 'just', 'not', 'my', 'omg', 'love', 'tonight',
+         'tomorrow', 'see', 'going', 'good', 'time', 'wait', 'really', 'know', 'think', 'party', 'food',
+         'café', 'señor', 'über', 'naïve', 'jalapeño', 'crème', 'déjà', 'vu', 'coração', 'straße',
+         '😂', '❤️', '🔥', '😭', '👍', '🙏', '✨', '🥺')
+
+# Zipf-like word weights, so a handful of words dominate like in real chats
+WORD_WEIGHTS = tuple(1 / rank for rank in range(1, len(WORDS) + 1))
+
+REACTIONS = ('😂', '❤️', '😮', '😢', '👍', '🔥')
+
+SYSTEM_MESSAGES = ('started a video chat', 'Video chat ended', 'started an audio call',
+                   'missed a video chat', 'unsent a message')
+
+
+def mojibake(text: str) -> str:
+    """
+    Encodes a text the way Instagram exports store it, as UTF-8 bytes read as latin-1.
+    :param text: The readable text
+    :return: The text as it appears in an export JSON file
+    """
+    return text.encode('utf-8').decode('latin-1')
+
+
+def _text(rng: random.Random) -> str:
+    """
+    :return: A random message of 1 to 12 words
+    """
+    return ' '.join(rng.choices(WORDS, weights=WORD_WEIGHTS, k=rng.randint(1, 12)))
+
+
+def _message(rng: random.Random, sender: str, timestamp_ms: int) -> dict:
+    """
+    :return: A random message in the layout of a message JSON file
+    """
+    message = {'sender_name': mojibake(sender), 'timestamp_ms': timestamp_ms}
+    kind = rng.random()
+    if kind < 0.75:
+        message['content'] = mojibake(_text(rng))
+        if rng.random() < 0.1:
+            message['reactions'] = [{'reaction': mojibake(rng.choice(REACTIONS)), 'actor': mojibake(OWNER)}]
+    elif kind < 0.82:
+        message['photos'] = [{'uri': f'messages/photos/{timestamp_ms}.jpg', 'creation_timestamp': timestamp_ms // 1000}]
+    elif kind < 0.87:
+        message['share'] = {'link': f'https://www.instagram.com/p/{timestamp_ms:x}/'}
+        message['content'] = mojibake(f'{sender} sent an attachment.')
+    elif kind < 0.92:
+        message['content'] = mojibake(f'Reacted {rng.choice(REACTIONS)} to your message ')
+    elif kind < 0.96:
+        message['content'] = mojibake(f'{sender} liked a message')
+    elif kind < 0.98:
+        message['content'] = mojibake(f'{sender} shared a story.')
+    else:
+        message['content'] = mojibake(f'{sender} {rng.choice(SYSTEM_MESSAGES)}')
+    return message
+
+
+def _timestamps(rng: random.Random, count: int) -> list:
+    """
+    :return: count random epoch second timestamps, newest first
+    """
+    return sorted((rng.randint(FIRST_TIMESTAMP, LAST_TIMESTAMP) for _ in range(count)), reverse=True)
+
+
+def _write_json(path: Path, data) -> None:
+    """
+    Writes JSON the way Instagram does, with every non-ASCII character escaped.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=True)
+
+
+def _shards(items: list, shard_size: int) -> list:
+    """
+    :return: The items split into consecutive lists of at most shard_size items, at least one list
+    """
+    return [items[i:i + shard_size] for i in range(0, len(items), shard_size)] or [[]]
+
+
+def _string_list_entry(username: str, timestamp: int, title='') -> dict:
+    """
+    :return: An entry of a followers, following or liked file
+    """
+    return {'title': title, 'media_list_data': [],
+            'string_list_data': [{'href': f'https://www.instagram.com/{username}', 'value': username,
+                                  'timestamp': timestamp}]}
+
+
+def generate_export(output_path, conversations=20, messages=2_000, followers=5_000, following=3_000,
+                    comments=2_000, liked=1_000, shard_size=10_000, seed=0, as_zip=False) -> Path:
+    """
+    Writes a synthetic Instagram export.
+    :param output_path: Folder the export is written to, replaced if it exists
+    :param conversations: Number of conversations in the inbox
+    :param messages: Number of messages in every conversation
+    :param followers: Number of followers, split into followers_N.json shards
+    :param following: Number of followed accounts, about half of them also followers
+    :param comments: Number of post comments, split into post_comments_N.json shards
+    :param liked: Number of liked posts and of liked comments
+    :param shard_size: Maximum number of items in one message, followers or comments shard
+    :param seed: Seed of the random generator, the same seed writes the same export
+    :param as_zip: Whether to pack the folder into output_path.zip and delete the folder
+    :return: Path to the export folder, or to the .zip file when as_zip is True
+    """
+    rng = random.Random(seed)
+    root = Path(output_path)
+    if root.exists():
+        shutil.rmtree(root)
+    activity = root / 'your_instagram_activity'
+    connections = root / 'connections/followers_and_following'
+
+    # Inbox, message_1.json holds the newest messages
+    for index in range(conversations):
+        friend = f'friend_{index}' if index % 3 else f'frïend_{index}'
+        participants = [friend, OWNER] + ([f'friend_{index}_b'] if index % 5 == 0 else [])
+        timestamps = _timestamps(rng, messages)
+        conversation = [_message(rng, rng.choice(participants), timestamp * 1000 + rng.randint(0, 999))
+                        for timestamp in timestamps]
+        folder = activity / f'messages/inbox/friend{index}_{1000 + index}'
+        for number, shard in enumerate(_shards(conversation, shard_size), start=1):
+            _write_json(folder / f'message_{number}.json', {
+                'participants': [{'name': mojibake(name)} for name in participants],
+                'messages': shard,
+                'title': mojibake(friend),
+                'is_still_participant': True,
+                'thread_path': f'inbox/{folder.name}',
+            })
+
+    # Followers are sharded, following is a single file sharing about half of its accounts
+    follower_names = [f'user_{i}' for i in range(followers)]
+    follower_entries = [_string_list_entry(name, timestamp)
+                        for name, timestamp in zip(follower_names, _timestamps(rng, followers))]
+    for number, shard in enumerate(_shards(follower_entries, shard_size), start=1):
+        _write_json(connections / f'followers_{number}.json', shard)
+    following_names = follower_names[:following // 2] + [f'creator_{i}' for i in range(following - following // 2)]
+    _write_json(connections / 'following.json', {'relationships_following': [
+        _string_list_entry(name, timestamp) for name, timestamp in zip(following_names, _timestamps(rng, following))]})
+
+    # Post comments are sharded like followers
+    comment_entries = [{'media': [], 'string_map_data': {
+        'Comment': {'value': mojibake(_text(rng))},
+        'Media Owner': {'value': rng.choice(following_names) if following_names else 'creator'},
+        'Time': {'timestamp': timestamp}}} for timestamp in _timestamps(rng, comments)]
+    for number, shard in enumerate(_shards(comment_entries, shard_size), start=1):
+        _write_json(activity / f'comments/post_comments_{number}.json', shard)
+
+    # Liked posts and comments
+    owners = following_names or ['creator']
+    _write_json(activity / 'likes/liked_posts.json', {'likes_media_likes': [
+        {'title': rng.choice(owners), 'string_list_data': [
+            {'href': f'https://www.instagram.com/p/{i:x}/', 'value': mojibake('👍'), 'timestamp': timestamp}]}
+        for i, timestamp in enumerate(_timestamps(rng, liked))]})
+    _write_json(activity / 'likes/liked_comments.json', {'likes_comment_likes': [
+        {'title': rng.choice(owners), 'string_list_data': [
+            {'href': f'https://www.instagram.com/p/{i:x}/c/{i}/', 'value': mojibake('👍'), 'timestamp': timestamp}]}
+        for i, timestamp in enumerate(_timestamps(rng, liked))]})
+
+    if as_zip:
+        archive = Path(shutil.make_archive(str(root), 'zip', root))
+        shutil.rmtree(root)
+        return archive
+    return root
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic Instagram export.')
+    parser.add_argument('output', help='folder the export is written to, replaced if it exists')
+    parser.add_argument('--conversations', type=int, default=20, help='number of conversations')
+    parser.add_argument('--messages', type=int, default=2_000, help='messages per conversation')
+    parser.add_argument('--followers', type=int, default=5_000, help='number of followers')
+    parser.add_argument('--following', type=int, default=3_000, help='number of followed accounts')
+    parser.add_argument('--comments', type=int, default=2_000, help='number of post comments')
+    parser.add_argument('--liked', type=int, default=1_000, help='number of liked posts and comments')
+    parser.add_argument('--shard-size', type=int, default=10_000, help='maximum items per shard file')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    parser.add_argument('--zip', action='store_true', help='pack the export into a .zip file')
+    args = parser.parse_args()
+    path = generate_export(args.output, args.conversations, args.messages, args.followers, args.following,
+                           args.comments, args.liked, args.shard_size, args.seed, args.zip)
+    print(f'Synthetic export written to {path}')
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The analyzer is a flat collection of modules at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import synthetic_export
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    """
+    A small synthetic export with several shards of every sharded file.
+    """
+    return synthetic_export.generate_export(tmp_path / 'export', conversations=3, messages=250, followers=120,
+                                            following=80, comments=60, liked=40, shard_size=100, seed=7)
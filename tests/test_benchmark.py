@@ -0,0 +1,23 @@
+import benchmark
+
+
+def _result(seconds, reference=0.05, peak_mib=10.0):
+    return {'best_seconds': seconds, 'median_seconds': seconds, 'reference_seconds': reference, 'peak_mib': peak_mib}
+
+
+def test_compare_scales_timings_by_the_reference_workload():
+    baseline = {'slow': _result(0.1), 'fast': _result(0.1)}
+    # Twice as slow a machine: every benchmark and the reference take twice as long
+    assert benchmark.compare({'slow': _result(0.2, reference=0.1)}, baseline) == []
+    regressions = benchmark.compare({'fast': _result(0.4, reference=0.1)}, baseline)
+    assert len(regressions) == 1 and regressions[0].startswith('fast best_seconds')
+
+
+def test_compare_ignores_small_absolute_differences():
+    baseline = {'tiny': _result(0.0006, peak_mib=0.2)}
+    assert benchmark.compare({'tiny': _result(0.003, peak_mib=0.9)}, baseline) == []
+    assert benchmark.compare({'tiny': _result(0.003)}, baseline, min_seconds=0.001) != []
+
+
+def test_compare_skips_benchmarks_without_a_baseline():
+    assert benchmark.compare({'new': _result(1.0)}, {}) == []
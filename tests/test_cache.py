@@ -0,0 +1,69 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cache import INDEX_FILE, ParseCache
+
+
+def _file_frame(source_path) -> pd.DataFrame:
+    return pd.DataFrame({'path': [str(source_path)], 'bytes': [source_path.stat().st_size]})
+
+
+def _cache_files(cache_dir, source_paths) -> int:
+    cache = ParseCache(cache_dir)
+    for source_path in source_paths:
+        cache.get_or_parse(source_path, _file_frame)
+    return len(source_paths)
+
+
+def _frame_files(cache_dir) -> set:
+    return {path.name for path in cache_dir.iterdir() if path.suffix in ('.pkl', '.feather')}
+
+
+def test_get_or_parse_hits_until_the_source_changes(export_dir, tmp_path):
+    cache = ParseCache(tmp_path / 'cache')
+    source_path = next(export_dir.rglob('followers_1.json'))
+    calls = []
+
+    def parser(path):
+        calls.append(path)
+        return _file_frame(path)
+
+    first = cache.get_or_parse(source_path, parser, name='frame')
+    second = ParseCache(tmp_path / 'cache').get_or_parse(source_path, parser, name='frame')
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+    source_path.write_text(source_path.read_text(encoding='utf-8') + '\n', encoding='utf-8')
+    assert cache.get(source_path, name='frame') is None
+
+
+def test_concurrent_processes_keep_each_others_entries(export_dir, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    source_paths = sorted(export_dir.rglob('*.json'))
+    batches = [source_paths[i::4] for i in range(4)]
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        assert sum(executor.map(_cache_files, [cache_dir] * 4, batches)) == len(source_paths)
+
+    with open(cache_dir / INDEX_FILE, encoding='utf-8') as f:
+        entries = json.load(f)
+    assert len(entries) == len(source_paths)
+    assert {entry['file'] for entry in entries.values()} == _frame_files(cache_dir)
+    assert not list(cache_dir.glob('*.tmp'))
+
+
+def test_eviction_and_invalidation(export_dir, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    source_paths = sorted(export_dir.rglob('*.json'))[:6]
+    _cache_files(cache_dir, source_paths)
+    frame_bytes = max(entry['bytes'] for entry in ParseCache(cache_dir).entries.values())
+
+    cache = ParseCache(cache_dir, max_bytes=frame_bytes * 2)
+    cache.flush()
+    assert sum(entry['bytes'] for entry in cache.entries.values()) <= frame_bytes * 2
+    assert len(_frame_files(cache_dir)) == len(cache.entries)
+
+    ParseCache(cache_dir).invalidate()
+    assert ParseCache(cache_dir).entries == {}
+    assert not _frame_files(cache_dir)
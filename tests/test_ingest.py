@@ -0,0 +1,121 @@
+import json
+import shutil
+
+import ingest
+
+LIKED_POSTS = 'your_instagram_activity/likes/liked_posts.json'
+INBOX = 'your_instagram_activity/messages/inbox'
+
+
+def _edit_json(path, edit) -> None:
+    data = json.loads(path.read_text(encoding='utf-8'))
+    edit(data)
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+
+def _newer_export(export_dir, tmp_path):
+    newer = tmp_path / 'newer'
+    shutil.copytree(export_dir, newer)
+    return newer
+
+
+def test_second_ingest_of_the_same_export_appends_nothing(export_dir, tmp_path):
+    store = tmp_path / 'store'
+    first = ingest.ingest_export(export_dir, store, max_workers=1)
+    assert first['appended']['liked_posts'] == 40
+    assert sum(count for source, count in first['appended'].items() if source.startswith('messages/')) == 750
+    assert first['errors'] == {}
+
+    second = ingest.ingest_export(export_dir, store, max_workers=1)
+    assert second['appended'] == {}
+    assert second['follow_changes'] == {'followers': {'added': 0, 'removed': 0},
+                                        'following': {'added': 0, 'removed': 0}}
+    assert len(ingest.IngestStore(store).messages()) == 750
+
+
+def test_records_at_the_watermark_are_not_dropped(export_dir, tmp_path):
+    store = tmp_path / 'store'
+    ingest.ingest_export(export_dir, store, max_workers=1)
+    newer = _newer_export(export_dir, tmp_path)
+
+    def add_tied_like(data):
+        newest = data['likes_media_likes'][0]
+        tied = json.loads(json.dumps(newest))
+        tied['title'] = 'tied_creator'
+        tied['string_list_data'][0]['href'] = 'https://www.instagram.com/p/tied/'
+        data['likes_media_likes'].insert(0, tied)
+
+    def add_tied_message(data):
+        newest = data['messages'][0]
+        data['messages'].insert(0, {'sender_name': 'me', 'timestamp_ms': newest['timestamp_ms'],
+                                    'content': 'sent in the same millisecond'})
+
+    _edit_json(newer / LIKED_POSTS, add_tied_like)
+    _edit_json(newer / INBOX / 'friend0_1000' / 'message_1.json', add_tied_message)
+    summary = ingest.ingest_export(newer, store, max_workers=1)
+    assert summary['appended'] == {'messages/friend0_1000': 1, 'liked_posts': 1}
+
+    # Both tied records are remembered, so the same export adds nothing again
+    assert ingest.ingest_export(newer, store, max_workers=1)['appended'] == {}
+    liked = ingest.IngestStore(store).load('liked_posts')
+    assert len(liked) == 41
+    assert liked['href'].is_unique
+
+
+def test_a_broken_conversation_only_skips_itself(export_dir, tmp_path):
+    store = tmp_path / 'store'
+    ingest.ingest_export(export_dir, store, max_workers=1)
+    watermarks = dict(ingest.IngestStore(store).state['watermarks'])
+    newer = _newer_export(export_dir, tmp_path)
+
+    broken = newer / INBOX / 'friend1_1001' / 'message_1.json'
+    broken.write_text(broken.read_text(encoding='utf-8')[:200], encoding='utf-8')
+    _edit_json(newer / INBOX / 'friend2_1002' / 'message_1.json',
+               lambda data: data['messages'].insert(0, {'sender_name': 'me', 'timestamp_ms': 1_800_000_000_000,
+                                                         'content': 'new'}))
+    summary = ingest.ingest_export(newer, store, max_workers=2)
+    assert list(summary['errors']) == ['messages/friend1_1001']
+    assert summary['appended'] == {'messages/friend2_1002': 1}
+
+    state = ingest.IngestStore(store).state
+    assert state['watermarks']['messages/friend1_1001'] == watermarks['messages/friend1_1001']
+    assert state['watermarks']['messages/friend2_1002'] == 1_800_000_000_000
+
+
+def test_follow_list_changes_are_recorded(export_dir, tmp_path):
+    store = tmp_path / 'store'
+    ingest.ingest_export(export_dir, store, max_workers=1)
+    newer = _newer_export(export_dir, tmp_path)
+
+    def replace_first_follower(data):
+        data[0]['string_list_data'][0]['value'] = 'newbie'
+
+    _edit_json(newer / 'connections/followers_and_following/followers_1.json', replace_first_follower)
+    summary = ingest.ingest_export(newer, store, max_workers=1)
+    assert summary['follow_changes']['followers'] == {'added': 1, 'removed': 1}
+    events = ingest.IngestStore(store).follow_events('followers')
+    assert dict(zip(events['event'], events['value'])) == {'added': 'newbie', 'removed': 'user_0'}
+
+
+def test_a_missing_core_file_only_skips_its_source(export_dir, tmp_path):
+    store = tmp_path / 'store'
+    ingest.ingest_export(export_dir, store, max_workers=1)
+    watermarks = dict(ingest.IngestStore(store).state['watermarks'])
+    newer = _newer_export(export_dir, tmp_path)
+
+    (newer / 'your_instagram_activity/likes/liked_comments.json').unlink()
+    (newer / 'connections/followers_and_following/following.json').unlink()
+    _edit_json(newer / LIKED_POSTS, lambda data: data['likes_media_likes'].insert(0, {
+        'title': 'new_creator',
+        'string_list_data': [{'href': 'https://www.instagram.com/p/new/', 'value': '', 'timestamp': 1_800_000_000}]}))
+    summary = ingest.ingest_export(newer, store, max_workers=1)
+    assert sorted(summary['errors']) == ['following', 'liked_comments']
+    assert summary['appended'] == {'liked_posts': 1}
+    assert 'following' not in summary['follow_changes']
+
+    state = ingest.IngestStore(store).state
+    assert state['watermarks']['liked_comments'] == watermarks['liked_comments']
+    assert state['watermarks']['liked_posts'] == 1_800_000_000
+    # The next complete export is diffed against the last following snapshot that was read
+    assert ingest.ingest_export(export_dir, store, max_workers=1)['follow_changes']['following'] == {
+        'added': 0, 'removed': 0}
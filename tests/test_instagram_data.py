@@ -0,0 +1,50 @@
+import pytest
+
+import instagram_data_class as ig_data
+
+
+@pytest.fixture
+def instagram_data(export_dir):
+    data = ig_data.InstagramData(export_dir)
+    data.init_paths()
+    return data
+
+
+def test_a_missing_file_gives_none(instagram_data, export_dir):
+    (export_dir / 'your_instagram_activity/likes/liked_comments.json').unlink()
+    assert instagram_data.liked_comments_df() is None
+    assert len(instagram_data.liked_posts_df()) == 40
+
+
+def test_missing_shards_are_skipped(instagram_data, export_dir):
+    assert len(instagram_data.followers_df()) == 120
+    (export_dir / 'connections/followers_and_following/followers_2.json').unlink()
+    assert len(instagram_data.followers_df()) == 100
+
+    (export_dir / 'connections/followers_and_following/followers_1.json').unlink()
+    assert instagram_data.followers_df() is None
+
+
+def test_a_broken_shard_is_not_memoized(instagram_data, export_dir):
+    shard = export_dir / 'connections/followers_and_following/followers_2.json'
+    content = shard.read_text(encoding='utf-8')
+    shard.write_text('[', encoding='utf-8')
+    assert len(instagram_data.followers_df()) == 100
+
+    # Restoring the content keeps the signature of the broken file, which must not be served
+    shard.write_text(content, encoding='utf-8')
+    assert len(instagram_data.followers_df()) == 120
+
+
+def test_preload_reports_missing_and_broken_files(instagram_data, export_dir):
+    (export_dir / 'your_instagram_activity/likes/liked_comments.json').unlink()
+    (export_dir / 'connections/followers_and_following/followers_2.json').write_text('[', encoding='utf-8')
+    loads = instagram_data.preload(max_workers=2).set_index('file')
+
+    assert loads['error'].notna().sum() == 2
+    assert loads['rows'].sum() == 100 + 80 + 60 + 40
+    # The data type with a broken shard is not memoized with the rows of its other shard
+    assert len(instagram_data.liked_posts_df()) == 40
+    assert instagram_data.liked_comments_df() is None
+    assert len(instagram_data.followers_df()) == 100
+    assert 'followers' not in instagram_data._loaded
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+import json_stream
+
+DOCUMENTS = [
+    '[1.5, 22]',
+    '[1e5, -1E-3, 12.25e+2, 0, -0.5]',
+    '[true, false, null, "a\\"b", {"x": [1.5, {"y": 2e1}]}]',
+    '{"other": {"skip": [1.25, "x"]}, "messages": [{"timestamp_ms": 1703676431767, "content": "hi"}, 3.75]}',
+    '[]',
+]
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+@pytest.mark.parametrize('chunk_size', range(1, 9))
+def test_items_match_json_load_at_every_chunk_size(tmp_path, document, chunk_size):
+    path = tmp_path / 'data.json'
+    path.write_text(document, encoding='utf-8')
+    expected = json.loads(document)
+    key = 'messages' if isinstance(expected, dict) else None
+    items = list(json_stream.iter_array_items(path, key=key, chunk_size=chunk_size))
+    assert items == (expected[key] if key else expected)
+
+
+def test_a_missing_key_raises(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('{"participants": [1, 2]}', encoding='utf-8')
+    with pytest.raises(KeyError):
+        list(json_stream.iter_array_items(path, key='messages', chunk_size=4))
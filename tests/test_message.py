@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+import message as msg
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('content', [
+    '{"participants": []}',
+    '{"messages": [{"sender_name": "a", "timestamp_ms": null, "content": "x"}]}',
+    '{"messages": [',
+])
+def test_both_parsers_report_broken_files(tmp_path, streaming, content):
+    path = tmp_path / 'message_1.json'
+    path.write_text(content, encoding='utf-8')
+    assert msg.create_msg_df(path, streaming=streaming) is None
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_both_parsers_read_an_empty_conversation(tmp_path, streaming):
+    path = tmp_path / 'message_1.json'
+    path.write_text(json.dumps({'messages': []}), encoding='utf-8')
+    df = msg.create_msg_df(path, streaming=streaming, columns=msg.COMPACT_COLUMNS)
+    assert df.empty
+    assert list(df.columns) == msg.COMPACT_COLUMNS
+
+
+def test_both_parsers_agree_on_a_conversation(export_dir):
+    path = next(export_dir.rglob('message_1.json'))
+    full = msg.create_msg_df(path, columns=msg.COMPACT_COLUMNS)
+    streamed = msg.create_msg_df(path, streaming=True)
+    assert full['timestamp_ms'].tolist() == streamed['timestamp_ms'].tolist()
+    assert full['sender_name'].astype(str).tolist() == streamed['sender_name'].astype(str).tolist()
+    assert full['msg_type'].astype(str).tolist() == streamed['msg_type'].astype(str).tolist()
@@ -0,0 +1,19 @@
+import json
+
+import report
+
+
+def test_missing_files_only_fail_their_own_analyses(export_dir, tmp_path):
+    (export_dir / 'your_instagram_activity/likes/liked_comments.json').unlink()
+    (export_dir / 'your_instagram_activity/comments/post_comments_1.json').unlink()
+    output_dir = tmp_path / 'report'
+    manifest = report.run_report(export_dir, output_dir, analyses=['followers', 'comments', 'liked'],
+                                 formats=['svg'], max_workers=1)
+
+    assert list(manifest['errors']) == ['comments']
+    assert 'missing' in manifest['errors']['comments']
+    liked = json.loads((output_dir / 'liked.json').read_text(encoding='utf-8'))
+    assert liked['liked_comments'] is None
+    assert liked['liked_posts']['count'] == 40
+    assert (output_dir / 'liked_posts_per_month.csv').exists()
+    assert json.loads((output_dir / 'followers.json').read_text(encoding='utf-8'))['followers'] == 120
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import instagram_data_class as ig_data
+import search_index
+
+
+@pytest.fixture
+def instagram_data(export_dir):
+    data = ig_data.InstagramData(export_dir)
+    data.init_paths()
+    return data
+
+
+@pytest.fixture
+def index(tmp_path):
+    search = search_index.SearchIndex(tmp_path / 'search.sqlite3')
+    yield search
+    search.close()
+
+
+def _add_message(shard_path, content, timestamp_ms=1_800_000_000_000) -> None:
+    data = json.loads(shard_path.read_text(encoding='utf-8'))
+    data['messages'].insert(0, {'sender_name': 'me', 'timestamp_ms': timestamp_ms, 'content': content})
+    shard_path.write_text(json.dumps(data), encoding='utf-8')
+
+
+def test_parse_query():
+    assert search_index.parse_query('"See you" tonight from:"Alice B" after:2023-01-01') == {
+        'groups': [['see', 'you'], ['tonight']],
+        'sender': 'Alice B',
+        'after': '2023-01-01',
+        'before': None,
+    }
+    assert search_index.parse_query('before:2024-02-01 "" ...')['groups'] == []
+
+
+def test_update_only_indexes_changed_shards(instagram_data, index, export_dir):
+    shards = sorted(export_dir.rglob('message_*.json')) + sorted(export_dir.rglob('post_comments_*.json'))
+    assert index.update(instagram_data) == len(shards)
+    assert index.update(instagram_data) == 0
+
+    _add_message(shards[0], 'purple elephants dance tonight')
+    assert index.update(instagram_data) == 1
+    shards[-2].unlink()
+    assert index.update(instagram_data) == 0
+    assert len(index._indexed_sources()) == len(shards) - 1
+
+
+def test_search_matches_phrases_in_order(instagram_data, index, export_dir):
+    _add_message(next(export_dir.rglob('message_1.json')), 'Purple elephants dance tonight')
+    index.update(instagram_data)
+
+    found = index.search([['purple', 'elephants'], ['tonight']])
+    assert found['content'].tolist() == ['Purple elephants dance tonight']
+    assert found['sender'].tolist() == ['me']
+    assert index.search([['elephants', 'purple']]).empty
+    assert index.search([['purple']], sender='ME')['content'].tolist() == ['Purple elephants dance tonight']
+    assert index.search([['purple']], end_ms=1_800_000_000_000).empty
+    assert index.search([['purple']], kind='comment').empty
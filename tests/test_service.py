@@ -0,0 +1,40 @@
+import pytest
+
+import service
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    job_queue = service.JobQueue(tmp_path / 'reports', max_jobs=1, max_queued=5)
+    yield job_queue
+    job_queue.stop()
+
+
+@pytest.mark.parametrize('options', [
+    {'timeout': -1},
+    {'timeout': 0},
+    {'timeout': 'soon'},
+    {'memory_mb': -1},
+    {'analyses': ['nope']},
+    {'timezone': 'Mars/Olympus_Mons'},
+])
+def test_submit_rejects_invalid_options(jobs, export_dir, options):
+    with pytest.raises(ValueError):
+        jobs.submit({'export': str(export_dir), **options})
+    assert jobs.list_jobs() == []
+
+
+def test_submit_rejects_a_missing_export(jobs, tmp_path):
+    with pytest.raises(ValueError):
+        jobs.submit({'export': str(tmp_path / 'missing')})
+
+
+def test_only_the_latest_finished_jobs_are_kept(tmp_path, export_dir):
+    # Without worker threads the jobs stay queued until they are finished by hand
+    job_queue = service.JobQueue(tmp_path / 'reports', max_jobs=0, max_finished=2)
+    ids = [job_queue.submit({'export': str(export_dir)})['id'] for _ in range(4)]
+    for finished, job_id in enumerate(ids[:3]):
+        job_queue._update(job_id, status='succeeded', finished=float(finished))
+
+    assert [job['id'] for job in job_queue.list_jobs()] == ids[1:]
+    assert job_queue.status(ids[0]) is None
@@ -0,0 +1,129 @@
+"""
+Time Handling Module
+
+This module is the shared time layer of the analyzer. Timestamps stay int64 epoch arrays in
+every DataFrame, timezone conversion and bucketing are done as vectorized array operations
+over the whole column, and timestamps are only formatted to strings for the handful of rows
+that are actually displayed. Main features include:
+- Converting epoch seconds or milliseconds to the wall clock time of any timezone.
+- Bucketing timestamps by local hour of day, date and month.
+- Formatting timestamps to strings in the timezone chosen by the user.
+
+Functions:
+- check_timezone(tz): Validates a timezone name.
+- to_epoch(values, unit): Converts a column of timestamps to an int64 epoch array.
+- local_epoch(epoch, unit, tz): Shifts epoch timestamps to local wall clock seconds.
+- local_hours(epoch, unit, tz): Returns the local hour of day of every timestamp.
+- local_dates(epoch, unit, tz): Returns the local date of every timestamp.
+- local_months(epoch, unit, tz): Returns the local month of the year of every timestamp.
+- format_times(epoch, unit, tz, fmt): Formats timestamps to strings in a timezone.
+
+Numpy and pandas are imported by the conversion functions themselves, so checking a timezone
+at the prompt of the menu does not load them.
+"""
+
+import zoneinfo
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+DEFAULT_TIMEZONE = 'US/Pacific'
+
+SECONDS_PER_DAY = 86_400
+SECONDS_PER_HOUR = 3_600
+
+
+def check_timezone(tz: str) -> bool:
+    """
+    Checks whether a timezone name can be used for conversions.
+    :param tz: Timezone name like 'US/Pacific' or 'Europe/Berlin'
+    :return: True if the timezone exists
+    """
+    try:
+        # Most names are IANA zones, which are checked without importing pandas
+        zoneinfo.ZoneInfo(tz)
+        return True
+    except (ValueError, zoneinfo.ZoneInfoNotFoundError, TypeError):
+        pass
+    import pandas as pd
+    try:
+        pd.Timestamp(0, tz=tz)
+        return True
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
+def to_epoch(values, unit='s') -> 'np.ndarray':
+    """
+    Converts a column of timestamps to an int64 epoch array. Datetime columns are converted
+    to the given unit and integer columns are assumed to already be in that unit.
+    :param values: Series or array of epoch integers or datetimes
+    :param unit: 's' for epoch seconds or 'ms' for epoch milliseconds
+    :return: Numpy int64 array of epoch timestamps
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values.to_numpy(dtype=f'datetime64[{unit}]').astype(np.int64)
+    return values.to_numpy(dtype=np.int64)
+
+
+def local_epoch(epoch, unit='s', tz=DEFAULT_TIMEZONE) -> 'np.ndarray':
+    """
+    Shifts epoch timestamps to the wall clock seconds of a timezone, so every bucket can be
+    computed with integer arithmetic. Daylight saving offsets are resolved per timestamp.
+    :param epoch: Array of epoch timestamps
+    :param unit: 's' for epoch seconds or 'ms' for epoch milliseconds
+    :param tz: Timezone name
+    :return: Numpy int64 array of local wall clock seconds since 1970-01-01
+    """
+    import numpy as np
+    import pandas as pd
+
+    utc = pd.DatetimeIndex(np.asarray(epoch, dtype=np.int64).astype(f'datetime64[{unit}]'))
+    local = utc.tz_localize('UTC').tz_convert(tz).tz_localize(None)
+    return local.to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def local_hours(epoch, unit='s', tz=DEFAULT_TIMEZONE) -> 'np.ndarray':
+    """
+    :return: Numpy int8 array of the local hour of day, 0 to 23, of every timestamp
+    """
+    return (local_epoch(epoch, unit, tz) // SECONDS_PER_HOUR % 24).astype('int8')
+
+
+def local_dates(epoch, unit='s', tz=DEFAULT_TIMEZONE) -> 'np.ndarray':
+    """
+    :return: Numpy datetime64[D] array of the local date of every timestamp
+    """
+    return (local_epoch(epoch, unit, tz) // SECONDS_PER_DAY).astype('datetime64[D]')
+
+
+def local_months(epoch, unit='s', tz=DEFAULT_TIMEZONE) -> 'np.ndarray':
+    """
+    :return: Numpy int8 array of the local month of the year, 1 to 12, of every timestamp
+    """
+    months = local_dates(epoch, unit, tz).astype('datetime64[M]').astype('int64')
+    return (months % 12 + 1).astype('int8')
+
+
+def format_times(epoch, unit='s', tz=DEFAULT_TIMEZONE, fmt='%m-%d-%Y %H:%M') -> 'pd.Series':
+    """
+    Formats timestamps to strings in a timezone. Only call this on the rows being displayed.
+    :param epoch: Series or array of epoch timestamps
+    :param unit: 's' for epoch seconds or 'ms' for epoch milliseconds
+    :param tz: Timezone name
+    :param fmt: strftime format of the strings
+    :return: Series of formatted timestamps, keeping the index of a given Series
+    """
+    import pandas as pd
+
+    index = epoch.index if isinstance(epoch, pd.Series) else None
+    local = pd.DatetimeIndex(local_epoch(to_epoch(epoch, unit), unit, tz).astype('datetime64[s]'))
+    return pd.Series(local.strftime(fmt), index=index)
@@ -0,0 +1,124 @@
+"""
+Word Frequency Module
+
+This module counts words and phrases across large collections of messages or comments.
+The texts are tokenized chunk by chunk, each chunk is counted into its own Counter in a
+worker process, and the partial Counters are merged into the final counts, so no single
+giant string or token list of every message is ever built. Main features include:
+- Tokenizing text into words and emoji, with optional case folding.
+- Removing stopwords, either the built-in English list or a custom collection.
+- Counting single words as well as bigrams, trigrams or any n-gram size.
+- Returning the top-k most common tokens or phrases.
+
+Functions:
+- tokenize(text, casefold): Splits a text into word and emoji tokens.
+- count_chunk(texts, ngram, stopwords, casefold): Counts the n-grams of one chunk of texts.
+- count_words(texts, top_k, ngram, stopwords, casefold, max_workers, chunk_size): Counts the
+  n-grams of every text in parallel chunks and returns the top-k most common.
+"""
+
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+CHUNK_SIZE = 50_000
+
+# Words, including inner apostrophes like "don't", or single emoji and pictographs
+TOKEN_PATTERN = re.compile(
+    r"[^\W_]+(?:['’][^\W_]+)*"
+    r"|[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF]")
+
+DEFAULT_STOPWORDS = frozenset("""
+a about all also am an and any are as at be been but by can could did do does doing for from
+had has have he her here him his how i if im in into is it its just me my no not of on or our
+out so than that the their them then there they this to too up us was we were what when where
+which who why will with would you your
+""".split())
+
+
+def tokenize(text: str, casefold=False) -> list:
+    """
+    Splits a text into word and emoji tokens.
+    :param text: The text to tokenize
+    :param casefold: Whether to case fold the tokens so "Hello" and "hello" are the same word
+    :return: List of tokens in the order they appear
+    """
+    if casefold:
+        text = text.casefold()
+    return TOKEN_PATTERN.findall(text)
+
+
+def count_chunk(texts, ngram=1, stopwords=None, casefold=False) -> Counter:
+    """
+    Counts the n-grams of one chunk of texts. N-grams never span two texts.
+    :param texts: Iterable of texts, missing values are skipped
+    :param ngram: Number of consecutive tokens counted together, 1 for single words
+    :param stopwords: Collection of tokens to drop before counting, or None
+    :param casefold: Whether to case fold the tokens before counting
+    :return: Counter of the n-grams, joined by spaces when ngram is greater than 1
+    """
+    counter = Counter()
+    for text in texts:
+        if not isinstance(text, str):
+            continue
+        tokens = tokenize(text, casefold)
+        if stopwords:
+            tokens = [token for token in tokens if token.casefold() not in stopwords]
+        if ngram == 1:
+            counter.update(tokens)
+        else:
+            counter.update(' '.join(tokens[i:i + ngram]) for i in range(len(tokens) - ngram + 1))
+    return counter
+
+
+def _chunks(texts, chunk_size):
+    """
+    Yields consecutive lists of at most chunk_size texts.
+    """
+    iterator = iter(texts)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def count_words(texts, top_k=5, ngram=1, stopwords=None, casefold=False,
+                max_workers=None, chunk_size=CHUNK_SIZE) -> list:
+    """
+    Counts the n-grams of every text and returns the most common ones. Texts are counted
+    in chunks by a process pool, with at most two chunks per worker in flight at a time,
+    so memory stays bounded by the chunk size and the vocabulary instead of the total text.
+    :param texts: Iterable of texts, such as a Series of messages or comments
+    :param top_k: Number of most common n-grams to return, or None for all of them
+    :param ngram: Number of consecutive tokens counted together, 2 for bigrams, 3 for trigrams
+    :param stopwords: Collection of tokens to drop, True for DEFAULT_STOPWORDS, or None
+    :param casefold: Whether to case fold the tokens before counting
+    :param max_workers: Number of worker processes, 1 to count in this process
+    :param chunk_size: Number of texts counted by a worker at a time
+    :return: List of (n-gram, count) tuples from the most to the least common
+    """
+    if stopwords is True:
+        stopwords = DEFAULT_STOPWORDS
+    elif stopwords:
+        stopwords = frozenset(word.casefold() for word in stopwords)
+
+    chunks = _chunks(texts, chunk_size)
+    first_chunk = next(chunks, [])
+    if max_workers == 1 or len(first_chunk) < chunk_size:
+        # Small inputs are faster to count than to ship to worker processes
+        counter = count_chunk(first_chunk, ngram, stopwords, casefold)
+        for chunk in chunks:
+            counter.update(count_chunk(chunk, ngram, stopwords, casefold))
+        return counter.most_common(top_k)
+
+    counter = Counter()
+    max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = [executor.submit(count_chunk, first_chunk, ngram, stopwords, casefold)]
+        for chunk in chunks:
+            if len(pending) >= max_in_flight:
+                counter.update(pending.pop(0).result())
+            pending.append(executor.submit(count_chunk, chunk, ngram, stopwords, casefold))
+        for future in pending:
+            counter.update(future.result())
+    return counter.most_common(top_k)